@@ -3,21 +3,31 @@ from django.conf.urls import url
 from django.conf import settings
 from django.utils import timezone
 from django.http import JsonResponse
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, FieldError, FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Q
+from django.contrib.gis.measure import D
+from django.contrib.gis.db.models.functions import AsGeoJSON
 from tastypie.resources import ModelResource, Resource
 from tastypie.authorization import Authorization, ReadOnlyAuthorization, DjangoAuthorization
 from tastypie.resources import ModelResource, ALL, ALL_WITH_RELATIONS
 from tastypie.utils.mime import determine_format
 from tastypie.api import Api
 from tastypie import fields
+from tastypie.utils import dict_strip_unicode_keys
 from bfrs.models import Profile, Region, District, Bushfire, Tenure, current_finyear,BushfireProperty,CaptureMethod
-from bfrs.utils import update_areas_burnt, invalidate_bushfire, serialize_bushfire, is_external_user, can_maintain_data,get_tenure,update_status
+from bfrs.utils import update_areas_burnt, invalidate_bushfire, serialize_bushfire, serialize_bushfires, is_external_user, can_maintain_data,get_tenure,update_status
+from bfrs.geometry import parse_multipolygon, parse_geometry, GeometryError, SimplifyPreserveTopology, zoom_tolerance
+from bfrs.revisions import deferred_revision
+from bfrs.tenures import tenure_index
+from bfrs.lookups import lookup_cache
 
 from django.contrib.auth.models import User
-from django.contrib.gis.geos import Point, GEOSGeometry, Polygon, MultiPolygon, GEOSException
-from tastypie.http import HttpBadRequest, HttpUnauthorized, HttpAccepted
+from django.contrib.gis.geos import Point, GEOSGeometry, Polygon, GEOSException
+from tastypie.http import HttpBadRequest, HttpUnauthorized, HttpAccepted, HttpNotModified
 from tastypie.exceptions import ImmediateHttpResponse, Unauthorized
 import json
+import math
 
 
 """
@@ -81,6 +91,112 @@ def generate_meta(klass):
 #        raise Unauthorized("Delete Not Permitted.")
 
 
+class SpatialQueryMixin(object):
+    """
+    Add a spatial query endpoint "{resource_name}/query/" to a bushfire resource.
+    GET parameters:
+        bbox: minx,miny,maxx,maxy in wgs84, the bushfires whose origin point or fire boundary intersects the box
+        intersects: a GeoJSON, WKT or WKB geometry, the bushfires whose origin point or fire boundary intersects the geometry
+        point, distance: lon,lat and the distance in metres, the bushfires whose origin point is within the distance of the point
+        year, status, region_id, district_id: the reporting year, comma separated report statuses, region and district
+        limit: the page size, default 100
+        cursor: the next cursor returned by the previous page
+        zoom: if present, the fire boundaries are simplified for the zoom level
+    The filters use the GiST indexes of origin_point and fire_boundary, and the pages are keyed on id, so the cost doesn't depend on the page number.
+    """
+    query_fields = ('id','fire_number','name','region_id','district_id','year','reporting_year','report_status')
+    query_fire_boundary = False
+    query_default_limit = 100
+    query_max_limit = 1000
+    query_precision = 6
+
+    def query_urls(self):
+        return [
+            url(
+                r"^(?P<resource_name>{})/query/$".format(self._meta.resource_name),
+                self.wrap_view('spatial_query'), name="api_{}_query".format(self._meta.resource_name)),
+        ]
+
+    def spatial_filter(self, params):
+        """
+        Return the Q object of the spatial filters in params
+        """
+        query = Q()
+        if params.get("bbox"):
+            try:
+                bbox = Polygon.from_bbox([float(v) for v in params["bbox"].split(",")])
+            except (ValueError, GEOSException):
+                raise GeometryError("bbox should be minx,miny,maxx,maxy")
+            bbox.srid = 4326
+            query &= Q(origin_point__intersects=bbox) | Q(fire_boundary__intersects=bbox)
+
+        if params.get("intersects"):
+            geom = parse_geometry(params["intersects"])
+            query &= Q(origin_point__intersects=geom) | Q(fire_boundary__intersects=geom)
+
+        if params.get("point"):
+            try:
+                lon,lat = [float(v) for v in params["point"].split(",")]
+                distance = float(params.get("distance") or 0)
+            except ValueError:
+                raise GeometryError("point should be lon,lat and distance should be in metres")
+            point = Point(lon, lat, srid=4326)
+            #use the box around the circle to find the candidates with the spatial index
+            dlat = distance / 111320.0
+            dlon = distance / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+            box = Polygon.from_bbox((lon - dlon, lat - dlat, lon + dlon, lat + dlat))
+            box.srid = 4326
+            query &= Q(origin_point__bboverlaps=box) & Q(origin_point__distance_lte=(point, D(m=distance)))
+
+        return query
+
+    def spatial_query(self, request, **kwargs):
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        params = request.GET
+        try:
+            qs = Bushfire.objects.filter(self.spatial_filter(params))
+            if params.get("year"):
+                qs = qs.filter(reporting_year=int(params["year"]))
+            if params.get("status"):
+                qs = qs.filter(report_status__in=[int(s) for s in params["status"].split(",") if s.strip()])
+            if params.get("region_id"):
+                qs = qs.filter(region_id=int(params["region_id"]))
+            if params.get("district_id"):
+                qs = qs.filter(district_id=int(params["district_id"]))
+            if params.get("cursor"):
+                qs = qs.filter(id__gt=int(params["cursor"]))
+            limit = max(1,min(int(params.get("limit") or self.query_default_limit), self.query_max_limit))
+            zoom = int(params["zoom"]) if params.get("zoom") else None
+        except (GeometryError, ValueError) as ex:
+            return self.create_response(request, data={'error': str(ex)}, response_class=HttpBadRequest)
+
+        fields = list(self.query_fields) + ["origin_point_json"]
+        qs = qs.annotate(origin_point_json=AsGeoJSON('origin_point', precision=self.query_precision))
+        if self.query_fire_boundary:
+            if zoom is None:
+                fire_boundary = 'fire_boundary'
+            else:
+                #simplify the stored fire boundary of the nearest level
+                tolerance = zoom_tolerance(zoom)
+                fire_boundary = SimplifyPreserveTopology(Bushfire.fire_boundary_field(tolerance), tolerance)
+            qs = qs.annotate(fire_boundary_json=AsGeoJSON(fire_boundary, precision=self.query_precision))
+            fields.append("fire_boundary_json")
+
+        rows = list(qs.order_by("id").values(*fields)[:limit + 1])
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        objects = []
+        for row in rows[:limit]:
+            for field in ("origin_point","fire_boundary"):
+                if "{}_json".format(field) in row:
+                    value = row.pop("{}_json".format(field))
+                    row[field] = json.loads(value) if value else None
+            objects.append(row)
+
+        return self.create_response(request, data={"meta":{"limit":limit,"next":next_cursor,"count":len(objects)},"objects":objects})
+
+
 class APIResource(ModelResource):
     class Meta:
         pass
@@ -104,14 +220,47 @@ class APIResource(ModelResource):
         else:
             return self._meta.serializer.get_mime_for_format("json")
 
+    def lookup_models(self, field_name):
+        """
+        Return the resource model and the models joined to read the field
+        """
+        model = self._meta.queryset.model
+        models = [model]
+        for name in field_name.split("__"):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                #a lookup or transform, or an invalid field which is reported by the query
+                break
+            if not field.is_relation:
+                break
+            model = field.related_model
+            models.append(model)
+        return models
+
+    def cached_response(self, request, key, loader, models=None):
+        """
+        Return the response of the lookup data, which is cached until an object of one of the models (default the resource model) is saved or deleted.
+        The response carries an ETag, and a request with a matching If-None-Match gets a 304 response without the data
+        """
+        data,etag = lookup_cache.get(models or [self._meta.queryset.model], key, loader)
+        etag = '"{}-{}"'.format(etag,self.determine_format(request).split("/")[-1])
+        if etag in [t.strip() for t in request.META.get("HTTP_IF_NONE_MATCH","").split(",")]:
+            response = HttpNotModified()
+        else:
+            response = self.create_response(request, data=data)
+        response["ETag"] = etag
+        return response
+
     def field_values(self, request, **kwargs):
         # Get a list of unique values for the field passed in kwargs.
         try:
-            qs = self._meta.queryset.values_list(kwargs['field_name'], flat=True).distinct()
+            # Prepare return the HttpResponse.
+            return self.cached_response(request, ("field_values", self._meta.resource_name, kwargs['field_name']),
+                lambda: list(self._meta.queryset.values_list(kwargs['field_name'], flat=True).distinct()),
+                models=self.lookup_models(kwargs['field_name']))
         except FieldError as e:
             return self.create_response(request, data={'error': str(e)}, response_class=HttpBadRequest)
-        # Prepare return the HttpResponse.
-        return self.create_response(request, data=list(qs))
 
 
 class ProfileResource(APIResource):
@@ -158,11 +307,7 @@ class CaptureMethodResource(APIResource):
         ]
 
     def field_values(self, request, **kwargs):
-        try:
-            qs = CaptureMethod.objects.all()
-        except FieldError as e:
-            return self.create_response(request, data={'error': str(e)}, response_class=HttpBadRequest)
-        return self.create_response(request, data=([q.to_dict() for q in qs]))
+        return self.cached_response(request, ("capturemethods",), lambda: [q.to_dict() for q in CaptureMethod.objects.all()])
 
 class RegionResource(APIResource):
     class Meta:
@@ -181,11 +326,8 @@ class RegionResource(APIResource):
         ]
 
     def field_values(self, request, **kwargs):
-        try:
-            qs = Region.objects.all().distinct()
-        except FieldError as e:
-            return self.create_response(request, data={'error': str(e)}, response_class=HttpBadRequest)
-        return self.create_response(request, data=([q.to_dict() for q in qs]))
+        #the regions with their districts
+        return self.cached_response(request, ("regions",), lambda: [q.to_dict() for q in Region.objects.all().distinct()], models=[Region, District])
 
 class TenureResource(APIResource):
     class Meta:
@@ -197,7 +339,7 @@ class TenureResource(APIResource):
         list_allowed_methods=['get']
 
 
-class BushfireResource(APIResource):
+class BushfireResource(SpatialQueryMixin,APIResource):
     class Meta:
         queryset = Bushfire.objects.all()
         resource_name = 'bushfire'
@@ -207,36 +349,41 @@ class BushfireResource(APIResource):
 
     @property
     def urls(self):
-        return self.prepend_urls()
+        return self.prepend_urls() + self.query_urls()
 
     def field_values(self, request, **kwargs):
         # Get a list of unique values for the field passed in kwargs.
         if kwargs['field_name'] == 'year':
-            qs = Bushfire.objects.all().distinct().order_by('year').values_list('year', flat=True)[::1]
-            year_list = qs if current_finyear() in qs else qs + [current_finyear()]
-            return self.create_response(request, data=year_list)
+            def _years():
+                qs = Bushfire.objects.all().distinct().order_by('year').values_list('year', flat=True)[::1]
+                return qs if current_finyear() in qs else qs + [current_finyear()]
+            return self.cached_response(request, ("year", current_finyear()), _years)
         elif kwargs['field_name'] == 'fire_number':
         # Get a list of fire_numbers and names for the field passed in kwargs and request.GET params.
-            if request.GET.get('include_final_report') == 'true':
-                qs = Bushfire.objects.filter(report_status__in=(Bushfire.STATUS_INITIAL_AUTHORISED,Bushfire.STATUS_FINAL_AUTHORISED,Bushfire.STATUS_REVIEWED))
-            else:
-                qs = Bushfire.objects.filter(report_status=Bushfire.STATUS_INITIAL_AUTHORISED)
-            if request.GET.get('region_id'):
-                qs = qs.filter(region_id=request.GET.get('region_id'))
-            if request.GET.get('district_id'):
-                qs = qs.filter(district_id=request.GET.get('district_id'))
-            if request.GET.get('year'):
-                qs = qs.filter(year=request.GET.get('year'))
-
-            qs = qs.order_by('fire_number').values('fire_number', 'name', 'tenure__name')
+            include_final_report = request.GET.get('include_final_report') == 'true'
+            region_id = request.GET.get('region_id')
+            district_id = request.GET.get('district_id')
+            year = request.GET.get('year')
+            def _fire_numbers():
+                if include_final_report:
+                    qs = Bushfire.objects.filter(report_status__in=(Bushfire.STATUS_INITIAL_AUTHORISED,Bushfire.STATUS_FINAL_AUTHORISED,Bushfire.STATUS_REVIEWED))
+                else:
+                    qs = Bushfire.objects.filter(report_status=Bushfire.STATUS_INITIAL_AUTHORISED)
+                if region_id:
+                    qs = qs.filter(region_id=region_id)
+                if district_id:
+                    qs = qs.filter(district_id=district_id)
+                if year:
+                    qs = qs.filter(year=year)
 
+                return list(qs.order_by('fire_number').values('fire_number', 'name', 'tenure__name'))
 
-            return self.create_response(request, data=list(qs))
+            return self.cached_response(request, ("fire_number", include_final_report, region_id, district_id, year), _fire_numbers, models=[Bushfire, Tenure])
 
 
         return super(BushfireResource, self).field_values(request, **kwargs)
 
-class BushfireSpatialResource(ModelResource):
+class BushfireSpatialResource(SpatialQueryMixin,ModelResource):
     """ http://localhost:8000/api/v1/bushfire/?format=json
         curl --dump-header - -H "Content-Type: application/json" -X PATCH --data '{"origin_point":[11,-12], "area":12347, "fire_boundary": [[[[115.6528663436689,-31.177579372720448],[116.20507608972612,-31.386375097597803],[116.36167288338414,-31.009993330384674],[115.77374807912422,-30.999004081706918],[115.6528663436689,-31.177579372720448]]]]}' http://localhost:8000/api/v1/bushfire/1/?format=json
     """
@@ -251,6 +398,124 @@ class BushfireSpatialResource(ModelResource):
         allowed_methods=['patch']
         list_allowed_methods=[]
 
+    query_fire_boundary = True
+
+    def prepend_urls(self):
+        return [
+            url(
+                r"^(?P<resource_name>{})/batch/$".format(self._meta.resource_name),
+                self.wrap_view('batch_update'), name="api_bushfirespatial_batch"),
+        ] + self.query_urls()
+
+    def batch_update(self, request, **kwargs):
+        """
+        Update a list of bushfires in one request and one transaction.
+        The request data is a list of the PATCH data of each bushfire, with the bushfire id in "id".
+        Each bushfire is updated in its own savepoint, so a failed update doesn't roll back the others,
+        and the final snapshots of the updated bushfires are created together at the end.
+        Return the list of results, in the same order as the request data:
+            {"id":bushfire id, "status":200, "fire_number":fire number}
+            {"id":bushfire id, "status":280, "new_bushfire":{"id":new bushfire id,"fire_number":new fire number}} if the bushfire was invalidated
+            {"id":bushfire id, "status":error status, "error":error message} if failed
+        """
+        self.method_check(request, allowed=['post','patch'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        if is_external_user(request.user):
+            return HttpUnauthorized()
+
+        items = self.deserialize(request, request.body, format=request.META.get('CONTENT_TYPE', 'application/json'))
+        if isinstance(items,dict):
+            items = items.get("objects")
+        if not isinstance(items,list) or any(not isinstance(item,dict) for item in items):
+            return self.create_response(request, data={'error': "The request data should be a list of bushfire data"}, response_class=HttpBadRequest)
+
+        ids = [self.batch_item_id(item) for item in items]
+        results = []
+        snapshots = []
+        with transaction.atomic(), deferred_revision(request=request):
+            bushfires = Bushfire.objects.in_bulk([bushfire_id for bushfire_id in ids if bushfire_id])
+            #resolve all the tenure categories with one lookup
+            categories = set()
+            for item in items:
+                for layer in ((item.get("area") or {}).get("layers") or {}).values():
+                    categories.update(d["category"] for d in layer.get("areas",[]))
+            if categories:
+                tenure_index.get_many(categories)
+
+            for bushfire_id,item in zip(ids,items):
+                if bushfire_id:
+                    results.append(self.batch_update_item(request, bushfires.get(bushfire_id), item, snapshots))
+                else:
+                    results.append({"id":item.get("id"),"status":400,"error":"Invalid bushfire id({})".format(item.get("id"))})
+
+            if snapshots:
+                serialize_bushfires('final', 'SSS Update', snapshots)
+
+        return self.create_response(request, data=results)
+
+    @staticmethod
+    def batch_item_id(item):
+        """
+        Return the bushfire id of the batch item, or None if it is missing or not an integer
+        """
+        bushfire_id = item.get("id")
+        if isinstance(bushfire_id,bool):
+            return None
+        try:
+            bushfire_id = int(bushfire_id)
+        except (TypeError,ValueError):
+            return None
+        return bushfire_id if bushfire_id > 0 else None
+
+    def batch_update_item(self, request, bushfire, data, snapshots):
+        """
+        Update a bushfire in a savepoint, the same way as a PATCH request;
+        the bushfires which need a final snapshot are appended to snapshots
+        Return the result of the update
+        """
+        if not bushfire:
+            return {"id":data.get("id"),"status":404,"error":"Bushfire({}) Not Found".format(data.get("id"))}
+
+        bundle = self.full_dehydrate(self.build_bundle(obj=bushfire, request=request))
+        bundle = self.alter_detail_data_to_serialize(request, bundle)
+        count = len(snapshots)
+        try:
+            with transaction.atomic():
+                try:
+                    self.update_in_place(request, bundle, data, snapshots=snapshots)
+                except ImmediateHttpResponse as ex:
+                    if ex.response.status_code != 280:
+                        raise
+                    #the bushfire was invalidated and replaced by a new bushfire
+                    return {"id":bushfire.id,"status":280,"new_bushfire":json.loads(ex.response.content)}
+        except ImmediateHttpResponse as ex:
+            del snapshots[count:]
+            return {"id":bushfire.id,"status":ex.response.status_code,"error":ex.response.content or None}
+        except ValidationError as ex:
+            del snapshots[count:]
+            return {"id":bushfire.id,"status":400,"error":"; ".join(ex.messages)}
+        except Exception as ex:
+            del snapshots[count:]
+            return {"id":bushfire.id,"status":500,"error":str(ex)}
+
+        return {"id":bushfire.id,"status":200,"fire_number":bundle.obj.fire_number}
+
+    def update_in_place(self, request, original_bundle, new_data, snapshots=None):
+        """
+        Same as tastypie's update_in_place, but check the update is authorized before obj_update, which saves the bushfire itself,
+        and pass snapshots to obj_update
+        """
+        original_bundle.data.update(**dict_strip_unicode_keys(new_data))
+        self.alter_deserialized_detail_data(request, original_bundle.data)
+        self.authorized_update_detail(self.get_object_list(request), original_bundle)
+        kwargs = {
+            self._meta.detail_uri_name: self.get_bundle_detail_data(original_bundle),
+            'request': request,
+        }
+        return self.obj_update(bundle=original_bundle, snapshots=snapshots, **kwargs)
+
     def hydrate(self, bundle):
         for field_name in self._meta.extra_fields:
             m = getattr(self,"hydrate_{}".format(field_name)) if hasattr(self,"hydrate_{}".format(field_name)) else None
@@ -280,9 +545,15 @@ class BushfireSpatialResource(ModelResource):
             bundle.obj.final_fire_boundary = False
             bundle.obj.fireboundary_uploaded_by = None
             bundle.obj.fireboundary_uploaded_date = None
-        elif isinstance(bundle.data['fire_boundary'], list):
-            #bushfire has fire boundaries
-            bundle.data['fire_boundary'] = MultiPolygon([Polygon(*p) for p in bundle.data['fire_boundary']])
+        elif isinstance(bundle.data['fire_boundary'],basestring) and bundle.obj.fire_boundary and bundle.data['fire_boundary'] == unicode(bundle.obj.fire_boundary):
+            #the dehydrated fire boundary of the bushfire, not changed
+            return bundle
+        elif isinstance(bundle.data['fire_boundary'], (list,dict,basestring)):
+            #bushfire has fire boundaries, passed as multipolygon coordinates, GeoJSON or hex/base64 encoded WKB
+            try:
+                bundle.data['fire_boundary'] = parse_multipolygon(bundle.data['fire_boundary'])
+            except GeometryError as ex:
+                raise ImmediateHttpResponse(response=HttpBadRequest(str(ex)))
             bundle.obj.fireboundary_uploaded_by = bundle.request.user
             bundle.obj.fireboundary_uploaded_date = timezone.now()
 
@@ -400,21 +671,18 @@ class BushfireSpatialResource(ModelResource):
         bundle.obj.region = bundle.obj.district.region
         #print("processing district, set district to {}".format(bundle.obj.district) )
 
+    #the data which are already stored in other fields or tables, and are not kept in sss_data
+    sss_data_exclude = ("fire_boundary","plantations")
+
     def hydrate_sss_data(self,bundle):
         #print("processing sss data" )
-        sss_data = bundle.data
-        
-        datas = []
-        for key in ["fire_boundary","plantations"]:
-            if sss_data.has_key(key):
-                datas.append((key,sss_data.pop(key)))
-
-        bundle.obj.sss_data = json.dumps(sss_data)
-        for data in datas:
-            sss_data[data[0]] = data[1]
+        bundle.obj.sss_data = json.dumps(dict([(k,v) for k,v in bundle.data.iteritems() if k not in self.sss_data_exclude]))
 
 
-    def obj_update(self, bundle, **kwargs):
+    def obj_update(self, bundle, snapshots=None, **kwargs):
+        """
+        snapshots: if not None, the bushfire is appended to it instead of creating its final snapshot straight away
+        """
         try:
             # Allows BFRS and SSS to perform update only if permitted
             if is_external_user(bundle.request.user):
@@ -458,11 +726,15 @@ class BushfireSpatialResource(ModelResource):
                 else:
                     #no plantation data,remove the plantations data from table
                     BushfireProperty.objects.filter(bushfire=bundle.obj,name="plantations").delete()
+                bundle.obj.reset_properties()
     
             if bundle.obj.report_status >=  Bushfire.STATUS_FINAL_AUTHORISED:
                 if bundle.obj.fire_boundary.contains(bundle.obj.origin_point):
                     # if bushfire has been authorised, update snapshot and archive old snapshot
-                    serialize_bushfire('final', 'SSS Update', bundle.obj)
+                    if snapshots is None:
+                        serialize_bushfire('final', 'SSS Update', bundle.obj)
+                    else:
+                        snapshots.append(bundle.obj)
                 else:
                     if bundle.obj.is_reviewed:
                         update_status(bundle.request, bundle.obj, "delete_review",action_desc="Delete review because origin point is outside of fire boundary after uploading from SSS",action_name="Upload")
@@ -484,6 +756,10 @@ class BushfireSpatialResource(ModelResource):
                 traceback.print_exc()
             raise
 
+#the models of the api resources and the models joined by their lookups
+for model in (Bushfire, Tenure, Profile, CaptureMethod, Region, District):
+    lookup_cache.register(model)
+
 v1_api = Api(api_name='v1')
 v1_api.register(BushfireResource())
 v1_api.register(BushfireSpatialResource())
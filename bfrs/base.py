@@ -14,6 +14,8 @@ from django.core.urlresolvers import reverse
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
+from bfrs.revisions import get_revision
+
 logger = logging.getLogger("log." + __name__)
 INITIAL_COMMENT = 'Initial version.'
 
@@ -36,10 +38,26 @@ class Audit(models.Model):
     def __init__(self, *args, **kwargs):
         super(Audit, self).__init__(*args, **kwargs)
         self._changed_data = None
-        self._initial = {}
-        if self.pk:
-            for field in self._meta.fields:
-                self._initial[field.attname] = getattr(self, field.attname)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Audit, cls).from_db(db, field_names, values)
+        # Keep a reference to the loaded row; the initial values are only
+        # built when the changes are checked, and deferred fields are not loaded.
+        instance._loaded_values = (field_names, values)
+        return instance
+
+    @property
+    def _initial(self):
+        """
+        The values loaded from the database, keyed by field attname.
+        """
+        if not hasattr(self, "_initial_values"):
+            if hasattr(self, "_loaded_values"):
+                self._initial_values = dict(zip(*self._loaded_values))
+            else:
+                self._initial_values = {}
+        return self._initial_values
 
     def has_changed(self):
         """
@@ -106,16 +124,19 @@ class Audit(models.Model):
         super(Audit, self).save(*args, **kwargs)
 
         if created:
-            with reversion.create_revision():
-                reversion.set_comment('Initial version.')
+            comment = INITIAL_COMMENT
+        elif self.has_changed():
+            comment = 'Changed ' + ', '.join(self.changed_data) + '.'
         else:
-            if self.has_changed():
-                comment = 'Changed ' + ', '.join(self.changed_data) + '.'
-                with reversion.create_revision():
-                    reversion.set_comment(comment)
-            else:
-                with reversion.create_revision():
-                    reversion.set_comment('Nothing changed.')
+            comment = 'Nothing changed.'
+
+        revision = get_revision()
+        if revision:
+            # the object is saved into the deferred revision of the request or operation
+            revision.set_comment(comment)
+        else:
+            with reversion.create_revision():
+                reversion.set_comment(comment)
 
     def __str__(self):
         return str(self.pk)
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from bfrs.sss import sss_client
+
+import logging
+logger = logging.getLogger(__name__)
+
+#the equal area projection the burnt areas are calculated in
+ALBERS_SRID = 998999
+ALBERS_PROJ4 = '+proj=aea +lat_1=-17.5 +lat_2=-31.5 +lat_0=0 +lon_0=121 +x_0=5000000 +y_0=10000000 +ellps=GRS80 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs'
+ALBERS_WKT = 'PROJCS["Albers_Equal_Conic_Area_GDA_Western_Australia",GEOGCS["GCS_GDA_1994",DATUM["D_GDA_1994",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Albers"],PARAMETER["False_Easting",5000000.0],PARAMETER["False_Northing",10000000.0],PARAMETER["Central_Meridian",121.0],PARAMETER["Standard_Parallel_1",-17.5],PARAMETER["Standard_Parallel_2",-31.5],PARAMETER["Latitude_Of_Origin",0.0],UNIT["Meter",1.0]]'
+
+SSS = "sss"
+LOCAL = "local"
+
+FIRE_SQL = """
+SELECT valid, reason, ST_AsEWKB(geom), ST_Area(geom)
+FROM (
+    SELECT ST_IsValid(g) AS valid, ST_IsValidReason(g) AS reason,
+           ST_Transform(CASE WHEN ST_IsValid(g) THEN g ELSE ST_Multi(ST_CollectionExtract(ST_MakeValid(g), 3)) END, %(srid)s) AS geom
+    FROM (SELECT ST_GeomFromEWKB(%(fire)s) AS g) f
+) t
+"""
+
+LAYER_AREA_SQL = """
+WITH fire AS (
+    SELECT ST_GeomFromEWKB(%(fire)s) AS geom
+), features AS (
+    SELECT l.{category} AS category,
+           ST_Intersection(ST_Transform(CASE WHEN ST_IsValid(l.{geometry}) THEN l.{geometry} ELSE ST_MakeValid(l.{geometry}) END, %(srid)s), fire.geom) AS geom
+    FROM {table} l, fire
+    WHERE l.{geometry} && ST_Transform(fire.geom, %(layer_srid)s) AND ST_Intersects(l.{geometry}, ST_Transform(fire.geom, %(layer_srid)s)){filter}
+)
+SELECT
+    (SELECT json_agg(json_build_array(category, area)) FROM (SELECT category, ST_Area(ST_Union(geom)) AS area FROM features GROUP BY category) a),
+    (SELECT ST_AsEWKB(ST_Difference((SELECT geom FROM fire), ST_Union(geom))) FROM features)
+"""
+
+
+def create_albers_projection(cursor):
+    cursor.execute("SELECT COUNT(*) FROM spatial_ref_sys WHERE srid=%s", [ALBERS_SRID])
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(
+            "INSERT INTO spatial_ref_sys (srid,auth_name,auth_srid,proj4text,srtext) VALUES (%s,'wa-dbca',%s,%s,%s)",
+            [ALBERS_SRID, ALBERS_SRID, ALBERS_PROJ4, ALBERS_WKT]
+        )
+
+
+class LocalAreaClient(object):
+    """
+    Calculate the burnt areas in PostGIS against the tenure layers loaded into the local database,
+    instead of sending the fire boundaries to the SSS getArea api.
+    The layer "<workspace>:<name>" is read from the table <schema>.<name>, and spatial returns the same structure as SSS:
+    the areas are in hectares, calculated in the WA Albers equal area projection,
+    the overlapping features of a category are counted once, and the area counted in a layer is excluded from the following layers.
+    Use bfrs.migration_utils.compare_burnt_area_backends (the compare_burnt_areas command) to check the results against SSS.
+    """
+    def __init__(self, schema, geometry_column):
+        self.schema = schema
+        self.geometry_column = geometry_column
+        self._srids = {}
+
+    def layer_srid(self, cursor, name):
+        if name not in self._srids:
+            cursor.execute("SELECT Find_SRID(%s,%s,%s)", [self.schema, name, self.geometry_column])
+            self._srids[name] = cursor.fetchone()[0]
+        return self._srids[name]
+
+    def layer_areas(self, cursor, layer, fire):
+        """
+        Return a tuple of the list of (category, area in square metres)
+        and the part of the fire outside of the layer (None if the fire doesn't intersect the layer)
+        """
+        name = layer["layerid"].split(":")[-1]
+        sql = LAYER_AREA_SQL.format(
+            table="{}.{}".format(connection.ops.quote_name(self.schema), connection.ops.quote_name(name)),
+            geometry=connection.ops.quote_name(self.geometry_column),
+            category=connection.ops.quote_name(layer["properties"]["category"]),
+            #the cql filters used by the layers are valid sql
+            filter=" AND ({})".format(layer["cqlfilter"].replace("%", "%%")) if layer.get("cqlfilter") else ""
+        )
+        cursor.execute(sql, {"fire": fire, "srid": ALBERS_SRID, "layer_srid": self.layer_srid(cursor, name)})
+        areas, remaining = cursor.fetchone()
+        return (areas or [], remaining)
+
+    def get_area(self, cursor, geom, layers):
+        cursor.execute(FIRE_SQL, {"fire": geom.ewkb, "srid": ALBERS_SRID})
+        valid, reason, fire, total_area = cursor.fetchone()
+        status = {} if valid else {"invalid": [reason]}
+        data = {"total_area": total_area / 10000.0}
+        if layers:
+            data["layers"] = {}
+            layers_area = 0
+            for layer in layers:
+                areas = []
+                if fire:
+                    categories, remaining = self.layer_areas(cursor, layer, fire)
+                    for category, area in categories:
+                        areas.append({"category": category, "area": area / 10000.0})
+                        layers_area += area / 10000.0
+                    if categories:
+                        fire = remaining
+                data["layers"][layer["id"]] = {"areas": areas}
+            data["other_area"] = data["total_area"] - layers_area
+        return {"status": status, "data": data}
+
+    def spatial(self, objs, geometry_field, options):
+        """
+        Same as SSSClient.spatial, but only supports the getArea option
+        """
+        area_options = options["area"]
+        if area_options.get("return_geometry"):
+            raise Exception("The local burnt area calculation doesn't return the geometries of the debug mode")
+        results = []
+        with connection.cursor() as cursor:
+            create_albers_projection(cursor)
+            for obj in objs:
+                try:
+                    with transaction.atomic():
+                        results.append({"area": self.get_area(cursor, getattr(obj, geometry_field), area_options.get("layers"))})
+                except Exception as ex:
+                    logger.error("Failed to calculate the burnt area of {}. {}".format(obj.fire_number, str(ex)))
+                    results.append(ex)
+        return results
+
+
+local_area_client = LocalAreaClient(settings.BURNT_AREA_LAYER_SCHEMA, settings.BURNT_AREA_LAYER_GEOMETRY)
+
+
+def area_client(backend=None):
+    """
+    Return the client calculating the burnt areas with the backend ("sss" or "local"); default is settings.BURNT_AREA_BACKEND
+    """
+    backend = backend or settings.BURNT_AREA_BACKEND
+    if backend == LOCAL:
+        return local_area_client
+    elif backend == SSS:
+        return sss_client
+    raise Exception("Burnt area backend({}) Not Support".format(backend))
@@ -2,7 +2,7 @@ import json
 
 from django import forms
 from django.http import HttpResponse    #remove after  testing for document upload
-from bfrs.models import (Bushfire, AreaBurnt, Damage, Injury,BushfireSnapshot,DamageSnapshot,InjurySnapshot,AreaBurntSnapshot,
+from bfrs.models import (Bushfire, AreaBurnt, Damage, Injury,BushfireSnapshot,
         Region, District, Profile,
         current_finyear,get_finyear,Tenure,Cause,
         Document,DocumentTag,DocumentCategory,
@@ -457,9 +457,9 @@ class BushfireViewForm(BaseBushfireViewForm):
 class BushfireSnapshotViewForm(BaseBushfireViewForm):
     def __init__(self,*args,**kwargs):
         super(BushfireSnapshotViewForm,self).__init__(*args,**kwargs)
-        self.damages          = DamageSnapshot.objects.filter(snapshot = self.instance)
-        self.injuries         = InjurySnapshot.objects.filter(snapshot = self.instance)
-        self.tenures_burnt    = AreaBurntSnapshot.objects.filter(snapshot = self.instance)
+        self.damages          = self.instance.damages
+        self.injuries         = self.instance.injuries
+        self.tenures_burnt    = self.instance.tenures_burnt
 
     class Meta:
         model = BushfireSnapshot
@@ -1011,6 +1011,7 @@ class BushfireCreateForm(InitialBushfireForm):
         super(BushfireCreateForm,self)._save_m2m()
         if self.plantations:
             BushfireProperty.objects.create(bushfire=self.instance,name="plantations",value=json.dumps(self.plantations))
+            self.instance.reset_properties()
 
     class Meta:
         model = Bushfire
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+from django.utils import six
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon, GEOSException
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.db.models.functions import GeoFunc
+
+import logging
+logger = logging.getLogger(__name__)
+
+hex_re = re.compile("^[0-9a-fA-F]+$")
+wkt_re = re.compile("^(SRID=-?[0-9]+;)?\s*[A-Za-z]+\s*(\(|EMPTY)")
+
+
+class GeometryError(Exception):
+    pass
+
+
+def parse_geometry(value, srid=4326):
+    """
+    Parse a geometry passed in by SSS and return a GEOSGeometry.
+    value can be
+        a GeoJSON geometry (dict or string), or a GeoJSON feature
+        a list of polygon coordinates, the coordinates of a GeoJSON MultiPolygon
+        a hex or base64 encoded WKB/EWKB string
+        a WKT/EWKT string
+    The geometry is parsed by GDAL/GEOS in one call, without building the polygons in python.
+    """
+    try:
+        if isinstance(value, list):
+            geom = GEOSGeometry(json.dumps({"type": "MultiPolygon", "coordinates": value}))
+        elif isinstance(value, dict):
+            if value.get("type") == "Feature":
+                value = value.get("geometry")
+            geom = GEOSGeometry(json.dumps(value))
+        elif isinstance(value, basestring):
+            value = value.strip()
+            if value.startswith("{") or wkt_re.match(value) or hex_re.match(value):
+                geom = GEOSGeometry(value)
+            else:
+                geom = GEOSGeometry(six.memoryview(base64.b64decode(value)))
+        else:
+            raise GeometryError("Unsupported geometry data type({})".format(type(value).__name__))
+    except (GEOSException, GDALException, ValueError, TypeError, binascii.Error) as ex:
+        raise GeometryError("Invalid geometry data.{}".format(str(ex)))
+
+    if not geom.srid:
+        geom.srid = srid
+    elif geom.srid != srid:
+        geom.transform(srid)
+    return geom
+
+
+def simplify_multipolygon(geom, tolerance):
+    """
+    Return the MultiPolygon simplified with the tolerance, keeping the topology; or None if nothing is left
+    """
+    simplified = geom.simplify(tolerance, preserve_topology=True)
+    if isinstance(simplified, Polygon):
+        simplified = MultiPolygon(simplified, srid=geom.srid)
+    if not isinstance(simplified, MultiPolygon) or simplified.empty:
+        return None
+    return simplified
+
+
+def make_valid(geom):
+    """
+    Return the geometry if it is valid; otherwise repair it with one ST_MakeValid call,
+    keeping the polygonal part only.
+    """
+    if geom.valid:
+        return geom
+
+    logger.debug("Repair invalid geometry: {}".format(geom.valid_reason))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT ST_AsEWKB(ST_Multi(ST_CollectionExtract(ST_MakeValid(ST_GeomFromEWKB(%s)),3)))",
+            [geom.ewkb]
+        )
+        row = cursor.fetchone()
+
+    valid_geom = GEOSGeometry(six.memoryview(row[0])) if row and row[0] else None
+    if not valid_geom or valid_geom.empty:
+        raise GeometryError("The geometry is invalid and can't be repaired.{}".format(geom.valid_reason))
+    return valid_geom
+
+
+def parse_multipolygon(value, srid=4326):
+    """
+    Parse and validate the fire boundary passed in by SSS.
+    Return a valid MultiPolygon
+    """
+    geom = make_valid(parse_geometry(value, srid=srid))
+    if isinstance(geom, Polygon):
+        geom = MultiPolygon(geom, srid=geom.srid)
+    elif not isinstance(geom, MultiPolygon):
+        raise GeometryError("The fire boundary should be a Polygon or MultiPolygon, but it is a {}".format(geom.geom_type))
+    return geom
+
+
+class SimplifyPreserveTopology(GeoFunc):
+    function = "ST_SimplifyPreserveTopology"
+
+
+def zoom_tolerance(zoom):
+    """
+    Return the simplification tolerance in degrees for the zoom level of a 256 pixel web map, half of a pixel
+    """
+    return 360.0 / (256 * 2 ** zoom) / 2
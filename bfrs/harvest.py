@@ -13,20 +13,38 @@ import email
 import struct
 import logging
 import requests
-from imaplib import IMAP4_SSL
+import multiprocessing
+import select
+import socket
+import ssl
+import traceback
+from imaplib import IMAP4, IMAP4_SSL
 from datetime import datetime
+from collections import OrderedDict
 import lxml.html
 import sys
 import os
 import re
 
-from bfrs.models import Bushfire
-from bfrs.utils import serialize_bushfire, create_admin_user
+from bfrs.models import Bushfire, HarvestCheckpoint
+from bfrs.utils import serialize_bushfires, create_admin_user
+from bfrs.revisions import deferred_revision
+from bfrs.lookups import lookup_cache
+from bfrs.sql_views import view_refresher
 from django.core.mail import EmailMessage
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.db.models import Case, CharField, Value, When
 
 logger = logging.getLogger(__name__)
 BATCH_SIZE = 600
+#the min number of emails per process to parse the emails in a process pool
+PARALLEL_PARSE_MIN = 20
+#the max number of new emails whose headers are fetched in one incremental harvest
+HEADER_BATCH_SIZE = 5000
+#the header fields fetched to shortlist the DFES incident emails
+SHORTLIST_HEADERS = "SUBJECT FROM TO DATE"
+uid_re = re.compile("UID (\d+)")
+shortlist_re = re.compile(settings.HARVEST_SHORTLIST_SUBJECT, re.IGNORECASE)
 
 class DeferredIMAP():
     '''
@@ -34,20 +52,31 @@ class DeferredIMAP():
     a bit of state about an IMAP server
     and handling logins/logouts.
     Note instances aren't threadsafe.
+    By default every command logs in and out again;
+    between open_session and close_session one authenticated connection is kept and reused.
     '''
     def __init__(self, host, user, password, email_folder):
+        self.imp = None
+        self.uidvalidity = None
+        self.persistent = False
+        self.host = host
+        self.user = user
+        self.password = password
+        self.email_folder = email_folder
+        self.reset()
+
+    def reset(self):
         self.deletions = []
         self.moved_uat = []
         self.moved_dev = []
         self.moved_test = []
         self.flags = []
         self.success_flags = []
-        self.host = host
-        self.user = user
-        self.password = password
-        self.email_folder = email_folder
 
     def login(self):
+        if self.imp is not None:
+            #the persistent session is already logged in
+            return
         self.imp = IMAP4_SSL(self.host)
         self.imp.login(self.user, self.password)
         #self.imp.select("INBOX")
@@ -55,46 +84,154 @@ class DeferredIMAP():
         if resp[0] != 'OK':
             logger.error("Could not get Mail Folder: {}".format(resp[1]))
             sys.exit()
+        self.uidvalidity = int(self.imp.response('UIDVALIDITY')[1][0])
         if 'bfrs-prod' not in os.getcwd() and settings.HARVEST_EMAIL_FOLDER.lower() == 'inbox':
             logger.error("NON PROD BFRS Server accessing BFRS Email Inbox: {}".format(os.getcwd()))
             sys.exit()
 
     def logout(self, expunge=False):
+        if self.persistent:
+            #CLOSE would expunge the deleted messages, the persistent session has to expunge them itself
+            self.imp.expunge()
+            return
         if expunge:
             self.imp.expunge
         self.imp.close()
         self.imp.logout()
+        self.imp = None
+
+    def open_session(self):
+        '''
+        Log in and keep the connection for all the following commands
+        '''
+        self.persistent = True
+        self.login()
 
-    def flush(self):
+    def close_session(self):
+        '''
+        Log out the persistent session; the connection could be broken already, so errors are ignored
+        '''
+        self.persistent = False
+        imp, self.imp = self.imp, None
+        #the pending message numbers are not reliable after reconnecting
+        self.reset()
+        if imp is None:
+            return
+        try:
+            imp.logout()
+        except Exception as e:
+            logger.debug("Failed to log out the IMAP session: {}".format(e))
+
+    def idle(self, timeout):
+        '''
+        Wait in IMAP IDLE (RFC 2177) until the server reports new messages or timeout seconds passed.
+        Only used in a persistent session.
+        Return True if new messages arrived
+        '''
+        imp = self.imp
+        tag = imp._new_tag()
+        imp.send("{} IDLE\r\n".format(tag))
+        line = imp.readline()
+        if not line.startswith("+"):
+            raise IMAP4.error("IDLE is not supported: {}".format(line.strip()))
+
+        sock = getattr(imp, "sslobj", None) or imp.sock
+        arrived = False
+        deadline = time.time() + timeout
+        try:
+            while not arrived:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                #an untagged response could arrive in the same packet as the continuation response, and be buffered already
+                if not self._buffered() and not select.select([sock], [], [], remaining)[0]:
+                    break
+                line = imp.readline()
+                if not line:
+                    raise IMAP4.abort("IMAP connection closed during IDLE")
+                if line.startswith("* BYE"):
+                    raise IMAP4.abort("IMAP server closed the connection: {}".format(line.strip()))
+                if line.rstrip().upper().endswith((" EXISTS", " RECENT")):
+                    arrived = True
+        finally:
+            imp.send("DONE\r\n")
+
+        #read the responses until the IDLE command is completed
+        while True:
+            line = imp.readline()
+            if not line:
+                raise IMAP4.abort("IMAP connection closed during IDLE")
+            if line.startswith(tag):
+                if line.split(" ")[1].upper() != "OK":
+                    raise IMAP4.error("IDLE failed: {}".format(line.strip()))
+                break
+            if line.rstrip().upper().endswith((" EXISTS", " RECENT")):
+                arrived = True
+        return arrived
+
+    def _buffered(self):
+        '''
+        Return True if imaplib has data which is already read from the socket but not consumed yet;
+        select can't see the data in the read buffer of imaplib's file object or in the ssl object
+        '''
+        rbuf = getattr(getattr(self.imp, "file", None), "_rbuf", None)
+        if rbuf is not None:
+            #the read buffer of socket._fileobject
+            rbuf.seek(0, 2)
+            if rbuf.tell() > 0:
+                return True
+        sslobj = getattr(self.imp, "sslobj", None)
+        return bool(sslobj is not None and hasattr(sslobj, "pending") and sslobj.pending())
+
+    def get_uidvalidity(self):
+        '''
+        Return the UIDVALIDITY of the mail folder; the UIDs of the previous sessions are only valid while it is not changed
+        '''
+        self.login()
+        if not self.persistent:
+            self.logout()
+        return self.uidvalidity
+
+    def _run(self, uid, command, *args):
+        '''
+        Run the command with message sequence numbers, or with UIDs if uid is True
+        '''
+        if uid:
+            return self.imp.uid(command.upper(), *args)
+        return getattr(self.imp, command)(*args)
+
+    def flush(self, uid=False):
+        if self.persistent and not any((self.moved_uat, self.moved_dev, self.moved_test, self.success_flags, self.flags, self.deletions)):
+            return
         self.login()
         if self.moved_uat:
             logger.info("Moving {} NON-PROD emails to UAT folder.".format(len(self.moved_uat)))
-            self.imp.copy(",".join(self.moved_uat), 'INBOX/UAT')
-            self.imp.store(",".join(self.moved_uat), '+FLAGS', r'(\Deleted)')
+            self._run(uid, 'copy', ",".join(self.moved_uat), 'INBOX/UAT')
+            self._run(uid, 'store', ",".join(self.moved_uat), '+FLAGS', r'(\Deleted)')
         if self.moved_dev:
             logger.info("Moving {} NON-PROD emails to DEV folder.".format(len(self.moved_dev)))
-            self.imp.copy(",".join(self.moved_dev), 'INBOX/DEV')
-            self.imp.store(",".join(self.moved_dev), '+FLAGS', r'(\Deleted)')
+            self._run(uid, 'copy', ",".join(self.moved_dev), 'INBOX/DEV')
+            self._run(uid, 'store', ",".join(self.moved_dev), '+FLAGS', r'(\Deleted)')
         if self.moved_test:
             logger.info("Moving {} NON-PROD emails to TEST folder.".format(len(self.moved_test)))
-            self.imp.copy(",".join(self.moved_test), 'INBOX/Test')
-            self.imp.store(",".join(self.moved_test), '+FLAGS', r'(\Deleted)')
+            self._run(uid, 'copy', ",".join(self.moved_test), 'INBOX/Test')
+            self._run(uid, 'store', ",".join(self.moved_test), '+FLAGS', r'(\Deleted)')
         if self.success_flags:
             logger.info("Moving {} successfully processed emails to archive folder.".format(len(self.success_flags)))
-            self.imp.store(",".join(self.success_flags), '+FLAGS', r'(\Flagged)')
-            self.imp.copy(",".join(self.success_flags), 'INBOX/flagged_bfrs_emails')
-            self.imp.store(",".join(self.success_flags), '+FLAGS', r'(\Deleted)')
+            self._run(uid, 'store', ",".join(self.success_flags), '+FLAGS', r'(\Flagged)')
+            self._run(uid, 'copy', ",".join(self.success_flags), 'INBOX/flagged_bfrs_emails')
+            self._run(uid, 'store', ",".join(self.success_flags), '+FLAGS', r'(\Deleted)')
         if self.flags:
             logger.info("Flagging {} unprocessable emails.".format(len(self.flags)))
-            self.imp.store(",".join(self.flags), '+FLAGS', r'(\Flagged)')
+            self._run(uid, 'store', ",".join(self.flags), '+FLAGS', r'(\Flagged)')
         if self.deletions:
             logger.info("Deleting {} processed emails.".format(len(self.deletions)))
-            self.imp.store(",".join(self.deletions), '+FLAGS', r'(\Deleted)')
+            self._run(uid, 'store', ",".join(self.deletions), '+FLAGS', r'(\Deleted)')
             self.logout(expunge=True)
 
         else:
             self.logout()
-        self.flags, self.deletions, self.moved = [], [], []
+        self.reset()
 
     def move(self, msgid, env):
         if env.lower() == 'uat':
@@ -117,7 +254,8 @@ class DeferredIMAP():
         def temp(*args, **kwargs):
             self.login()
             result = getattr(self.imp, name)(*args, **kwargs)
-            self.logout()
+            if not self.persistent:
+                self.logout()
             return result
         return temp
 
@@ -145,18 +283,118 @@ def retrieve_emails(search):
     return messages
 
 
-def save_bushfire_emails(queueitem):
+def fetch_uids(uids, parts):
+    """
+    Fetch the parts of the messages by UID.
+    Return a list of (uid, data), or None if the fetch failed
+    """
+    typ, responses = dimap.uid('FETCH', ",".join(str(uid) for uid in uids), '(UID {})'.format(parts))
+    # If protcol error just return
+    if typ != 'OK':
+        logger.error("Failed to fetch {} of the emails {}: {}".format(parts, uids, responses))
+        return None
+    result = []
+    for response in responses:
+        if isinstance(response, tuple):
+            m = uid_re.search(response[0])
+            if m:
+                result.append((int(m.group(1)), response[1]))
+    return result
+
+
+def retrieve_new_emails(last_uid):
+    """
+    Retrieve the DFES incident emails received after the email last_uid, or all the unflagged emails if last_uid is 0.
+    Only the headers of the new emails are fetched first; the bodies are fetched for the emails shortlisted by subject.
+    The last examined email is the one before the first email which failed to be fetched,
+    so the emails are never skipped because of a failed fetch.
+    Return a tuple of the shortlisted messages [(uid, msg)], the emails not shortlisted [(uid, header msg)]
+    and the UID of the last examined email
+    """
+    if last_uid:
+        typ, data = dimap.uid('SEARCH', None, 'UID', '{}:*'.format(last_uid + 1), 'UNFLAGGED')
+    else:
+        typ, data = dimap.uid('SEARCH', None, 'UNFLAGGED')
+    if typ != 'OK':
+        return [], [], last_uid
+    #'n:*' always includes the last email, even if its uid is less than n
+    uids = sorted(uid for uid in (int(u) for u in data[0].split()) if uid > last_uid)[:HEADER_BATCH_SIZE]
+    if not uids:
+        return [], [], last_uid
+
+    headers = fetch_uids(uids, 'BODY.PEEK[HEADER.FIELDS ({})]'.format(SHORTLIST_HEADERS))
+    if headers is None:
+        return [], [], last_uid
+    headers = dict(headers)
+    examined_uid = _examined_uid(uids, headers, last_uid)
+
+    shortlist = []
+    unlisted = []
+    for uid in uids:
+        if uid > examined_uid:
+            break
+        header = email.message_from_string(headers[uid])
+        if shortlist_re.search(header.get('Subject') or ''):
+            if len(shortlist) == BATCH_SIZE:
+                #the rest are processed in the next harvest
+                examined_uid = uid - 1
+                break
+            shortlist.append(uid)
+        else:
+            unlisted.append((uid, header))
+
+    messages = []
+    if shortlist:
+        bodies = fetch_uids(shortlist, 'BODY.PEEK[]')
+        if bodies is None:
+            return [], [], last_uid
+        bodies = dict(bodies)
+        examined_uid = min(examined_uid, _examined_uid(shortlist, bodies, last_uid))
+        messages = [(uid, email.message_from_string(bodies[uid])) for uid in shortlist if uid <= examined_uid]
+        unlisted = [(uid, unlisted_header) for uid, unlisted_header in unlisted if uid <= examined_uid]
+    logger.info("Fetched {}/{} new messages after UID {}.".format(len(messages), len(uids), last_uid))
+    return messages, unlisted, examined_uid
+
+
+def _examined_uid(uids, fetched, last_uid):
+    """
+    Return the uid before the first of the sorted uids which is missing from the fetched data, or the last uid if all are fetched
+    """
+    for uid in uids:
+        if uid not in fetched:
+            logger.warning("Email {} was not fetched, it is examined in the next harvest.".format(uid))
+            return max(last_uid, uid - 1)
+    return uids[-1]
+
+
+def unlisted_email_result(msgid, header):
+    """
+    Return the parse result of an email whose subject isn't shortlisted.
+    Like any other email without an incident number and a fire number, it is flagged and reported
+    """
+    subject = (header.get('Subject') or '').replace('\r\n','')
+    meta = {'date': header.get('Date'), 'from': header.get('From'), 'to': header.get('To'), 'subject': subject}
+    return {'msgid': msgid, 'subject': subject, 'meta': meta, 'incident_num': '', 'fire_num': '', 'env': None, 'error': 'parse'}
+
+
+def is_auto_reply(subject):
+    subject = subject.lower()
+    return 'automatic reply' in subject or 'spam notification' in subject or 'successful sms' in subject
+
+
+def parse_bushfire_email(queueitem):
+    """
+    Parse the DFES incident number and the fire number from an email.
+    Doesn't access the database or the mailbox, so the emails can be parsed in a process pool.
+    Return a dict with the keys: msgid, subject, meta, incident_num, fire_num, env, error
+    """
     msgid, msg = queueitem
-    msg_meta = {}
-    msg_subject = ''
-    incident_num = ''
-    fire_num = ''
+    result = {'msgid': msgid, 'subject': '', 'meta': {}, 'incident_num': '', 'fire_num': '', 'env': None, 'error': None}
     try:
-        admin_user, exists = create_admin_user()
         msg_date = msg.get('Date')
         msg_from = msg.get('From')
         msg_to = msg.get('To')
-        msg_subject = msg.get('Subject').replace('\r\n','')
+        msg_subject = result['subject'] = msg.get('Subject').replace('\r\n','')
         try:
             msg_text = lxml.html.document_fromstring(msg.get_payload(decode=True)).text_content()
         except ValueError:
@@ -169,7 +407,7 @@ def save_bushfire_emails(queueitem):
             except ValueError:
                 msg_text = lxml.html.document_fromstring(msg.as_string()).text_content()
 
-        msg_meta = {
+        result['meta'] = {
             'date': msg_date,
             'from': msg_from,
             'to': msg_to,
@@ -177,62 +415,151 @@ def save_bushfire_emails(queueitem):
         }
         try:
             msg_text_reply = msg_text.split('REPLY')[0] # ignore the body content after the string 'REPLY'
-            incident_num = re.split('incident:', msg_text_reply, flags=re.IGNORECASE)[1].split('\r')[0].strip()
-            fire_num = msg_text.split('Fire Number:')[1].split('\r')[0].strip()
+            incident_num = result['incident_num'] = re.split('incident:', msg_text_reply, flags=re.IGNORECASE)[1].split('\r')[0].strip()
+            fire_num = result['fire_num'] = msg_text.split('Fire Number:')[1].split('\r')[0].strip()
             if not incident_num or not fire_num:
                 raise Exception('Failed to parse incident number or fire number from email')
-        except: 
+        except:
+            result['error'] = 'parse'
+            return result
+
+        if settings.HARVEST_EMAIL_FOLDER.lower() == 'inbox' and any(x in msg_subject for x in ['uat', 'UAT', 'dev', 'DEV', 'test', 'Test', 'TEST']):
+            if any(x in msg_subject for x in ['uat', 'UAT']):
+                result['env'] = 'uat'
+            elif any(x in msg_subject for x in ['dev', 'DEV']):
+                result['env'] = 'dev'
+            elif any(x in msg_subject for x in ['test', 'Test', 'TEST']):
+                result['env'] = 'test'
+        elif not (re.search('incident:', msg_text, flags=re.IGNORECASE) and 'Fire Number:' in msg_text):
+            raise Exception('Incident: and Fire Number: text missing from email')
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def parse_bushfire_emails(messages):
+    """
+    Parse the emails in a process pool if there are enough emails to pay for starting the processes
+    """
+    processes = min(settings.HARVEST_PARSE_PROCESSES, len(messages) // PARALLEL_PARSE_MIN)
+    if processes <= 1:
+        return map(parse_bushfire_email, messages)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(parse_bushfire_email, messages)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def apply_bushfire_emails(results):
+    """
+    Update the DFES incident numbers of the bushfires parsed from the emails.
+    The bushfires are loaded with one query, snapshotted in bulk and updated with one statement;
+    the emails are flagged or moved according to the results.
+    """
+    updates = OrderedDict()
+    for result in results:
+        msgid, msg_subject = result['msgid'], result['subject']
+        if result['error'] == 'parse':
             err_msg = "Failed to parse incident number or fire number from email"
             subject = 'DFES HARVEST ERROR: Incident No - Auto Update Failed - {}'.format(msg_subject)
             body = 'Subject: {}<br><br>Could not parse {}'.format(subject, err_msg)
 
             logger.warning(body)
-            if not ('automatic reply' in msg_subject.lower() or 'spam notification' in msg_subject.lower() or 'successful sms' in msg_subject.lower()):
+            if not is_auto_reply(msg_subject):
                 support_email(subject, body)
             dimap.flag(msgid)
-            return
-
-        if settings.HARVEST_EMAIL_FOLDER.lower() == 'inbox' and any(x in msg_subject for x in ['uat', 'UAT', 'dev', 'DEV', 'test', 'Test', 'TEST']):
-            if any(x in msg_subject for x in ['uat', 'UAT']):
-                dimap.move(msgid, 'uat')
-            elif any(x in msg_subject for x in ['dev', 'DEV']):
-                dimap.move(msgid, 'dev')
-            elif any(x in msg_subject for x in ['test', 'Test', 'TEST']):
-                dimap.move(msgid, 'test')
-
-        elif (re.search('incident:', msg_text, flags=re.IGNORECASE) and 'Fire Number:' in msg_text):
-            logger.info('Updating DFES Incident Number - ' + incident_num + ' - ' + fire_num)
-            bf = Bushfire.objects.get(fire_number=fire_num)
-            bf.dfes_incident_no = incident_num
-            bf.modifier = admin_user
-            serialize_bushfire('Final', 'DFES Incident No. Update', bf) 
-            bf.save()
-            #dimap.flag(msgid)
-            dimap.success_flag(msgid)
-            if not (len(incident_num) in [6,8] and incident_num.isdigit()):
-                subject = 'DFES HARVEST Update Warning: Incident No. is not 6 digits - {}'.format(incident_num)
-                body = "WARNING: DFES Incident number updated successfully, but it is not 6 numeric digits. {} - DFES Incident No. {}".format(fire_num, incident_num)
-                logger.warning(body)
-                support_email(subject, body)
+        elif result['error']:
+            logger.warning("Couldn't parse {}, error: {}".format(result['meta'], result['error']))
+            if not is_auto_reply(msg_subject):
+                support_email(msg_subject, result['meta'], result['error'])
+            dimap.flag(msgid)
+        elif result['env']:
+            dimap.move(msgid, result['env'])
         else:
-            raise Exception('Incident: and Fire Number: text missing from email')
+            #the latest email of a bushfire wins
+            updates.setdefault(result['fire_num'], []).append(result)
 
-    except ObjectDoesNotExist as e:
+    if not updates:
+        return
 
-        err_msg = "{}\nFailed to update incident no. {} - Bushfire.objects.get(fire_number='{}') query failed".format(e, incident_num, fire_num)
-        subject = 'DFES HARVEST ERROR: Incident No - Auto Update Failed'
-        body = 'Subject: {}<br><br>Could not parse {}'.format(subject, err_msg)
-        logger.warning(err_msg)
-        support_email(subject, body, e)
-        dimap.flag(msgid)
+    bushfires = dict([(bf.fire_number, bf) for bf in Bushfire.objects.filter(fire_number__in=updates.keys())])
+    admin_user, exists = create_admin_user()
+    updated = []
+    for fire_num, fire_results in updates.iteritems():
+        bf = bushfires.get(fire_num)
+        if not bf:
+            for result in fire_results:
+                err_msg = "Failed to update incident no. {} - Bushfire.objects.get(fire_number='{}') query failed".format(result['incident_num'], fire_num)
+                subject = 'DFES HARVEST ERROR: Incident No - Auto Update Failed'
+                body = 'Subject: {}<br><br>Could not parse {}'.format(subject, err_msg)
+                logger.warning(err_msg)
+                support_email(subject, body)
+                dimap.flag(result['msgid'])
+            continue
+        incident_num = fire_results[-1]['incident_num']
+        logger.info('Updating DFES Incident Number - ' + incident_num + ' - ' + fire_num)
+        bf.dfes_incident_no = incident_num
+        bf.modifier = admin_user
+        bf.modified = timezone.now()
+        updated.append(bf)
+
+    if not updated:
         return
 
+    try:
+        update_incident_numbers(updated, admin_user)
+        succeeded = updated
     except Exception as e:
-        logger.warning("Couldn't parse {}, error: {}".format(msg_meta, e))
-        if not ('automatic reply' in msg_subject.lower() or 'spam notification' in msg_subject.lower() or 'successful sms' in msg_subject.lower()):
-            support_email(msg_subject, msg_meta, e)
-        dimap.flag(msgid)
-        return
+        #retry the bushfires one by one, so one bad bushfire doesn't fail the others
+        logger.warning("Failed to update the DFES incident numbers in bulk, updating the bushfires one by one. error: {}".format(e))
+        succeeded = []
+        for bf in updated:
+            try:
+                update_incident_numbers([bf], admin_user)
+                succeeded.append(bf)
+            except Exception as e:
+                logger.warning("Failed to update the DFES incident number of {}, error: {}".format(bf.fire_number, e))
+                support_email('DFES HARVEST ERROR: Incident No - Auto Update Failed - {}'.format(bf.fire_number), 'Failed to update {}'.format(bf.fire_number), e)
+                for result in updates[bf.fire_number]:
+                    dimap.flag(result['msgid'])
+
+    for bf in succeeded:
+        for result in updates[bf.fire_number]:
+            dimap.success_flag(result['msgid'])
+        incident_num = bf.dfes_incident_no
+        if not (len(incident_num) in [6,8] and incident_num.isdigit()):
+            subject = 'DFES HARVEST Update Warning: Incident No. is not 6 digits - {}'.format(incident_num)
+            body = "WARNING: DFES Incident number updated successfully, but it is not 6 numeric digits. {} - DFES Incident No. {}".format(bf.fire_number, incident_num)
+            logger.warning(body)
+            support_email(subject, body)
+
+
+def update_incident_numbers(bushfires, admin_user):
+    """
+    Snapshot the bushfires and update their DFES incident numbers with one statement in one transaction
+    """
+    with transaction.atomic(), deferred_revision(user=admin_user) as revision:
+        serialize_bushfires('Final', 'DFES Incident No. Update', bushfires)
+        Bushfire.objects.filter(id__in=[bf.id for bf in bushfires]).update(
+            dfes_incident_no=Case(*[When(id=bf.id, then=Value(bf.dfes_incident_no)) for bf in bushfires], output_field=CharField()),
+            modifier=admin_user,
+            modified=bushfires[0].modified
+        )
+        #the bushfires are updated without sending post_save
+        transaction.on_commit(lambda: lookup_cache.clear(Bushfire))
+        transaction.on_commit(view_refresher.schedule)
+        for bf in bushfires:
+            revision.add(bf)
+        revision.set_comment('DFES Incident No. Update')
+
+
+def save_bushfire_emails(messages):
+    """
+    Parse the emails in parallel, then apply the incident numbers in bulk
+    """
+    apply_bushfire_emails(parse_bushfire_emails(messages))
 
 
 def support_email(subject, body, e=None):
@@ -244,13 +571,111 @@ def support_email(subject, body, e=None):
     message.send()
 
 
-def cron(request=None):
+def harvest(incremental=None):
+    """
+    Process the unflagged emails and apply the flags/moves/deletions.
+    incremental: only examine the emails received after the last harvest; default is settings.HARVEST_INCREMENTAL
+    Return the number of processed emails
+    """
+    if incremental is None:
+        incremental = settings.HARVEST_INCREMENTAL
+    if incremental:
+        return harvest_incremental()
+    messages = retrieve_emails('(UNFLAGGED)')
+    save_bushfire_emails(messages)
+    dimap.flush()
+    return len(messages)
+
+
+def harvest_incremental():
+    """
+    Process the emails received after the checkpoint of the mail folder, and move the checkpoint to the last examined email.
+    All the unflagged emails are examined again if the UIDVALIDITY of the folder is changed.
+    """
+    uidvalidity = dimap.get_uidvalidity()
+    checkpoint = HarvestCheckpoint.objects.filter(folder=dimap.email_folder).first()
+    if not checkpoint:
+        checkpoint = HarvestCheckpoint(folder=dimap.email_folder, uidvalidity=uidvalidity)
+    elif checkpoint.uidvalidity != uidvalidity:
+        logger.warning("The UIDVALIDITY of {} is changed, examine all the unflagged emails.".format(dimap.email_folder))
+        checkpoint.uidvalidity, checkpoint.last_uid = uidvalidity, 0
+
+    messages, unlisted, last_uid = retrieve_new_emails(checkpoint.last_uid)
+    apply_bushfire_emails(parse_bushfire_emails(messages) + [unlisted_email_result(uid, header) for uid, header in unlisted])
+    dimap.flush(uid=True)
+    if dimap.uidvalidity == uidvalidity:
+        #the uids are meaningless if the folder was recreated in the meantime
+        checkpoint.last_uid = last_uid
+        checkpoint.save()
+    return len(messages)
+
+
+class HarvestDaemon(object):
+    """
+    Keep one authenticated IMAP session and harvest the DFES emails as soon as they arrive.
+    The mailbox is harvested after connecting, whenever IDLE reports new messages, and every idle_timeout seconds
+    (IMAP servers drop IDLE sessions after 30 minutes).
+    A lost connection is reopened after a delay which is doubled after each failure, up to max_delay seconds;
+    a failed harvest, e.g. the database is unavailable, is retried the same way.
+    """
+    #the errors caused by a broken connection or an unavailable server
+    connection_errors = (IMAP4.abort, IMAP4.error, socket.error, ssl.SSLError)
+
+    def __init__(self, imap, idle_timeout, max_delay, incremental=None):
+        self.imap = imap
+        self.idle_timeout = idle_timeout
+        self.max_delay = max_delay
+        self.incremental = incremental
+
+    def harvest(self):
+        #the database connection could be closed by the server while idling
+        close_old_connections()
+        try:
+            count = harvest(self.incremental)
+        finally:
+            close_old_connections()
+        if count:
+            logger.info("Harvested {} emails.".format(count))
+
+    def run(self):
+        delay = 1
+        while True:
+            try:
+                self.imap.open_session()
+                logger.info("Connected to {} as {}, waiting for emails.".format(self.imap.host, self.imap.user))
+                self.harvest()
+                delay = 1
+                while True:
+                    self.imap.idle(self.idle_timeout)
+                    self.harvest()
+            except self.connection_errors as e:
+                logger.warning("IMAP connection failed: {}. Reconnect in {} seconds.".format(e, delay))
+                self.imap.close_session()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+            except Exception as e:
+                logger.error("Harvest failed: {}. Retry in {} seconds.".format(traceback.format_exc(), delay))
+                self.imap.close_session()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+            except:
+                self.imap.close_session()
+                raise
+
+
+def daemon(incremental=None):
+    """
+    Run the harvester until it is killed
+    """
+    HarvestDaemon(dimap, settings.HARVEST_IDLE_TIMEOUT, settings.HARVEST_RECONNECT_MAX_DELAY, incremental=incremental).run()
+
+
+def cron(request=None, incremental=None):
     """
     Collect and save bushfire reporting system emails
     """
     start = timezone.now()
-    map(save_bushfire_emails, retrieve_emails('(UNFLAGGED)'))
-    dimap.flush()
+    harvest(incremental)
     delta = timezone.now() - start
     html = "<html><body>Cron run at {} for {}.</body></html>".format(start, delta)
     if request:
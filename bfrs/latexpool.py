@@ -0,0 +1,237 @@
+import errno
+import fcntl
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LatexPoolFull(Exception):
+    """
+    Raised when the pdf worker pool has no free worker and the job queue is full,
+    or the job waited in the queue longer than the queue timeout
+    """
+    pass
+
+
+class LatexTimeout(Exception):
+    """
+    Raised when a latex compile runs longer than the compile timeout
+    """
+    pass
+
+
+class LatexWorkerPool(object):
+    """
+    Bounded pool of latexmk processes shared by all the web worker processes on the host.
+    The pool is a set of lock files in 'folder': a job runs while it holds the flock on one of the 'workers' worker slots,
+    and waits for a free worker while it holds one of the 'queue_size' queue slots; any further job is rejected straight away with LatexPoolFull.
+    flock is released by the kernel when a process dies, so a crashed web worker never leaks a slot.
+    Each compile is killed if it runs longer than 'compile_timeout' seconds.
+    The metrics are kept in a json file in the same folder, so they cover all the web worker processes.
+    """
+    #seconds between two attempts to get a free worker slot
+    poll_interval = 0.2
+
+    def __init__(self, workers, queue_size, queue_timeout, compile_timeout, folder):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.queue_timeout = queue_timeout
+        self.compile_timeout = compile_timeout
+        self.folder = folder
+        self.stats_file = os.path.join(folder, "stats.json")
+
+    def _ensure_folder(self):
+        if not os.path.exists(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError as ex:
+                if ex.errno != errno.EEXIST:
+                    raise
+
+    def _slot_file(self, name, index):
+        self._ensure_folder()
+        return os.path.join(self.folder, "{}-{}.lock".format(name, index))
+
+    def _try_lock(self, name, size):
+        """
+        Try to lock one of the 'size' slot files without blocking.
+        Return the open slot file which holds the lock, or None if all the slots are locked
+        """
+        for index in range(size):
+            f = open(self._slot_file(name, index), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except IOError as ex:
+                f.close()
+                if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+        return None
+
+    def _count_locked(self, name, size):
+        """
+        Return the number of slot files currently locked by a job
+        """
+        locked = 0
+        for index in range(size):
+            path = self._slot_file(name, index)
+            with open(path, "a") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except IOError as ex:
+                    if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                        raise
+                    locked += 1
+        return locked
+
+    @contextmanager
+    def _metrics(self):
+        """
+        Lock the shared stats file and yield its metrics; the metrics are written back when the block exits
+        """
+        self._ensure_folder()
+        with open(self.stats_file, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                data = f.read()
+                try:
+                    metrics = json.loads(data) if data else {}
+                except ValueError:
+                    logger.error("The latex pool stats file({}) is corrupted, reset it".format(self.stats_file))
+                    metrics = {}
+                yield metrics
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(metrics))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _record(self, **kwargs):
+        """
+        Add the values to the shared counters; the keys starting with 'max_' keep the largest value instead
+        """
+        try:
+            with self._metrics() as metrics:
+                for key, value in kwargs.items():
+                    if key.startswith("max_"):
+                        metrics[key] = max(metrics.get(key, 0), value)
+                    else:
+                        metrics[key] = metrics.get(key, 0) + value
+        except (IOError, OSError) as ex:
+            #the metrics are for monitoring only, never fail a pdf because of them
+            logger.error("Failed to update the latex pool stats file({}). {}".format(self.stats_file, str(ex)))
+
+    def _acquire(self):
+        """
+        Wait for a free worker.
+        Return the locked worker slot file and the seconds spent in the queue
+        """
+        start = time.time()
+        worker = self._try_lock("worker", self.workers)
+        if worker:
+            return (worker, 0)
+
+        queue = self._try_lock("queue", self.queue_size)
+        if not queue:
+            self._record(rejected=1)
+            raise LatexPoolFull("The pdf generator is busy ({} running, {} queued), please try again later.".format(self.workers, self.queue_size))
+
+        try:
+            self._record(max_queue_depth=self._count_locked("queue", self.queue_size))
+            while True:
+                time.sleep(self.poll_interval)
+                worker = self._try_lock("worker", self.workers)
+                if worker:
+                    return (worker, time.time() - start)
+                if time.time() - start >= self.queue_timeout:
+                    self._record(rejected=1)
+                    raise LatexPoolFull("Timed out after waiting {} seconds for a free pdf generator, please try again later.".format(self.queue_timeout))
+        finally:
+            queue.close()
+
+    def run(self, cmd, check_output=True):
+        """
+        Run the latex command in the pool.
+        If check_output is True, raise CalledProcessError if the command failed
+        Return the output of the command
+        """
+        worker, wait_time = self._acquire()
+        try:
+            start = time.time()
+            # run latexmk in its own process group, so the pdflatex processes it forks can be killed together
+            process = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,preexec_fn=os.setsid)
+            killed = []
+            def _kill():
+                killed.append(True)
+                try:
+                    os.killpg(process.pid,signal.SIGKILL)
+                except OSError:
+                    pass
+            timer = threading.Timer(self.compile_timeout,_kill)
+            timer.start()
+            try:
+                output = process.communicate()[0]
+            finally:
+                timer.cancel()
+            compile_time = time.time() - start
+        finally:
+            #closing the slot file releases the worker slot
+            worker.close()
+
+        if killed:
+            result = "timeouts"
+        elif process.returncode:
+            result = "failed"
+        else:
+            result = "compiled"
+        self._record(total_wait_time=wait_time,total_compile_time=compile_time,max_compile_time=compile_time,**{result:1})
+
+        logger.debug("Compiled latex document in {0:.2f} seconds after waiting {1:.2f} seconds".format(compile_time,wait_time))
+        if killed:
+            raise LatexTimeout("Generating the pdf file took longer than {} seconds and was cancelled.".format(self.compile_timeout))
+        if check_output and process.returncode:
+            raise subprocess.CalledProcessError(process.returncode,cmd,output=output)
+        return output
+
+    @property
+    def queue_depth(self):
+        return self._count_locked("queue", self.queue_size)
+
+    @property
+    def running(self):
+        return self._count_locked("worker", self.workers)
+
+    def stats(self):
+        with self._metrics() as metrics:
+            metrics = dict(metrics)
+        compiled = metrics.get("compiled", 0)
+        failed = metrics.get("failed", 0)
+        timeouts = metrics.get("timeouts", 0)
+        jobs = compiled + failed + timeouts
+        return {
+            "workers":self.workers,
+            "running":self.running,
+            "queue_depth":self.queue_depth,
+            "max_queue_depth":metrics.get("max_queue_depth", 0),
+            "compiled":compiled,
+            "failed":failed,
+            "timeouts":timeouts,
+            "rejected":metrics.get("rejected", 0),
+            "avg_compile_time":round(metrics.get("total_compile_time", 0) / jobs,2) if jobs else 0,
+            "max_compile_time":round(metrics.get("max_compile_time", 0),2),
+            "avg_wait_time":round(metrics.get("total_wait_time", 0) / jobs,2) if jobs else 0,
+        }
+
+
+latex_pool = LatexWorkerPool(settings.LATEX_WORKERS, settings.LATEX_QUEUE_SIZE, settings.LATEX_QUEUE_TIMEOUT, settings.LATEX_COMPILE_TIMEOUT, settings.LATEX_POOL_DIR)
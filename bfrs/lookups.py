@@ -0,0 +1,109 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LookupCache(object):
+    """
+    Cache the lookup data returned by the api (distinct field values, fire numbers, ...).
+    Each registered model has a generation number, which is changed after an object of the model is saved or deleted.
+    The cache key of a lookup contains the generation of every model the lookup reads,
+    so all the cached lookups reading a model are dropped together; a lookup reading a model which is not registered is not cached.
+    A cache backend shared by all processes is needed to drop the lookups cached by the other processes,
+    so the lookups are not cached if cache_name is empty or names a local memory cache; the data is loaded and its etag computed for each request.
+    """
+    #the cache backends which are not shared by the processes
+    local_backends = ("django.core.cache.backends.locmem.LocMemCache", "django.core.cache.backends.dummy.DummyCache")
+
+    def __init__(self, cache_name, timeout):
+        self.cache_name = cache_name
+        self.timeout = timeout
+        self.models = set()
+        self._enabled = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_name]
+
+    @property
+    def enabled(self):
+        if self._enabled is None:
+            if not self.cache_name:
+                self._enabled = False
+            elif settings.CACHES.get(self.cache_name, {}).get("BACKEND") in self.local_backends:
+                logger.warning("The lookup cache({}) is not shared by the processes, the lookups are not cached".format(self.cache_name))
+                self._enabled = False
+            else:
+                self._enabled = True
+        return self._enabled
+
+    def register(self, model):
+        """
+        Drop the cached lookups of the model when an object of the model is saved or deleted
+        """
+        if model in self.models:
+            return
+        self.models.add(model)
+        post_save.connect(self._changed, sender=model, dispatch_uid="lookup_cache_{}_saved".format(model.__name__))
+        post_delete.connect(self._changed, sender=model, dispatch_uid="lookup_cache_{}_deleted".format(model.__name__))
+
+    def _changed(self, sender, **kwargs):
+        #drop the lookups after commit, otherwise the lookups could be cached again with the uncommitted data
+        transaction.on_commit(lambda: self.clear(sender))
+
+    def _generation_key(self, model):
+        return "bfrs_lookup_generation:{}".format(model._meta.label_lower)
+
+    def generation(self, model):
+        key = self._generation_key(model)
+        generation = self.cache.get(key)
+        if generation is None:
+            self.cache.add(key, int(time.time() * 1000), None)
+            generation = self.cache.get(key)
+        return generation
+
+    def clear(self, model):
+        if not self.enabled:
+            return
+        key = self._generation_key(model)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            #not in the cache
+            self.cache.set(key, int(time.time() * 1000), None)
+        logger.debug("Lookup cache of {} is cleared".format(model._meta.label))
+
+    def get(self, models, key, loader):
+        """
+        models: the list of the models read by the lookup
+        key: a tuple of the lookup name and the filter arguments
+        loader: a function to load the data if not cached
+        Return a tuple of the data and its etag
+        """
+        if not self.enabled or any(model not in self.models for model in models):
+            data = loader()
+            return (data, self._etag(data))
+
+        generations = ":".join("{}.{}".format(model._meta.label_lower, self.generation(model)) for model in models)
+        cache_key = "bfrs_lookup:{}:{}".format(generations, hashlib.md5(repr(key)).hexdigest())
+        value = self.cache.get(cache_key)
+        if value is None:
+            data = loader()
+            value = (data, self._etag(data))
+            self.cache.set(cache_key, value, self.timeout)
+        return value
+
+    @staticmethod
+    def _etag(data):
+        return hashlib.md5(json.dumps(data, sort_keys=True, default=str)).hexdigest()
+
+
+lookup_cache = LookupCache(settings.API_LOOKUP_CACHE, settings.API_LOOKUP_CACHE_TIMEOUT)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from optparse import make_option
+from django.conf import settings
+from bfrs.models import Bushfire
+from bfrs.migration_utils import compare_burnt_area_backends
+
+import os
+import sys
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Calculates the burnt areas with both SSS and the local tenure layers, and reports the differences; nothing is saved \n \
+\n \
+        usage: ./manage.py compare_burnt_areas [--limit 100] [--tolerance 0.01] [fire_number ...] \n \
+    '
+
+    def add_arguments(self, parser):
+        parser.add_argument('fire_numbers', nargs='*',
+            help='The bushfires to compare; default is the latest bushfires with a fire boundary')
+        parser.add_argument('--limit', type=int, dest='limit', default=100,
+            help='The number of the latest bushfires compared if no fire number is given')
+        parser.add_argument('--tolerance', type=float, dest='tolerance', default=0.01,
+            help='The difference in hectares ignored')
+
+    def handle(self, *args, **options):
+        qs = Bushfire.objects.filter(fire_boundary__isnull=False)
+        if options['fire_numbers']:
+            bushfires = list(qs.filter(fire_number__in=options['fire_numbers']))
+        else:
+            bushfires = list(qs.order_by('-modified')[:options['limit']])
+        differences = compare_burnt_area_backends(bushfires, tolerance=options['tolerance'])
+        for fire_number, key, sss_area, local_area in differences:
+            self.stdout.write('{}\t{}\tsss={}\tlocal={}'.format(fire_number, key, sss_area, local_area))
+        self.stdout.write('Compared {} bushfires, {} differences'.format(len(bushfires), len(differences)))
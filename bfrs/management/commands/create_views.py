@@ -12,10 +12,17 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Creates sql views \n \
 \n \
-        usage: ./manage.py create_views \n \
+        usage: ./manage.py create_views [--materialized] \n \
     '
 
+    def add_arguments(self, parser):
+        parser.add_argument('--materialized', action='store_true', dest='materialized', default=settings.SQL_VIEWS_MATERIALIZED,
+            help='Create materialized views, refreshed by ./manage.py refresh_views and after bushfires are saved; requires SQL_VIEWS_MATERIALIZED')
+
     def handle(self, *args, **options):
-        create_all_views()
+        if options['materialized'] and not settings.SQL_VIEWS_MATERIALIZED:
+            #the web workers only refresh the views after bushfires are saved if the setting is on
+            raise CommandError('SQL_VIEWS_MATERIALIZED is not set, the materialized views would never be refreshed after bushfires are saved. Set SQL_VIEWS_MATERIALIZED=True and restart the web workers first.')
+        create_all_views(materialized=options['materialized'])
         self.stdout.write('Done')
 
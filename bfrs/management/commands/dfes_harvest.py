@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from optparse import make_option
 from django.conf import settings
-from bfrs.harvest import cron
+from bfrs.harvest import cron, daemon
 
 import os
 import sys
@@ -12,11 +12,20 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Scans the Inbox for emails from DFES for dfes_incident_no and inserts into the bushfire records \n \
 \n \
-        usage:   ./manage.py dfes_harvest \n \
+        usage:   ./manage.py dfes_harvest [--daemon] [--incremental] \n \
         To Test: respond to the DFES Notification Email with test `Incident: MyNum 12345` \n \
     '
 
+    def add_arguments(self, parser):
+        parser.add_argument('--daemon', action='store_true', dest='daemon', default=False,
+            help='Keep one IMAP session open and harvest the emails as soon as they arrive, until killed')
+        parser.add_argument('--incremental', action='store_true', dest='incremental', default=settings.HARVEST_INCREMENTAL,
+            help='Only examine the emails received after the last harvest, fetching the headers first')
+
     def handle(self, *args, **options):
-        cron()
+        if options['daemon']:
+            daemon(incremental=options['incremental'])
+            return
+        cron(incremental=options['incremental'])
         self.stdout.write('Done')
 
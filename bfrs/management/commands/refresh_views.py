@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from optparse import make_option
+from django.conf import settings
+from bfrs.sql_views import refresh_views
+
+import os
+import sys
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Refreshes the materialized sql views; run it on a schedule to keep the views up to date \n \
+\n \
+        usage: ./manage.py refresh_views \n \
+    '
+
+    def handle(self, *args, **options):
+        names = refresh_views()
+        self.stdout.write('Refreshed {}'.format(', '.join(names)) if names else 'No materialized views')
+
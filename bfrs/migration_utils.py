@@ -1,4 +1,3 @@
-import requests
 import json
 import itertools
 import traceback
@@ -11,6 +10,7 @@ from collections import defaultdict, OrderedDict
 from django.core import serializers
 from django.conf import settings
 from django.db import IntegrityError, transaction,connection
+from django.db.models import Case, Value, When
 from django.utils import timezone
 from django.contrib.gis.geos import Point, GEOSGeometry, Polygon, MultiPolygon, GEOSException
 from django.core.exceptions import ObjectDoesNotExist
@@ -19,6 +19,10 @@ from django.contrib.auth.models import User
 from bfrs.models import (Bushfire, Tenure,AreaBurntSnapshot,AreaBurnt,BushfireSnapshot)
 from bfrs import utils
 from bfrs.utils import serialize_bushfire
+from bfrs.sss import sss_client
+from bfrs.burnt_area import area_client, create_albers_projection
+from bfrs.lookups import lookup_cache
+from bfrs.sql_views import view_refresher
 
 RERUN = 1
 RESUME = 2
@@ -240,20 +244,23 @@ def add_warnings(status,bushfire,scope,datatypes,warnings):
     for warning in warnings:
         all_warnings[warning_key].append(warning)
 
-def refresh_all_bushfires(scope=BUSHFIRE,datatypes = 0,runtype=RESUME,layersuffix=""):
+def refresh_all_bushfires(scope=BUSHFIRE,datatypes = 0,runtype=RESUME,layersuffix="",area_backend=None):
     try:
         min_year = Bushfire.objects.all().order_by("reporting_year").first().reporting_year
         max_year = Bushfire.objects.all().order_by("-reporting_year").first().reporting_year
         year = min_year
         while year <= max_year:
             try:
-                refresh_bushfires(year,scope=scope,datatypes=datatypes,runtype=runtype,layersuffix=layersuffix)
+                refresh_bushfires(year,scope=scope,datatypes=datatypes,runtype=runtype,layersuffix=layersuffix,area_backend=area_backend)
             finally:
                 year += 1
     except:
         return
 
-def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME,size=0,layersuffix="",debug=False):
+def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME,size=0,layersuffix="",debug=False,area_backend=None):
+    """
+    area_backend: calculate the burnt areas with SSS ("sss") or against the tenure layers in the local database ("local"); default is settings.BURNT_AREA_BACKEND
+    """
     if datatypes == 0 or scope == 0:
         return
 
@@ -287,7 +294,7 @@ def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME
                             continue
                         bushfire = Bushfire.objects.get(id = int(key.split(':')[0]))
                         print("Reprocess bushfire({}) {}:{} ".format(bushfire.fire_number,previous_warning[0][3],previous_warning[1]))
-                        warnings = _refresh_bushfire(bushfire,scope=previous_warning[0][1],datatypes=previous_warning[0][2],layersuffix=layersuffix,debug=debug)
+                        warnings = _refresh_bushfire(bushfire,scope=previous_warning[0][1],datatypes=previous_warning[0][2],layersuffix=layersuffix,debug=debug,area_backend=area_backend)
                         warning_key = (bushfire.id,bushfire.fire_number)
                         if warnings:
                             add_warnings(status,bushfire,previous_warning[0][1],previous_warning[0][2],warnings)
@@ -320,15 +327,26 @@ def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME
         if runtype & (RERUN | RESUME) > 0:
             bushfires = Bushfire.objects.filter(reporting_year=reporting_year)
             bushfires = bushfires.order_by("id") if last_refreshed_id is None else bushfires.filter(id__gt=last_refreshed_id).order_by("id")
+            bushfires = list(bushfires)
             index = 0
             totalcount = len(bushfires)
-            for bushfire in bushfires:
-                index += 1
-                print("Refresh {}'s bushfire({}), {}/{}".format(reporting_year,bushfire.fire_number,index,totalcount))
-                scope_types = get_scope_and_datatypes(status,bushfire,scope,datatypes)
-                warning_key = (bushfire.id,bushfire.fire_number)
-                for s,t in scope_types:
-                    warnings = _refresh_bushfire(bushfire,scope=s,datatypes=t,layersuffix=layersuffix,debug=debug)
+            position = 0
+            while position < totalcount and not (size and counter >= size):
+                #refresh the bushfires in chunks, so the spatial requests of a chunk can be batched and run concurrently
+                chunk_size = sss_client.batch_size * sss_client.workers
+                if size:
+                    chunk_size = min(chunk_size,size - counter)
+                chunk = bushfires[position:position + chunk_size]
+                position += len(chunk)
+                items = []
+                for bushfire in chunk:
+                    index += 1
+                    print("Refresh {}'s bushfire({}), {}/{}".format(reporting_year,bushfire.fire_number,index,totalcount))
+                    for s,t in get_scope_and_datatypes(status,bushfire,scope,datatypes):
+                        items.append((bushfire,s,t))
+
+                for (bushfire,s,t),warnings in zip(items,_refresh_bushfires(items,layersuffix=layersuffix,debug=debug,area_backend=area_backend)):
+                    warning_key = (bushfire.id,bushfire.fire_number)
                     set_last_refreshed_bushfireid(status,s,t,bushfire.id)
                     if warnings:
                         add_warnings(status,bushfire,s,t,warnings)
@@ -337,9 +355,7 @@ def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME
                                 all_warnings[warning_key].append(w)
                         else:
                             all_warnings[warning_key] = warnings
-                counter += 1
-                if size and counter >= size:
-                    break
+                counter += len(chunk)
                 if datetime.now() - start_time >= save_interval:
                     save_refresh_status(reporting_year,status)
                     start_time = datetime.now()
@@ -363,49 +379,81 @@ def refresh_bushfires(reporting_year,scope=BUSHFIRE,datatypes = 0,runtype=RESUME
                     index += 1
                     print("    {}. {}:{}".format(index,key[3],msg))
 
-def _refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=False):
-    warnings = [] 
-    if datatypes == 0 or scope == 0:
-        return warnings
-
+def _scope_objects(bushfire,scope):
+    """
+    Return the bushfire and/or its snapshots in the scope
+    """
     if scope & (BUSHFIRE | SNAPSHOT) == (BUSHFIRE | SNAPSHOT) :
-        bushfires = itertools.chain([bushfire],bushfire.snapshots.all())
+        return itertools.chain([bushfire],bushfire.snapshot_history)
     elif scope == BUSHFIRE :
-        bushfires = [bushfire]
+        return [bushfire]
     elif scope == SNAPSHOT :
-        bushfires = bushfire.snapshots.all()
+        return bushfire.snapshot_history
     else:
-        raise ("Scope({}) Not Support".format(scope))
-    
-    for bf in bushfires:
-        is_snapshot =  hasattr(bf,"snapshot_type")
-        if datatypes & GRID_DATA == GRID_DATA:
-            try:
-                warning = refresh_grid_data(bf,is_snapshot)
-                if warning :
-                    warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,GRID_DATA,'WARNING'),warning if isinstance(warning,(list,tuple)) else [warning]))
-            except Exception as ex:
-                warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,GRID_DATA,'ERROR'),[str(ex)]))
-
+        raise Exception("Scope({}) Not Support".format(scope))
 
-        if datatypes & ORIGIN_POINT_TENURE == ORIGIN_POINT_TENURE:
-            try:
-                warning = refresh_originpoint_tenure(bf,is_snapshot,layersuffix=layersuffix)
-                if warning :
-                    warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,ORIGIN_POINT_TENURE,'WARNING'),warning if isinstance(warning,(list,tuple)) else [warning]))
-            except Exception as ex:
-                warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,ORIGIN_POINT_TENURE,'ERROR'),[str(ex)]))
+def _refresh_bushfires(items,layersuffix="",debug=False,area_backend=None):
+    """
+    Refresh the spatial data of a list of (bushfire,scope,datatypes).
+    The features of all the bushfires and snapshots are sent to SSS in batches by concurrent workers,
+    and the grid data and origin point tenures are saved with one update statement per model.
+    Return the list of warnings of each item
+    """
+    warnings = [[] for item in items]
+    targets = []
+    for index,(bushfire,scope,datatypes) in enumerate(items):
+        if datatypes == 0 or scope == 0:
+            continue
+        for bf in _scope_objects(bushfire,scope):
+            targets.append((index,bf,hasattr(bf,"snapshot_type"),datatypes))
+
+    for data_type,refresh in (
+        (GRID_DATA,refresh_grid_data_many),
+        (ORIGIN_POINT_TENURE,lambda objs:refresh_originpoint_tenure_many(objs,layersuffix=layersuffix)),
+        (BURNT_AREA,lambda objs:refresh_burnt_area_many(objs,layersuffix=layersuffix,debug=debug,area_backend=area_backend))
+    ):
+        data_type_targets = [t for t in targets if t[3] & data_type == data_type]
+        if not data_type_targets:
+            continue
+        try:
+            results = refresh([(t[1],t[2]) for t in data_type_targets])
+        except Exception as ex:
+            traceback.print_exc()
+            results = [ex] * len(data_type_targets)
 
-        if datatypes & BURNT_AREA == BURNT_AREA:
-            try:
-                warning = refresh_burnt_area(bf,is_snapshot,layersuffix=layersuffix,debug=debug)
-                if warning :
-                    warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,BURNT_AREA,'WARNING'),warning if isinstance(warning,(list,tuple)) else [warning]))
-            except Exception as ex:
-                warnings.append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,BURNT_AREA,'ERROR'),[str(ex)]))
+        for (index,bf,is_snapshot,datatypes),result in zip(data_type_targets,results):
+            if isinstance(result,Exception):
+                warnings[index].append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,data_type,'ERROR'),[str(result)]))
+            elif result:
+                warnings[index].append(((bf.id,SNAPSHOT if is_snapshot else BUSHFIRE,data_type,'WARNING'),result if isinstance(result,(list,tuple)) else [result]))
 
     return warnings
 
+def _refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=False,area_backend=None):
+    return _refresh_bushfires([(bushfire,scope,datatypes)],layersuffix=layersuffix,debug=debug,area_backend=area_backend)[0]
+
+def _single_result(results):
+    if isinstance(results[0],Exception):
+        raise results[0]
+    return results[0]
+
+def _bulk_update(objs,field_name):
+    """
+    Save the field of the bushfires and snapshots with one update statement per model.
+    The objects are updated without sending post_save, so the lookups and sql views are refreshed here
+    """
+    models = OrderedDict()
+    for obj in objs:
+        models.setdefault(obj.__class__,[]).append(obj)
+    for model,model_objs in models.items():
+        field = model._meta.get_field(field_name)
+        model.objects.filter(id__in=[o.id for o in model_objs]).update(**{
+            field.attname:Case(*[When(id=o.id,then=Value(getattr(o,field.attname))) for o in model_objs],output_field=field.target_field if field.is_relation else field)
+        })
+    if objs:
+        transaction.on_commit(lambda: lookup_cache.clear(Bushfire))
+        transaction.on_commit(view_refresher.schedule)
+
 def get_bushfire(bushfire):
     if isinstance(bushfire,int):
         return Bushfire.objects.get(id = bushfire)
@@ -419,7 +467,7 @@ def get_bushfire(bushfire):
         return bushfire
 
 
-def refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=False):
+def refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=False,area_backend=None):
     if isinstance(bushfire,int):
         bushfire = Bushfire.objects.get(id = bushfire)
     elif isinstance(bushfire,basestring):
@@ -427,7 +475,7 @@ def refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=Fa
     elif not isinstance(bushfire,Bushfire):
         raise Exception("Bushfire should be bushfire id or fire number or Bushfire instance")
 
-    warnings = _refresh_bushfire(bushfire,scope=scope,datatypes=datatypes,layersuffix=layersuffix,debug=debug)
+    warnings = _refresh_bushfire(bushfire,scope=scope,datatypes=datatypes,layersuffix=layersuffix,debug=debug,area_backend=area_backend)
     if warnings:
         for key,msgs in warnings:
             if key[1] == BUSHFIRE:
@@ -440,12 +488,8 @@ def refresh_bushfire(bushfire,scope=BUSHFIRE,datatypes=0,layersuffix="",debug=Fa
                 print("    {}. {}:{}".format(index,key[3],msg))
 
 
-def refresh_grid_data(bushfire,is_snapshot):
-    warning = None
-    req_data = {"features":serializers.serialize('geojson',[bushfire],geometry_field='origin_point',fields=('id','fire_number'))}
-    req_options = {}
-    update_fields = ["origin_point_grid"]
-    req_options["grid"] = {
+GRID_DATA_OPTIONS = {
+    "grid":{
         "action":"getClosestFeature",
         "layers":[
             {
@@ -470,117 +514,147 @@ def refresh_grid_data(bushfire,is_snapshot):
             },
         ],
     }
+}
 
-    req_data["options"] = json.dumps(req_options)
-    resp=requests.post(url="{}/spatial".format(settings.SSS_URL), data=req_data,auth=requests.auth.HTTPBasicAuth(settings.USER_SSO, settings.PASS_SSO),verify=settings.SSS_CERTIFICATE_VERIFY)
-    resp.raise_for_status()
-    result = resp.json()
-    grid_data = result["features"][0]["grid"]
-    if grid_data.get("failed"):
-        raise Exception(grid_data["failed"])
-    elif grid_data.get("id") == "fd_grid_points":
-        bushfire.origin_point_grid = "FD:{}".format(grid_data["feature"]["grid"])
-    elif grid_data.get("id") == "pilbara_grid_1km":
-        bushfire.origin_point_grid = "PIL:{}".format(grid_data["feature"]["grid"])
-    else:
-        bushfire.origin_point_grid = None
+def refresh_grid_data(bushfire,is_snapshot):
+    return _single_result(refresh_grid_data_many([(bushfire,is_snapshot)]))
 
-    bushfire.save(update_fields=update_fields)
+def refresh_grid_data_many(targets):
+    """
+    Refresh the grid data of a list of (bushfire or snapshot,is_snapshot)
+    Return the list of warnings or exceptions in the same order
+    """
+    results = []
+    changed = []
+    for (bushfire,is_snapshot),result in zip(targets,sss_client.spatial([t[0] for t in targets],'origin_point',GRID_DATA_OPTIONS)):
+        if isinstance(result,Exception):
+            results.append(result)
+            continue
+        grid_data = result["grid"]
+        if grid_data.get("failed"):
+            results.append(Exception(grid_data["failed"]))
+            continue
+        elif grid_data.get("id") == "fd_grid_points":
+            bushfire.origin_point_grid = "FD:{}".format(grid_data["feature"]["grid"])
+        elif grid_data.get("id") == "pilbara_grid_1km":
+            bushfire.origin_point_grid = "PIL:{}".format(grid_data["feature"]["grid"])
+        else:
+            bushfire.origin_point_grid = None
+        changed.append((bushfire,is_snapshot))
+        results.append(None)
 
-    if is_snapshot:
-        print("The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s grid data is {}".format(bushfire.bushfire.fire_number,bushfire.id,bushfire.fire_number,bushfire.snapshot_type,bushfire.action,bushfire.origin_point_grid if bushfire.origin_point_grid else "null"))
-    else:
-        print("The bushfire report({})'s grid data is {}".format(bushfire.fire_number,bushfire.origin_point_grid if bushfire.origin_point_grid else "null"))
-    return warning
+    _bulk_update([t[0] for t in changed],"origin_point_grid")
 
-def refresh_originpoint_tenure(bushfire,is_snapshot,layersuffix=""):
-    warning = None
-    req_data = {"features":serializers.serialize('geojson',[bushfire],geometry_field='origin_point',fields=('id','fire_number'))}
-    req_options = {}
-    update_fields = ["tenure"]
-    req_options["originpoint_tenure"] = {
-        "action":"getFeature",
-        "layers":[
-            {
-                "id":"state_forest_plantation_distribution",
-                "layerid":"cddp:state_forest_plantation_distribution{}".format(layersuffix),
-                "kmiservice":settings.KMI_URL,
-                "properties":{
-                    "id":"ogc_fid",
-                    "name":"fbr_fire_r",
-                    "category":"fbr_fire_r"
-                },
-            },{
-                "id":"legislated_lands_and_waters",
-                "layerid":"cddp:legislated_lands_and_waters{}".format(layersuffix),
-                "kmiservice":settings.KMI_URL,
-                "properties":{
-                    "id":"ogc_fid",
-                    "name":"name",
-                    "category":"category"
-                },
-            },{
-                "id":"dept_interest_lands_and_waters",
-                "layerid":"cddp:dept_interest_lands_and_waters{}".format(layersuffix),
-                "kmiservice":settings.KMI_URL,
-                "properties":{
-                    "id":"ogc_fid",
-                    "name":"name",
-                    "category":"category"
-                },
-            },{
-                "id":"other_tenures_new",
-                "layerid":"cddp:other_tenures{}".format(layersuffix or "_new"),
-                "kmiservice":settings.KMI_URL,
-                "properties":{
-                    "id":"ogc_fid",
-                    "name":"brc_fms_le",
-                    "category":"brc_fms_le"
-                },
-            },{
-                "id":"sa_nt_burntarea",
-                "layerid":"cddp:sa_nt_state_polygons_burntarea{}".format(layersuffix),
-                "kmiservice":settings.KMI_URL,
-                "properties":{
-                    "category":"name"
-                },
-            }]
-    }
-    req_data["options"] = json.dumps(req_options)
-    resp=requests.post(url="{}/spatial".format(settings.SSS_URL), data=req_data,auth=requests.auth.HTTPBasicAuth(settings.USER_SSO, settings.PASS_SSO),verify=settings.SSS_CERTIFICATE_VERIFY)
-    resp.raise_for_status()
-    result = resp.json()
-    tenure_data = result["features"][0]["originpoint_tenure"]
-    if tenure_data.get("failed"):
-        raise Exception(tenure_data["failed"])
-    elif tenure_data and tenure_data.get('id'):
-        try:
-            bushfire.tenure = utils.get_tenure(tenure_data['feature']['category'],createIfMissing=False)
-        except:
-            raise Exception("Unknown tenure category({})".format(category))
-    else:
-        #origin point is not within dpaw_tenure
-        bushfire.tenure = Tenure.OTHER
+    for bushfire,is_snapshot in changed:
         if is_snapshot:
-            warning = "The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s origin point tenure is \"{}\"".format(
-                bushfire.bushfire.fire_number,
-                bushfire.id,
-                bushfire.fire_number,
-                bushfire.snapshot_type,
-                bushfire.action,
-                bushfire.tenure
-            )
+            print("The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s grid data is {}".format(bushfire.bushfire.fire_number,bushfire.id,bushfire.fire_number,bushfire.snapshot_type,bushfire.action,bushfire.origin_point_grid if bushfire.origin_point_grid else "null"))
         else:
-            warning = "The bushfire report({})'s origin point tenure is \"{}\"".format(bushfire.fire_number,bushfire.tenure)
+            print("The bushfire report({})'s grid data is {}".format(bushfire.fire_number,bushfire.origin_point_grid if bushfire.origin_point_grid else "null"))
+    return results
+
+def originpoint_tenure_options(layersuffix=""):
+    return {
+        "originpoint_tenure":{
+            "action":"getFeature",
+            "layers":[
+                {
+                    "id":"state_forest_plantation_distribution",
+                    "layerid":"cddp:state_forest_plantation_distribution{}".format(layersuffix),
+                    "kmiservice":settings.KMI_URL,
+                    "properties":{
+                        "id":"ogc_fid",
+                        "name":"fbr_fire_r",
+                        "category":"fbr_fire_r"
+                    },
+                },{
+                    "id":"legislated_lands_and_waters",
+                    "layerid":"cddp:legislated_lands_and_waters{}".format(layersuffix),
+                    "kmiservice":settings.KMI_URL,
+                    "properties":{
+                        "id":"ogc_fid",
+                        "name":"name",
+                        "category":"category"
+                    },
+                },{
+                    "id":"dept_interest_lands_and_waters",
+                    "layerid":"cddp:dept_interest_lands_and_waters{}".format(layersuffix),
+                    "kmiservice":settings.KMI_URL,
+                    "properties":{
+                        "id":"ogc_fid",
+                        "name":"name",
+                        "category":"category"
+                    },
+                },{
+                    "id":"other_tenures_new",
+                    "layerid":"cddp:other_tenures{}".format(layersuffix or "_new"),
+                    "kmiservice":settings.KMI_URL,
+                    "properties":{
+                        "id":"ogc_fid",
+                        "name":"brc_fms_le",
+                        "category":"brc_fms_le"
+                    },
+                },{
+                    "id":"sa_nt_burntarea",
+                    "layerid":"cddp:sa_nt_state_polygons_burntarea{}".format(layersuffix),
+                    "kmiservice":settings.KMI_URL,
+                    "properties":{
+                        "category":"name"
+                    },
+                }]
+        }
+    }
 
-    bushfire.save(update_fields=update_fields)
+def refresh_originpoint_tenure(bushfire,is_snapshot,layersuffix=""):
+    return _single_result(refresh_originpoint_tenure_many([(bushfire,is_snapshot)],layersuffix=layersuffix))
 
-    if is_snapshot:
-        print("The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s origin point tenure is \"{}\"".format(bushfire.bushfire.fire_number,bushfire.id,bushfire.fire_number,bushfire.snapshot_type,bushfire.action,bushfire.tenure))
-    else:
-        print("The bushfire report({})'s origin point tenure is \"{}\"".format(bushfire.fire_number,bushfire.tenure))
+def refresh_originpoint_tenure_many(targets,layersuffix=""):
+    """
+    Refresh the origin point tenure of a list of (bushfire or snapshot,is_snapshot)
+    Return the list of warnings or exceptions in the same order
+    """
+    results = []
+    changed = []
+    for (bushfire,is_snapshot),result in zip(targets,sss_client.spatial([t[0] for t in targets],'origin_point',originpoint_tenure_options(layersuffix))):
+        if isinstance(result,Exception):
+            results.append(result)
+            continue
+        warning = None
+        tenure_data = result["originpoint_tenure"]
+        if tenure_data.get("failed"):
+            results.append(Exception(tenure_data["failed"]))
+            continue
+        elif tenure_data and tenure_data.get('id'):
+            category = tenure_data['feature']['category']
+            try:
+                bushfire.tenure = utils.get_tenure(category,createIfMissing=False)
+            except:
+                results.append(Exception("Unknown tenure category({})".format(category)))
+                continue
+        else:
+            #origin point is not within dpaw_tenure
+            bushfire.tenure = Tenure.OTHER
+            if is_snapshot:
+                warning = "The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s origin point tenure is \"{}\"".format(
+                    bushfire.bushfire.fire_number,
+                    bushfire.id,
+                    bushfire.fire_number,
+                    bushfire.snapshot_type,
+                    bushfire.action,
+                    bushfire.tenure
+                )
+            else:
+                warning = "The bushfire report({})'s origin point tenure is \"{}\"".format(bushfire.fire_number,bushfire.tenure)
+        changed.append((bushfire,is_snapshot))
+        results.append(warning)
 
-    return warning
+    _bulk_update([t[0] for t in changed],"tenure")
+
+    for bushfire,is_snapshot in changed:
+        if is_snapshot:
+            print("The bushfire report({})'s snapshot(id={},fire_number='{}',snapshot_type='{}',action='{}')'s origin point tenure is \"{}\"".format(bushfire.bushfire.fire_number,bushfire.id,bushfire.fire_number,bushfire.snapshot_type,bushfire.action,bushfire.tenure))
+        else:
+            print("The bushfire report({})'s origin point tenure is \"{}\"".format(bushfire.fire_number,bushfire.tenure))
+    return results
 
 def to_wkt(geometry,multiple=False):
     def line_to_wkt(coordinates):
@@ -599,7 +673,164 @@ def to_wkt(geometry,multiple=False):
     else:
         raise NotImplementedError("Not Implemeneted.")
 
-def refresh_burnt_area(bushfire,is_snapshot,layersuffix="",debug=False):
+def burnt_area_layers(bushfire,layersuffix="",debug=False):
+    """
+    Return the tenure layers to calculate the burnt area of the bushfire against; None for an initial report
+    """
+    if (bushfire.report_status == Bushfire.STATUS_INITIAL ) :
+        layers =  None
+    else: 
+        layers = [{
+            "id":"legislated_lands_and_waters",
+            "layerid":"cddp:legislated_lands_and_waters{}".format(layersuffix),
+            "cqlfilter":"category<>'State Forest'",
+            "kmiservice":settings.KMI_URL,
+            "properties":{
+                "category":"category"
+            },
+        },{
+            "id":"state_forest_plantation_distribution",
+            "layerid":"cddp:state_forest_plantation_distribution{}".format(layersuffix),
+            "kmiservice":settings.KMI_URL,
+            "properties":{
+                "category":"fbr_fire_r"
+            },
+        },{
+            "id":"dept_interest_lands_and_waters",
+            "layerid":"cddp:dept_interest_lands_and_waters{}".format(layersuffix),
+            "kmiservice":settings.KMI_URL,
+            "properties":{
+                "category":"category"
+            },
+        },{
+            "id":"other_tenures",
+            "layerid":"cddp:other_tenures{}".format(layersuffix or "_new"),
+            "kmiservice":settings.KMI_URL,
+            "properties":{
+                "category":"brc_fms_le"
+            },
+        },{
+            "id":"sa_nt_burntarea",
+            "layerid":"cddp:sa_nt_state_polygons_burntarea{}".format(layersuffix),
+            "kmiservice":settings.KMI_URL,
+            "properties":{
+                "category":"name"
+            },
+        }]
+        if debug:
+            for layer in layers:
+                if layer["id"] == "legislated_lands_and_waters":
+                    layer["properties"]["ogc_fid"] = "ogc_fid"
+                    layer["properties"]["name"] = "name"
+
+                elif layer["id"] == "state_forest_plantation_distribution":
+                    layer["properties"]["ogc_fid"] = "ogc_fid"
+                    layer["properties"]["fbr_tenure"] = "fbr_tenure"
+                    layer["properties"]["fbr_planta"] = "fbr_planta"
+
+                elif layer["id"] == "dept_interest_lands_and_waters":
+                    layer["properties"]["ogc_fid"] = "ogc_fid"
+                    layer["properties"]["name"] = "name"
+
+                elif layer["id"] == "other_tenures":
+                    layer["properties"]["ogc_fid"] = "ogc_fid"
+                    layer["properties"]["brc_cad_le"] = "brc_cad_le"
+
+                elif layer["id"] == "sa_nt_burntarea":
+                    layer["properties"]["ogc_fid"] = "ogc_fid"
+                    layer["properties"]["state"] = "state"
+    return layers
+
+def burnt_area_options(layers,debug=False):
+    if debug:
+        return {"area":{
+            "action":"getArea",
+            "layers":layers,
+            "layer_overlap":False,
+            "merge_result":False,
+            "unit":"ha",
+            "return_geometry":True
+        }}
+    else:
+        return {"area":{
+            "action":"getArea",
+            "layers":layers,
+            "layer_overlap":False,
+            "merge_result":True,
+            "unit":"ha",
+        }}
+
+def refresh_burnt_area_many(targets,layersuffix="",debug=False,area_backend=None):
+    """
+    Refresh the burnt areas of a list of (bushfire or snapshot,is_snapshot)
+    The fire boundaries are sent to the area backend (SSS or the local database) in batches, grouped by the layers they are checked against,
+    then the burnt areas of each bushfire are saved by refresh_burnt_area.
+    Return the list of warnings or exceptions in the same order
+    """
+    groups = defaultdict(list)
+    for index,(bushfire,is_snapshot) in enumerate(targets):
+        if bushfire.fire_boundary:
+            groups[bushfire.report_status == Bushfire.STATUS_INITIAL].append(index)
+    area_results = {}
+    for indexes in groups.values():
+        layers = burnt_area_layers(targets[indexes[0]][0],layersuffix=layersuffix,debug=debug)
+        area_results.update(zip(indexes,area_client(area_backend).spatial([targets[i][0] for i in indexes],'fire_boundary',burnt_area_options(layers,debug=debug))))
+
+    results = []
+    for index,(bushfire,is_snapshot) in enumerate(targets):
+        area_result = area_results.get(index)
+        if isinstance(area_result,Exception):
+            results.append(area_result)
+            continue
+        try:
+            results.append(refresh_burnt_area(bushfire,is_snapshot,layersuffix=layersuffix,debug=debug,area_result=area_result,area_backend=area_backend))
+        except Exception as ex:
+            results.append(ex)
+    return results
+
+def _area_values(area_result):
+    """
+    Flatten a getArea result into a dict of {"total_area"|"other_area"|(layer id,category): area in hectares}
+    """
+    area_data = area_result["area"]["data"]
+    values = {"total_area":area_data["total_area"],"other_area":area_data.get("other_area") or 0}
+    for layer_id,layer_data in (area_data.get("layers") or {}).items():
+        for data in layer_data.get("areas") or []:
+            key = (layer_id,data["category"])
+            values[key] = values.get(key,0) + data["area"]
+    return values
+
+def compare_burnt_area_backends(bushfires,layersuffix="",tolerance=0.01):
+    """
+    Calculate the burnt areas of the bushfires with both SSS and the local database, without saving them.
+    tolerance: the difference in hectares ignored
+    Return the list of (fire number,area key,sss area,local area) which differ; the area key is "error" if a backend failed
+    """
+    groups = defaultdict(list)
+    for bushfire in bushfires:
+        if bushfire.fire_boundary:
+            groups[bushfire.report_status == Bushfire.STATUS_INITIAL].append(bushfire)
+    differences = []
+    for group in groups.values():
+        options = burnt_area_options(burnt_area_layers(group[0],layersuffix=layersuffix))
+        sss_results = area_client("sss").spatial(group,'fire_boundary',options)
+        local_results = area_client("local").spatial(group,'fire_boundary',options)
+        for bushfire,sss_result,local_result in zip(group,sss_results,local_results):
+            if isinstance(sss_result,Exception) or isinstance(local_result,Exception):
+                differences.append((bushfire.fire_number,"error",sss_result,local_result))
+                continue
+            sss_values = _area_values(sss_result)
+            local_values = _area_values(local_result)
+            for key in sorted(set(sss_values) | set(local_values)):
+                if abs(sss_values.get(key,0) - local_values.get(key,0)) > tolerance:
+                    differences.append((bushfire.fire_number,key,sss_values.get(key),local_values.get(key)))
+    return differences
+
+def refresh_burnt_area(bushfire,is_snapshot,layersuffix="",debug=False,area_result=None,area_backend=None):
+    """
+    area_result: the getArea result of the bushfire if it was requested in a batch
+    area_backend: "sss" or "local"; default is settings.BURNT_AREA_BACKEND
+    """
     warning = None
     area_burnt_objects = []
     update_fields = None
@@ -607,16 +838,7 @@ def refresh_burnt_area(bushfire,is_snapshot,layersuffix="",debug=False):
     overlap_area = 0
     if debug:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM spatial_ref_sys WHERE srid=998999")
-            row = cursor.fetchone()
-            if row[0] == 0:
-                #create the projection
-                cursor.execute("""
-                INSERT INTO spatial_ref_sys
-                    (srid,auth_name,auth_srid,proj4text,srtext) 
-                VALUES
-                    (998999,'wa-dbca',998999,'+proj=aea +lat_1=-17.5 +lat_2=-31.5 +lat_0=0 +lon_0=121 +x_0=5000000 +y_0=10000000 +ellps=GRS80 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs','PROJCS["Albers_Equal_Conic_Area_GDA_Western_Australia",GEOGCS["GCS_GDA_1994",DATUM["D_GDA_1994",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Albers"],PARAMETER["False_Easting",5000000.0],PARAMETER["False_Northing",10000000.0],PARAMETER["Central_Meridian",121.0],PARAMETER["Standard_Parallel_1",-17.5],PARAMETER["Standard_Parallel_2",-31.5],PARAMETER["Latitude_Of_Origin",0.0],UNIT["Meter",1.0]]')
-                """)
+            create_albers_projection(cursor)
 
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS burnt_area_bushfire(
@@ -753,108 +975,22 @@ def refresh_burnt_area(bushfire,is_snapshot,layersuffix="",debug=False):
     
         else:
             update_fields = ["fb_validation_req","other_area"]
-            req_data = {"features":serializers.serialize('geojson',[bushfire],geometry_field='fire_boundary',fields=('id','fire_number'))}
-            req_options = {}
-            if (bushfire.report_status == Bushfire.STATUS_INITIAL ) :
-                layers =  None
-            else: 
-                layers = [{
-                    "id":"legislated_lands_and_waters",
-                    "layerid":"cddp:legislated_lands_and_waters{}".format(layersuffix),
-                    "cqlfilter":"category<>'State Forest'",
-                    "kmiservice":settings.KMI_URL,
-                    "properties":{
-                        "category":"category"
-                    },
-                },{
-                    "id":"state_forest_plantation_distribution",
-                    "layerid":"cddp:state_forest_plantation_distribution{}".format(layersuffix),
-                    "kmiservice":settings.KMI_URL,
-                    "properties":{
-                        "category":"fbr_fire_r"
-                    },
-                },{
-                    "id":"dept_interest_lands_and_waters",
-                    "layerid":"cddp:dept_interest_lands_and_waters{}".format(layersuffix),
-                    "kmiservice":settings.KMI_URL,
-                    "properties":{
-                        "category":"category"
-                    },
-                },{
-                    "id":"other_tenures",
-                    "layerid":"cddp:other_tenures{}".format(layersuffix or "_new"),
-                    "kmiservice":settings.KMI_URL,
-                    "properties":{
-                        "category":"brc_fms_le"
-                    },
-                },{
-                    "id":"sa_nt_burntarea",
-                    "layerid":"cddp:sa_nt_state_polygons_burntarea{}".format(layersuffix),
-                    "kmiservice":settings.KMI_URL,
-                    "properties":{
-                        "category":"name"
-                    },
-                }]
-                if debug:
-                    for layer in layers:
-                        if layer["id"] == "legislated_lands_and_waters":
-                            layer["properties"]["ogc_fid"] = "ogc_fid"
-                            layer["properties"]["name"] = "name"
-    
-                        elif layer["id"] == "state_forest_plantation_distribution":
-                            layer["properties"]["ogc_fid"] = "ogc_fid"
-                            layer["properties"]["fbr_tenure"] = "fbr_tenure"
-                            layer["properties"]["fbr_planta"] = "fbr_planta"
-    
-                        elif layer["id"] == "dept_interest_lands_and_waters":
-                            layer["properties"]["ogc_fid"] = "ogc_fid"
-                            layer["properties"]["name"] = "name"
-    
-                        elif layer["id"] == "other_tenures":
-                            layer["properties"]["ogc_fid"] = "ogc_fid"
-                            layer["properties"]["brc_cad_le"] = "brc_cad_le"
-    
-                        elif layer["id"] == "sa_nt_burntarea":
-                            layer["properties"]["ogc_fid"] = "ogc_fid"
-                            layer["properties"]["state"] = "state"
-        
-            if debug:
-                req_options["area"] = {
-                    "action":"getArea",
-                    "layers":layers,
-                    "layer_overlap":False,
-                    "merge_result":False,
-                    "unit":"ha",
-                    "return_geometry":True
-                }
-            else:
-                req_options["area"] = {
-                    "action":"getArea",
-                    "layers":layers,
-                    "layer_overlap":False,
-                    "merge_result":True,
-                    "unit":"ha",
-                }
-            req_data["options"] = json.dumps(req_options)
-            resp=requests.post(url="{}/spatial".format(settings.SSS_URL), data=req_data,auth=requests.auth.HTTPBasicAuth(settings.USER_SSO, settings.PASS_SSO),verify=settings.SSS_CERTIFICATE_VERIFY)
-            resp.raise_for_status()
-            result = resp.json()
+            layers = burnt_area_layers(bushfire,layersuffix=layersuffix,debug=debug)
+            if area_result is None:
+                area_result = _single_result(area_client(area_backend).spatial([bushfire],'fire_boundary',burnt_area_options(layers,debug=debug)))
             fb_validation_req = None
 
             #check result
-            if result["features"]:
-                area_data_status = result["features"][0]["area"]["status"]
-                if area_data_status.get("failed") :
-                    raise Exception(area_data_status["failed"])
-                else:
-                    if area_data_status.get("invalid"):
-                        fb_validation_req = True
-                    else:
-                        fb_validation_req = None
+            area_data_status = area_result["area"]["status"]
+            if area_data_status.get("failed") :
+                raise Exception(area_data_status["failed"])
             else:
-                raise Exception("Unknown Exception")
+                if area_data_status.get("invalid"):
+                    fb_validation_req = True
+                else:
+                    fb_validation_req = None
     
-            area_data = result["features"][0]["area"]["data"]
+            area_data = area_result["area"]["data"]
             #generate the debug data
             if debug:
                 with connection.cursor() as cursor:
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2019-10-02 10:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bfrs', '0026_auto_20190919_1114'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bushfiresnapshot',
+            name='delta',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2019-10-03 14:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bfrs', '0027_bushfiresnapshot_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FireNumberSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bfrs.District')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='firenumbersequence',
+            unique_together=set([('district', 'year')]),
+        ),
+        # start each sequence from the largest fire number already used in the district and year
+        migrations.RunSQL(
+            """
+            INSERT INTO bfrs_firenumbersequence (district_id,year,last_number)
+            SELECT district_id,year,max(substring(fire_number from '(\d+)$')::integer)
+            FROM bfrs_bushfire
+            WHERE fire_number ~ '\d+$'
+            GROUP BY district_id,year
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2019-10-04 09:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bfrs', '0028_firenumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bushfire',
+            name='latest_final_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bfrs.BushfireSnapshot'),
+        ),
+        migrations.AddField(
+            model_name='bushfire',
+            name='latest_initial_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bfrs.BushfireSnapshot'),
+        ),
+        # point the existing bushfires to their latest snapshots
+        migrations.RunSQL(
+            """
+            UPDATE bfrs_bushfire b SET
+                latest_initial_snapshot_id = (SELECT s.id FROM bfrs_bushfiresnapshot s WHERE s.bushfire_id = b.id AND s.snapshot_type = 1 ORDER BY s.created DESC, s.id DESC LIMIT 1),
+                latest_final_snapshot_id = (SELECT s.id FROM bfrs_bushfiresnapshot s WHERE s.bushfire_id = b.id AND s.snapshot_type = 2 ORDER BY s.created DESC, s.id DESC LIMIT 1)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
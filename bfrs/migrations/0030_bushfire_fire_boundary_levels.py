@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2019-10-08 11:02
+from __future__ import unicode_literals
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bfrs', '0029_bushfire_latest_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bushfire',
+            name='fire_boundary_100m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='bushfire',
+            name='fire_boundary_10m',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='bushfire',
+            name='fire_boundary_1km',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='bushfire',
+            name='fire_boundary_envelope',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        # populate the envelope and the simplified fire boundaries of the existing bushfires
+        migrations.RunSQL(
+            """
+            UPDATE bfrs_bushfire SET
+                fire_boundary_envelope = CASE WHEN GeometryType(ST_Envelope(fire_boundary)) = 'POLYGON' THEN ST_Envelope(fire_boundary) ELSE NULL END,
+                fire_boundary_10m = ST_Multi(ST_CollectionExtract(ST_SimplifyPreserveTopology(fire_boundary, 0.0001), 3)),
+                fire_boundary_100m = ST_Multi(ST_CollectionExtract(ST_SimplifyPreserveTopology(fire_boundary, 0.001), 3)),
+                fire_boundary_1km = ST_Multi(ST_CollectionExtract(ST_SimplifyPreserveTopology(fire_boundary, 0.01), 3))
+            WHERE fire_boundary IS NOT NULL;
+            UPDATE bfrs_bushfire SET fire_boundary_10m = NULL WHERE ST_IsEmpty(fire_boundary_10m);
+            UPDATE bfrs_bushfire SET fire_boundary_100m = NULL WHERE ST_IsEmpty(fire_boundary_100m);
+            UPDATE bfrs_bushfire SET fire_boundary_1km = NULL WHERE ST_IsEmpty(fire_boundary_1km);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
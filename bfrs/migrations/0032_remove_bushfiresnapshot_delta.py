@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2019-10-14 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bfrs', '0031_harvestcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='bushfiresnapshot',
+            name='delta',
+        ),
+    ]
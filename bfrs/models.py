@@ -3,6 +3,7 @@ import os
 import json
 import traceback
 from datetime import datetime, timedelta
+from collections import defaultdict
 import pytz
 
 from django.contrib.gis.db import models
@@ -10,13 +11,15 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.encoding import python_2_unicode_compatible
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.core.exceptions import (ValidationError)
 from django.conf import settings
 from django.core import serializers
 from django.utils.safestring import mark_safe
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models.signals import post_delete
+from django.db.models import Prefetch
+from django.db import connection
 from django.dispatch import receiver
+from django.contrib.gis.geos import Polygon
 
 from smart_selects.db_fields import ChainedForeignKey
 import LatLon
@@ -25,6 +28,7 @@ import reversion
 from classproperty import (classproperty,cachedclassproperty)
 
 from bfrs.base import Audit,DictMixin
+from bfrs.geometry import simplify_multipolygon
 
 
 SNAPSHOT_INITIAL = 1
@@ -77,60 +81,47 @@ def get_field(obj,field):
     else:
         return getattr(obj,field) if hasattr(obj,field) else None
 
-def check_mandatory_fields(obj, fields, dep_fields, formsets):
-    """
-    Method to check all required fields have been fileds before allowing Submit/Authorise of report.
-
-    The report can be saved with missing data - so most fields are non-mandatory (as defined in the Model).
-    Idea is to fill in report over time as and when info becomes available.
+def _is_missing(v,dep_v):
+    return dep_v is None or (isinstance(dep_v, (str, unicode)) and not dep_v.strip()) or (isinstance(dep_v,(list,tuple)) and not dep_v)
 
-    However, the report cannot be Submitted/Authorosed unless a given set of fields have been filled.
+class MandatoryFieldsPlan(object):
+    """
+    The mandatory field rules compiled into a validation plan.
+    The rule tuples are parsed once, the labels are resolved once,
+    and the foreign key fields are checked against their id columns, so the related objects are never loaded.
 
     fields    - basic fields
     dep_field - dependent fields (if one field has a value, check that the other has been filled)
     formsets  - fields in formsets
     """
-    missing = []
-    for field in fields:
-        is_active_f = None
-        field_label = None
-        if isinstance(field,tuple):
-            #field label is provided
-            if len(field) == 1:
-                field = field[0]
-            elif len(field) == 2:
-                field_label = field[1]
-                field = field[0]
-            elif len(field) >= 3:
-                field_label = field[1]
-                is_active_f = field[2]
-                field = field[0]
-            else:
-                continue
-
-        if is_active_f and not is_active_f(obj):
-            continue
-
-        value = get_field(obj,field)
-        if value is None or value=='':
-            if field_label:
-                missing.append(field_label)
-            else:
-                try:
-                    missing.append(Bushfire._meta.get_field(field).verbose_name)
-                except:
-                    missing.append(field)
-            
-
-
-    if obj.fire_not_found and obj.is_init_authorised:
-        # no need to check these
-        #dep_fields = {}
-        formsets = []
+    FORMSET_UNKNOWN_FIELDS = {
+        'damages':'damage_unknown',
+        'injuries':'injury_unknown',
+    }
+
+    def __init__(self, fields, dep_fields, formsets):
+        self.rules = (fields, dep_fields, formsets)
+        self.fields = []
+        for field in fields:
+            is_active_f = None
+            field_label = None
+            if isinstance(field,tuple):
+                #field label is provided
+                if len(field) == 1:
+                    field = field[0]
+                elif len(field) == 2:
+                    field_label = field[1]
+                    field = field[0]
+                elif len(field) >= 3:
+                    field_label = field[1]
+                    is_active_f = field[2]
+                    field = field[0]
+                else:
+                    continue
+            self.fields.append((self._getter(field),field_label or self._label(field),is_active_f))
 
-    for field, dep_sets in dep_fields.iteritems():
-        for dep_set in dep_sets:
-            # next line checks for normal Field or Enumerated list field (i.e. '.name')
+        self.dep_fields = []
+        for field, dep_sets in dep_fields.iteritems():
             is_active_f = None
             if isinstance(field,tuple):
                 if len(field) == 1:
@@ -141,26 +132,25 @@ def check_mandatory_fields(obj, fields, dep_fields, formsets):
                 else:
                     continue
 
-            try:
-                if is_active_f and not is_active_f(obj):
-                    continue
-
-                if not hasattr(obj, field):
-                    continue
-                field_val = getattr(obj,field)
-
-                if callable(dep_set[0]):
-                    if not dep_set[0](field_val):
-                        continue
-                elif field_val != dep_set[0]:
-                    continue
+            for dep_set in dep_sets:
+                condition = dep_set[0]
+                if callable(condition):
+                    field_getter = self._getter(field,attname=False)
+                elif isinstance(condition,models.Model):
+                    #compare the foreign key column with the primary key
+                    field_getter = self._getter(field)
+                    condition = condition.pk
+                else:
+                    field_getter = self._getter(field,attname=False)
 
+                deps = []
                 for dep in dep_set[1:]:
-                    is_missing_f = lambda v,dep_v:dep_v is None or (isinstance(dep_v, (str, unicode)) and not dep_v.strip()) or (isinstance(dep_v,(list,tuple)) and not dep_v)
+                    is_missing_f = None
                     if isinstance(dep,tuple):
                         #field label is provided
                         if len(dep) == 1:
                             dep = dep[0]
+                            dep_label = None
                         elif len(dep) == 2:
                             dep_label = dep[1]
                             dep = dep[0]
@@ -168,46 +158,141 @@ def check_mandatory_fields(obj, fields, dep_fields, formsets):
                             is_missing_f = dep[2]
                             dep_label = dep[1]
                             dep = dep[0]
-
                     else:
                         dep_label = None
+                    deps.append((self._getter(dep,attname=is_missing_f is None),dep_label or self._label(dep),is_missing_f or _is_missing))
+
+                #model fields always exist, and checking them with hasattr would load the related object
+                check_exists = self._model_field(field) is None
+                self.dep_fields.append((field,check_exists,field_getter,is_active_f,condition,deps))
+
+        self.formsets = [(fs,self.FORMSET_UNKNOWN_FIELDS[fs]) for fs in formsets if fs in self.FORMSET_UNKNOWN_FIELDS]
+
+    @staticmethod
+    def _label(field):
+        try:
+            return Bushfire._meta.get_field(field).verbose_name
+        except:
+            return field
+
+    @staticmethod
+    def _model_field(field):
+        """
+        Return the concrete model field, or None if field is not a model field
+        """
+        if "." in field:
+            return None
+        try:
+            model_field = Bushfire._meta.get_field(field)
+            return model_field if model_field.concrete else None
+        except:
+            return None
 
-                    value = get_field(obj,dep)
-                    if is_missing_f(field_val,value):
+    @classmethod
+    def _getter(cls,field,attname=True):
+        """
+        Return a function to get the value of the field from a bushfire.
+        If attname is True, return the id of a foreign key field instead of the related object
+        """
+        model_field = cls._model_field(field)
+        if model_field:
+            name = model_field.attname if attname else model_field.name
+            return lambda obj:getattr(obj,name)
+        return lambda obj:get_field(obj,field)
+
+    def check(self, obj):
+        """
+        Return the list of missing fields of the bushfire
+        """
+        missing = []
+        for getter, label, is_active_f in self.fields:
+            if is_active_f and not is_active_f(obj):
+                continue
+            value = getter(obj)
+            if value is None or value=='':
+                missing.append(label)
+
+        for field, check_exists, field_getter, is_active_f, condition, deps in self.dep_fields:
+            try:
+                if is_active_f and not is_active_f(obj):
+                    continue
+
+                if check_exists and not hasattr(obj, field):
+                    continue
+                field_val = field_getter(obj)
+
+                if callable(condition):
+                    if not condition(field_val):
+                        continue
+                elif field_val != condition:
+                    continue
+
+                for getter, label, is_missing_f in deps:
+                    if is_missing_f(field_val,getter(obj)):
                         # field is unset or empty string
-                        if dep_label:
-                            missing.append(dep_label)
-                        else:
-                            try:
-                                missing.append(Bushfire._meta.get_field(dep).verbose_name)
-                            except:
-                                missing.append(dep)
+                        missing.append(label)
             except:
                 pass
 
-    for fs in formsets:
-        if fs == 'damages':
-            if (obj.damage_unknown):
-                continue
-            elif getattr(obj, fs) is None or not getattr(obj, fs).all():
-                missing.append(fs)
+        if not (obj.fire_not_found and obj.is_init_authorised):
+            for fs, unknown_field in self.formsets:
+                if getattr(obj, unknown_field):
+                    continue
+                elif getattr(obj, fs) is None or not getattr(obj, fs).all():
+                    missing.append(fs)
 
-        if fs == 'injuries':
-            if (obj.injury_unknown):
-                continue
-            elif getattr(obj, fs) is None or not getattr(obj, fs).all():
-                missing.append(fs)
+        # initial fire boundary required for fires > 2 ha
+        if not obj.initial_area_unknown:
+            if not obj.initial_area and obj.report_status < Bushfire.STATUS_INITIAL_AUTHORISED:
+                missing.append("Must enter Area of Arrival, if area < {}ha".format(settings.AREA_THRESHOLD))
 
-    # initial fire boundary required for fires > 2 ha
-    if not obj.initial_area_unknown:
-        if not obj.initial_area and obj.report_status < Bushfire.STATUS_INITIAL_AUTHORISED:
-            missing.append("Must enter Area of Arrival, if area < {}ha".format(settings.AREA_THRESHOLD))
+        if not obj.fire_not_found and obj.report_status >= Bushfire.STATUS_INITIAL_AUTHORISED:
+            if not obj.area_limit and (obj.area < settings.AREA_THRESHOLD or obj.area is None) and not obj.final_fire_boundary:
+                missing.append("Final fire shape must be uploaded for fires > {}ha".format(settings.AREA_THRESHOLD))
 
-    if not obj.fire_not_found and obj.report_status >= Bushfire.STATUS_INITIAL_AUTHORISED:
-        if not obj.area_limit and (obj.area < settings.AREA_THRESHOLD or obj.area is None) and not obj.final_fire_boundary:
-            missing.append("Final fire shape must be uploaded for fires > {}ha".format(settings.AREA_THRESHOLD))
+        return missing
 
-    return missing
+    def check_many(self, bushfires):
+        """
+        Check a list or queryset of bushfires.
+        The formset records of a queryset are prefetched with one query each,
+        and the properties of all the bushfires are loaded together.
+        Return a dict of bushfire id to the list of missing fields
+        """
+        if isinstance(bushfires,models.QuerySet):
+            if self.formsets:
+                bushfires = bushfires.prefetch_related(*[fs for fs,unknown_field in self.formsets])
+            if bushfires.model is Bushfire:
+                bushfires = bushfires.prefetch_related(PROPERTIES_PREFETCH)
+        bushfires = load_properties(bushfires)
+        return dict([(bf.id,self.check(bf)) for bf in bushfires])
+
+_mandatory_fields_plans = {}
+def mandatory_fields_plan(fields, dep_fields, formsets):
+    """
+    Return the compiled plan of the rules; the plan is compiled only once for the same rule objects
+    """
+    key = (id(fields),id(dep_fields),id(formsets))
+    plan = _mandatory_fields_plans.get(key)
+    if plan is None or any(a is not b for a,b in zip(plan.rules,(fields,dep_fields,formsets))):
+        plan = MandatoryFieldsPlan(fields, dep_fields, formsets)
+        _mandatory_fields_plans[key] = plan
+    return plan
+
+def check_mandatory_fields(obj, fields, dep_fields, formsets):
+    """
+    Method to check all required fields have been fileds before allowing Submit/Authorise of report.
+
+    The report can be saved with missing data - so most fields are non-mandatory (as defined in the Model).
+    Idea is to fill in report over time as and when info becomes available.
+
+    However, the report cannot be Submitted/Authorosed unless a given set of fields have been filled.
+
+    fields    - basic fields
+    dep_field - dependent fields (if one field has a value, check that the other has been filled)
+    formsets  - fields in formsets
+    """
+    return mandatory_fields_plan(fields, dep_fields, formsets).check(obj)
 
 
 class Profile(models.Model):
@@ -292,6 +377,48 @@ class District(models.Model):
     def __str__(self):
         return self.name
 
+@python_2_unicode_compatible
+class FireNumberSequence(models.Model):
+    """
+    The last allocated fire number of a district in a financial year
+    """
+    district = models.ForeignKey(District)
+    year = models.PositiveSmallIntegerField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('district', 'year')
+
+    @classmethod
+    def allocate(cls, district, year):
+        """
+        Allocate the next fire number of the district in the year with one atomic upsert,
+        so concurrent creates in the same district never get the same number
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            INSERT INTO {0} (district_id,year,last_number) VALUES (%s,%s,1)
+            ON CONFLICT (district_id,year) DO UPDATE SET last_number = {0}.last_number + 1
+            RETURNING last_number
+            """.format(cls._meta.db_table),[district.id if isinstance(district,District) else district,year])
+            return cursor.fetchone()[0]
+
+    def __str__(self):
+        return ' '.join([self.district.code, str(self.year), str(self.last_number)])
+
+class HarvestCheckpoint(models.Model):
+    """
+    The UID of the last harvested email in a mail folder;
+    only valid while the UIDVALIDITY of the folder is not changed
+    """
+    folder = models.CharField(max_length=128, unique=True)
+    uidvalidity = models.BigIntegerField()
+    last_uid = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} {}:{}'.format(self.folder, self.uidvalidity, self.last_uid)
+
 class BushfireBase(Audit,DictMixin):
     STATUS_INITIAL                = 1
     STATUS_INITIAL_AUTHORISED     = 2
@@ -617,6 +744,33 @@ class BushfireBase(Audit,DictMixin):
         else:
             return self.initial_control.name
 
+    @property
+    def json_properties(self):
+        """
+        The decoded properties, {name: value}.
+        Loaded with the properties of all the other fires passed to load_properties, or with one query on first access
+        """
+        if not hasattr(self,"_json_properties"):
+            load_properties([self])
+        return self._json_properties
+
+    def get_property(self, name, default=None):
+        return self.json_properties.get(name,default)
+
+    def reset_properties(self):
+        """
+        Drop the loaded properties after they are changed
+        """
+        for attr in ("_json_properties","_fire_bombing"):
+            if hasattr(self,attr):
+                delattr(self,attr)
+
+    @property
+    def fire_bombing(self):
+        if not hasattr(self,"_fire_bombing"):
+            self._fire_bombing = self.get_property("fire_bombing") or {}
+        return self._fire_bombing
+
 
 class BushfireSnapshot(BushfireBase):
 
@@ -628,20 +782,42 @@ class BushfireSnapshot(BushfireBase):
     bushfire = models.ForeignKey('Bushfire', related_name='snapshots')
 
     @property
-    def fire_bombing(self):
-        if not hasattr(self,"_fire_bombing"):
-            try:
-                fire_bombing = BushfirePropertySnapshot.objects.get(snapshot=self,name="fire_bombing").value
-                if fire_bombing is None:
-                    fire_bombing = {}
-                else:
-                    fire_bombing = json.loads(fire_bombing)
-            except BushfirePropertySnapshot.DoesNotExist:
-                fire_bombing = {}
+    def diff(self):
+        """
+        The changes against the previous snapshot, {field name: (new value, old value)}; computed by reconstruct
+        """
+        return getattr(self,"_diff",{})
 
-            self._fire_bombing = fire_bombing
+    @property
+    def damages(self):
+        return DamageSnapshot.objects.filter(snapshot_id=self.id)
 
-        return self._fire_bombing
+    @property
+    def injuries(self):
+        return InjurySnapshot.objects.filter(snapshot_id=self.id)
+
+    @property
+    def tenures_burnt(self):
+        return AreaBurntSnapshot.objects.filter(snapshot_id=self.id)
+
+    @property
+    def properties(self):
+        return BushfirePropertySnapshot.objects.filter(snapshot_id=self.id)
+
+    @classmethod
+    def reconstruct(cls, snapshots):
+        """
+        Compute the changes of the snapshots against the previous snapshot of the same bushfire.
+        snapshots should be ordered by created.
+        Return the list of snapshots
+        """
+        snapshots = list(snapshots)
+        previous = {}
+        for s in snapshots:
+            if s.bushfire_id in previous:
+                s._diff = snapshot_changes(s,previous[s.bushfire_id])
+            previous[s.bushfire_id] = s
+        return snapshots
 
     def __str__(self):
         return ', '.join([self.fire_number, self.get_snapshot_type_display()])
@@ -651,6 +827,22 @@ class Bushfire(BushfireBase):
 
     fire_number = models.CharField(max_length=15, verbose_name="Fire Number", unique=True)
     sss_id = models.CharField(verbose_name="Unique SSS ID", max_length=64, null=True, blank=True, unique=True)
+    #the latest snapshots, maintained by serialize_bushfires
+    latest_initial_snapshot = models.ForeignKey(BushfireSnapshot, null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+')
+    latest_final_snapshot = models.ForeignKey(BushfireSnapshot, null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+')
+    #the envelope and the simplified versions of the fire boundary, maintained by save
+    fire_boundary_envelope = models.PolygonField(srid=4326, null=True, blank=True, editable=False)
+    fire_boundary_10m = models.MultiPolygonField(srid=4326, null=True, blank=True, editable=False)
+    fire_boundary_100m = models.MultiPolygonField(srid=4326, null=True, blank=True, editable=False)
+    fire_boundary_1km = models.MultiPolygonField(srid=4326, null=True, blank=True, editable=False)
+
+    #the simplified fire boundaries and their tolerances in degrees, from the finest to the coarsest
+    FIRE_BOUNDARY_LEVELS = (
+        ("fire_boundary_10m",0.0001),
+        ("fire_boundary_100m",0.001),
+        ("fire_boundary_1km",0.01),
+    )
+    FIRE_BOUNDARY_DERIVED_FIELDS = ["fire_boundary_envelope"] + [name for name,tolerance in FIRE_BOUNDARY_LEVELS]
     
     SUBMIT_MANDATORY_FIELDS = [
         'region', 'district', 'year', 'fire_number', 'name', 'fire_detected_date', 'prob_fire_level',
@@ -717,22 +909,6 @@ class Bushfire(BushfireBase):
             ("final_authorise_bushfire","Can final authorise bushfire"),
         )
 
-    @property
-    def fire_bombing(self):
-        if not hasattr(self,"_fire_bombing"):
-            try:
-                fire_bombing = BushfireProperty.objects.get(bushfire=self,name="fire_bombing").value
-                if fire_bombing is None:
-                    fire_bombing = {}
-                else:
-                    fire_bombing = json.loads(fire_bombing)
-            except BushfireProperty.DoesNotExist:
-                fire_bombing = {}
-
-            self._fire_bombing = fire_bombing
-
-        return self._fire_bombing
-
     def save_properties(self,update_fields = None):
         if not update_fields:
             return
@@ -741,6 +917,7 @@ class Bushfire(BushfireBase):
             if not self.dispatch_aerial:
                 #fire bombing not required
                 BushfireProperty.objects.filter(bushfire=self,name="fire_bombing").delete()
+                self.reset_properties()
                 return
 
             #initialize fire bombing data
@@ -748,6 +925,7 @@ class Bushfire(BushfireBase):
                 self.fire_bombing["sar_arrangements"] = "Default SAR state air desk"
 
             BushfireProperty.objects.update_or_create(bushfire=self,name="fire_bombing",defaults={"value":json.dumps(self.fire_bombing)})
+            self.json_properties["fire_bombing"] = self.fire_bombing
 
     def user_unicode_patch(self):
         """ overwrite the User model's __unicode__() method """
@@ -761,21 +939,25 @@ class Bushfire(BushfireBase):
 
     @property
     def initial_snapshot(self):
-        qs = self.snapshots.filter(snapshot_type=SNAPSHOT_INITIAL)
-        return qs.latest('created') if len(qs)>0 and self.is_init_authorised else None
+        return self.latest_initial_snapshot if self.is_init_authorised else None
 
     @property
     def final_snapshot(self):
-        qs = self.snapshots.filter(snapshot_type=SNAPSHOT_FINAL)
-        return qs.latest('created') if len(qs)>0 and self.is_final_authorised else None
+        return self.latest_final_snapshot if self.is_final_authorised else None
 
     @property
     def snapshot_list(self):
         return self.snapshots.all().order_by('created')
 
+    @property
+    def snapshot_history(self):
+        """
+        The reconstructed snapshots with their changes, ordered by created
+        """
+        return BushfireSnapshot.reconstruct(self.snapshot_list)
+
     def next_id(self, district):
-        ids = map(int, [i.fire_number.split(' ')[-1] for i in Bushfire.objects.filter(district=district, year=self.year)])
-        return max(ids) + 1 if ids else 1
+        return FireNumberSequence.allocate(district, self.year)
 
     @property
     def linked_valid_bushfire(self):
@@ -789,19 +971,50 @@ class Bushfire(BushfireBase):
             if linked.linked_bushfire.report_status != Bushfire.STATUS_INVALIDATED:
                 return linked.linked_bushfire
 
-    def clean(self):
-        # create the bushfire fire number
-        if not self.id and not self.fire_number:
-            try:
-                self.fire_number = ' '.join(['BF', str(self.year), self.district.code, '{0:03d}'.format(self.next_id(self.district))])
-            except:
-                raise ValidationError('Could not create unique fire number')
+    def assign_fire_number(self):
+        """
+        Allocate the fire number of a new bushfire.
+        Only called when the bushfire is inserted, so a rejected form doesn't consume a fire number
+        """
+        if not self.fire_number:
+            self.fire_number = ' '.join(['BF', str(self.year), self.district.code, '{0:03d}'.format(self.next_id(self.district))])
 
     def full_clean(self, *args, **kwargs):
         return self.clean()
 
+    @classmethod
+    def fire_boundary_field(cls, tolerance):
+        """
+        Return the name of the coarsest stored fire boundary which is not coarser than the tolerance (in degrees)
+        """
+        field = "fire_boundary"
+        for name,level_tolerance in cls.FIRE_BOUNDARY_LEVELS:
+            if level_tolerance <= tolerance:
+                field = name
+        return field
+
+    def update_fire_boundary_levels(self):
+        """
+        Update the envelope and the simplified versions of the fire boundary
+        """
+        if self.fire_boundary:
+            envelope = self.fire_boundary.envelope
+            self.fire_boundary_envelope = envelope if isinstance(envelope,Polygon) else None
+            for name,tolerance in self.FIRE_BOUNDARY_LEVELS:
+                setattr(self,name,simplify_multipolygon(self.fire_boundary,tolerance))
+        else:
+            for name in self.FIRE_BOUNDARY_DERIVED_FIELDS:
+                setattr(self,name,None)
+
     def save(self, *args, **kwargs):
         self.full_clean(*args, **kwargs)
+        if self.pk is None:
+            self.assign_fire_number()
+        if self.pk is None or "fire_boundary" not in self._initial or self._initial["fire_boundary"] != self.fire_boundary:
+            self.update_fire_boundary_levels()
+            update_fields = kwargs.get("update_fields")
+            if update_fields and "fire_boundary" in update_fields:
+                kwargs["update_fields"] = list(update_fields) + self.FIRE_BOUNDARY_DERIVED_FIELDS
         super(Bushfire, self).save(*args, **kwargs)
 
     @property
@@ -831,6 +1044,37 @@ class Bushfire(BushfireBase):
             )
         return l
 
+#the fields which are not compared when computing the changes between two snapshots
+SNAPSHOT_DIFF_EXCLUDE = ('id','created','modified','creator','modifier','bushfire','snapshot_type','action','sss_data')
+
+def snapshot_changes(new, old):
+    """
+    Return the changes between two bushfires or snapshots, {field name: (new value, old value)}
+    """
+    def _display(obj, field, value):
+        if value is None:
+            return ""
+        elif field.choices:
+            return unicode(dict(field.flatchoices).get(value,value))
+        elif field.is_relation:
+            return unicode(getattr(obj,field.name))
+        else:
+            return unicode(value)
+
+    changes = {}
+    for field in BushfireSnapshot._meta.concrete_fields:
+        if field.name in SNAPSHOT_DIFF_EXCLUDE:
+            continue
+        new_value = getattr(new,field.attname)
+        old_value = getattr(old,field.attname)
+        if new_value == old_value:
+            continue
+        if field.name == "fire_boundary":
+            changes[field.verbose_name] = ("Changed" if new_value else "Removed","" if new_value else "Existed")
+        else:
+            changes[field.verbose_name] = (_display(new,field,new_value),_display(old,field,old_value))
+    return changes
+
 @python_2_unicode_compatible
 class Tenure(models.Model):
     name = models.CharField(verbose_name='Tenure category', max_length=200)
@@ -1042,7 +1286,7 @@ class BushfirePropertyBase(models.Model):
         if hasattr(self,"_json_value"):
             result = getattr(self,"_json_value")
         else:
-            result = json.loads(self.value)
+            result = json.loads(self.value) if self.value is not None else None
             setattr(self,"_json_value",result)
         return result
 
@@ -1064,6 +1308,44 @@ class BushfirePropertySnapshot(BushfirePropertyBase):
     class Meta:
         unique_together = ('snapshot','name')
 
+#prefetch the properties of a bushfire queryset, used by load_properties
+PROPERTIES_PREFETCH = Prefetch('properties', queryset=BushfireProperty.objects.all())
+
+def load_properties(bushfires):
+    """
+    Load the properties of the bushfires or snapshots with one query per model,
+    decode the json values once and attach them to the instances as json_properties.
+    The properties prefetched with PROPERTIES_PREFETCH are used without any query.
+    Return the bushfires
+    """
+    bushfires = [bf for bf in bushfires if bf is not None]
+    pending = [bf for bf in bushfires if not hasattr(bf,"_json_properties")]
+    for bf in pending:
+        bf._json_properties = {}
+
+    #prefetched bushfires
+    for bf in [bf for bf in pending if "properties" in getattr(bf,"_prefetched_objects_cache",{})]:
+        bf._json_properties = dict([(p.name,p.json_value) for p in bf.properties.all()])
+        pending.remove(bf)
+
+    fires = defaultdict(list)
+    snapshots = defaultdict(list)
+    for bf in pending:
+        if isinstance(bf,BushfireSnapshot):
+            snapshots[bf.pk].append(bf)
+        elif bf.pk:
+            fires[bf.pk].append(bf)
+
+    for model,key,instances in ((BushfireProperty,"bushfire_id",fires),(BushfirePropertySnapshot,"snapshot_id",snapshots)):
+        if not instances:
+            continue
+        for p in model.objects.filter(**{"{}__in".format(key):instances.keys()}):
+            value = p.json_value
+            for bf in instances[getattr(p,key)]:
+                bf._json_properties[p.name] = value
+
+    return bushfires
+
 @python_2_unicode_compatible
 class DocumentCategory(DictMixin,Audit):
     name = models.CharField(max_length=200,null=False,editable=True,unique=True, verbose_name="Document Category")
@@ -1245,7 +1527,8 @@ class DocumentListener(object):
                 traceback.print_exc()
 
 
-reversion.register(Bushfire, follow=['tenures_burnt', 'injuries', 'damages'])
+REVERSION_EXCLUDE = ('fire_boundary', 'sss_data') if settings.REVERSION_EXCLUDE_BULKY_FIELDS else ()
+reversion.register(Bushfire, follow=['tenures_burnt', 'injuries', 'damages'], exclude=REVERSION_EXCLUDE + tuple(Bushfire.FIRE_BOUNDARY_DERIVED_FIELDS))
 reversion.register(Profile)
 reversion.register(Region)
 reversion.register(District)
@@ -1258,7 +1541,7 @@ reversion.register(DamageType)
 reversion.register(AreaBurnt)       # related_name=tenures_burnt
 reversion.register(Injury)          # related_name=injuries
 reversion.register(Damage)          # related_name=damages
-reversion.register(BushfireSnapshot) # related_name=snapshots
+reversion.register(BushfireSnapshot, exclude=REVERSION_EXCLUDE) # related_name=snapshots
 reversion.register(Document)
 
 reversion.register(BushfireProperty) 
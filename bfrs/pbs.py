@@ -0,0 +1,106 @@
+import threading
+import time
+import urllib
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PBSClient(object):
+    """
+    Client for the PBS prescribed burn api.
+    Uses a pooled session with timeouts and retries, splits long fire id lists into requests which fit in the url length limit,
+    and caches the result for a short time, keyed by the set of fire ids
+    """
+    prescribedburn_path = "api/v1/prescribedburn/"
+
+    def __init__(self, url, user, password, timeout, retries, cache_timeout, max_url_length):
+        self.url = url if url.endswith('/') else url + '/'
+        self.auth = requests.auth.HTTPBasicAuth(user, password)
+        self.timeout = timeout
+        self.retries = retries
+        self.cache_timeout = cache_timeout
+        self.max_url_length = max_url_length
+        self._session = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            session.auth = self.auth
+            retry = Retry(total=self.retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), method_whitelist=frozenset(['GET']))
+            session.mount("http://", HTTPAdapter(max_retries=retry))
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            self._session = session
+        return self._session
+
+    @property
+    def prescribedburn_url(self):
+        return self.url + self.prescribedburn_path
+
+    def chunks(self, fire_ids):
+        """
+        Split the fire ids into lists which keep the request url within max_url_length
+        """
+        base_length = len(self.prescribedburn_url) + len("?format=json&fire_id__in=")
+        chunk = []
+        length = base_length
+        for fire_id in fire_ids:
+            id_length = len(urllib.quote_plus(fire_id.encode('utf-8'))) + (3 if chunk else 0) # 3 is the length of the quoted ','
+            if chunk and length + id_length > self.max_url_length:
+                yield chunk
+                chunk = []
+                length = base_length
+                id_length -= 3
+            chunk.append(fire_id)
+            length += id_length
+        if chunk:
+            yield chunk
+
+    def _get(self, params):
+        resp = self.session.get(self.prescribedburn_url, params=params, timeout=self.timeout)
+        logger.info("r.url: " + resp.url)
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_bushfires(self, fire_ids=None):
+        """
+        fire_ids: list of fire ids, or None to get all bushfires
+        Return the list of bushfires returned by PBS
+        """
+        key = frozenset(fire_ids) if fire_ids is not None else None
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        if fire_ids is None:
+            result = self._get({"format": "json"})
+        else:
+            result = []
+            for chunk in self.chunks(sorted(key)):
+                result.extend(self._get({"format": "json", "fire_id__in": ','.join(chunk)}))
+
+        with self._lock:
+            #remove the expired data
+            for k in [k for k, v in self._cache.items() if v[0] <= now]:
+                del self._cache[k]
+            self._cache[key] = (now + self.cache_timeout, result)
+        return result
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+pbs_client = PBSClient(settings.PBS_URL, settings.USER_SSO, settings.PASS_SSO,
+    settings.PBS_TIMEOUT, settings.PBS_RETRIES, settings.PBS_CACHE_TIMEOUT, settings.PBS_MAX_URL_LENGTH)
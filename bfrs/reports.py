@@ -26,6 +26,7 @@ import traceback
 
 from django.template.loader import render_to_string
 from .utils import generate_pdf
+from .latexpool import LatexPoolFull, LatexTimeout
 
 import logging
 logger = logging.getLogger(__name__)
@@ -58,6 +59,69 @@ def get_sorted_regions(forest_region=None):
 
     return sorted_regions[key]
 
+MINISTERIAL_COLUMNS = ('pw_tenure', 'area_pw_tenure', 'total_all_tenure', 'total_area')
+MINISTERIAL_SUBTOTAL_FOREST = 'Sub Total (Forest)'
+MINISTERIAL_SUBTOTAL_NONFOREST = 'Sub Total (Non Forest)'
+MINISTERIAL_GRAND_TOTAL = 'GRAND TOTAL'
+
+def merge_region_data(*region_datas):
+    """
+    Merge the per region data of the ministerial sub reports by adding up the columns
+    region_datas: dicts keyed by region id, the value is a dict with the keys in MINISTERIAL_COLUMNS
+    Return a new dict keyed by region id
+    """
+    result = {}
+    for region_data in region_datas:
+        for region_id, data in region_data.iteritems():
+            merged = result.get(region_id)
+            if merged is None:
+                result[region_id] = dict(data)
+            else:
+                for col in MINISTERIAL_COLUMNS:
+                    merged[col] += data[col]
+    return result
+
+def ministerial_rpt_map(region_data):
+    """
+    Build the ministerial report rows from the per region data.
+    region_data: dict keyed by region id, the value is a dict with the keys in MINISTERIAL_COLUMNS; missing regions are reported as zero
+    Return (rpt_map, item_map)
+        rpt_map: list of single item dicts {row name: data} in report order, used by the excel sheets and latex templates
+        item_map: forest and non forest totals used in the report text
+    """
+    rpt_map = []
+    item_map = {}
+
+    def _add_regions(forest_region, subtotal_name):
+        subtotal = dict.fromkeys(MINISTERIAL_COLUMNS, 0)
+        for region in get_sorted_regions(forest_region):
+            data = region_data.get(region.id)
+            data = dict(data) if data else dict(pw_tenure=0, area_pw_tenure=0.0, total_all_tenure=0, total_area=0.0)
+            rpt_map.append({region.name: data})
+            for col in MINISTERIAL_COLUMNS:
+                subtotal[col] += data[col]
+        rpt_map.append({subtotal_name: subtotal})
+        return subtotal
+
+    forest = _add_regions(True, MINISTERIAL_SUBTOTAL_FOREST)
+    item_map['forest_pw_tenure'] = forest['pw_tenure']
+    item_map['forest_area_pw_tenure'] = forest['area_pw_tenure']
+    item_map['forest_total_all_tenure'] = forest['total_all_tenure']
+    item_map['forest_total_area'] = forest['total_area']
+
+    # add a white space/line between forest and non-forest region tabulated info
+    rpt_map.append(
+        {'': ''}
+    )
+
+    nonforest = _add_regions(False, MINISTERIAL_SUBTOTAL_NONFOREST)
+    item_map['nonforest_total_all_tenure'] = nonforest['total_all_tenure']
+    item_map['nonforest_total_area'] = nonforest['total_area']
+
+    rpt_map.append({MINISTERIAL_GRAND_TOTAL: dict([(col, forest[col] + nonforest[col]) for col in MINISTERIAL_COLUMNS])})
+
+    return rpt_map, item_map
+
 def style(bold=False, num_fmt='#,##0', horz_align=Alignment.HORZ_GENERAL, colour=None):
     style = XFStyle()
     font = Font()
@@ -207,89 +271,8 @@ class MinisterialReport():
         self.reporting_year = current_finyear() if (reporting_year is None or reporting_year >= current_finyear()) else reporting_year
         self.ministerial_auth = ministerial_auth if ministerial_auth else MinisterialReportAuth(self.reporting_year)
         self.ministerial_268 = ministerial_268 if ministerial_268 else MinisterialReport268(self.reporting_year)
-        self.rpt_map, self.item_map = self.create()
-
-    def create(self):
-        rpt_map_auth = self.ministerial_auth.rpt_map
-        rpt_map_268 = self.ministerial_268.rpt_map
-        item_map_auth = self.ministerial_auth.item_map
-        item_map_268 = self.ministerial_268.item_map
-
-        rpt_map = []
-        item_map = {}
-        for region in get_sorted_regions(True):
-            map_auth = [i for i in rpt_map_auth if i.has_key(region.name)][0]
-            map_268  = [i for i in rpt_map_268 if i.has_key(region.name)][0]
-            rpt_map.append({
-                region.name: dict(
-                    pw_tenure=map_auth[region.name]['pw_tenure'] + map_268[region.name]['pw_tenure'],
-                    area_pw_tenure=map_auth[region.name]['area_pw_tenure'] + map_268[region.name]['area_pw_tenure'],
-                    total_all_tenure=map_auth[region.name]['total_all_tenure'] + map_268[region.name]['total_all_tenure'],
-                    total_area=map_auth[region.name]['total_area'] + map_268[region.name]['total_area']
-                )
-            })
-
-        key = 'Sub Total (Forest)'
-        map_auth = [i for i in rpt_map_auth if i.has_key(key)][0]
-        map_268  = [i for i in rpt_map_268 if i.has_key(key)][0]
-        rpt_map.append({
-            key: dict(
-                pw_tenure=map_auth[key]['pw_tenure'] + map_268[key]['pw_tenure'],
-                area_pw_tenure=map_auth[key]['area_pw_tenure'] + map_268[key]['area_pw_tenure'],
-                total_all_tenure=map_auth[key]['total_all_tenure'] + map_268[key]['total_all_tenure'],
-                total_area=map_auth[key]['total_area'] + map_268[key]['total_area']
-            )
-        })
-
-        item_map['forest_pw_tenure'] = item_map_auth['forest_pw_tenure'] + item_map_268['forest_pw_tenure']
-        item_map['forest_area_pw_tenure'] = item_map_auth['forest_area_pw_tenure'] + item_map_268['forest_area_pw_tenure']
-        item_map['forest_total_all_tenure'] = item_map_auth['forest_total_all_tenure'] + item_map_268['forest_total_all_tenure'] 
-        item_map['forest_total_area'] = item_map_auth['forest_total_area'] + item_map_268['forest_total_area']
-
-        rpt_map.append(
-            {'': ''}
-        )
-
-        for region in get_sorted_regions(False):
-            map_auth = [i for i in rpt_map_auth if i.has_key(region.name)][0]
-            map_268  = [i for i in rpt_map_268 if i.has_key(region.name)][0]
-            rpt_map.append({
-                region.name: dict(
-                    pw_tenure=map_auth[region.name]['pw_tenure'] + map_268[region.name]['pw_tenure'],
-                    area_pw_tenure=map_auth[region.name]['area_pw_tenure'] + map_268[region.name]['area_pw_tenure'],
-                    total_all_tenure=map_auth[region.name]['total_all_tenure'] + map_268[region.name]['total_all_tenure'],
-                    total_area=map_auth[region.name]['total_area'] + map_268[region.name]['total_area']
-                )
-            })
-
-        key = 'Sub Total (Non Forest)'
-        map_auth = [i for i in rpt_map_auth if i.has_key(key)][0]
-        map_268  = [i for i in rpt_map_268 if i.has_key(key)][0]
-        rpt_map.append({
-            key: dict(
-                pw_tenure=map_auth[key]['pw_tenure'] + map_268[key]['pw_tenure'],
-                area_pw_tenure=map_auth[key]['area_pw_tenure'] + map_268[key]['area_pw_tenure'],
-                total_all_tenure=map_auth[key]['total_all_tenure'] + map_268[key]['total_all_tenure'],
-                total_area=map_auth[key]['total_area'] + map_268[key]['total_area']
-            )
-        })
-
-        item_map['nonforest_total_all_tenure'] = item_map_auth['nonforest_total_all_tenure'] + item_map_268['nonforest_total_all_tenure']
-        item_map['nonforest_total_area'] = item_map_auth['nonforest_total_area'] + item_map_268['nonforest_total_area']
-                
-        key = 'GRAND TOTAL'
-        map_auth = [i for i in rpt_map_auth if i.has_key(key)][0]
-        map_268  = [i for i in rpt_map_268 if i.has_key(key)][0]
-        rpt_map.append({
-            key: dict(
-                pw_tenure=map_auth[key]['pw_tenure'] + map_268[key]['pw_tenure'],
-                area_pw_tenure=map_auth[key]['area_pw_tenure'] + map_268[key]['area_pw_tenure'],
-                total_all_tenure=map_auth[key]['total_all_tenure'] + map_268[key]['total_all_tenure'],
-                total_area=map_auth[key]['total_area'] + map_268[key]['total_area']
-            )
-        })
-
-        return rpt_map, item_map
+        self.region_data = merge_region_data(self.ministerial_auth.region_data, self.ministerial_268.region_data)
+        self.rpt_map, self.item_map = ministerial_rpt_map(self.region_data)
 
     def export_final_csv(self, request, queryset):
         writer = unicodecsv.writer(response, quoting=unicodecsv.QUOTE_ALL)
@@ -467,6 +450,9 @@ class MinisterialReport():
                 response.write(f.read())
             logger.debug("Finally: returning PDF response.")
             return response
+        except (LatexPoolFull, LatexTimeout) as ex:
+            #the pdf generator is busy or too slow, the user can try again later
+            return HttpResponse(str(ex), status=503, content_type='text/plain')
         finally:
             if folder:
                 shutil.rmtree(folder)
@@ -478,144 +464,63 @@ class MinisterialReport268():
     """
     def __init__(self,reporting_year=None):
         self.reporting_year = current_finyear() if (reporting_year is None or reporting_year >= current_finyear()) else reporting_year
-        self.rpt_map, self.item_map = self.create()
-
-    def get_268_data(self, dbca_initial_control=None):
-        """ Retrieves the 268b fires from PBS and Aggregates the Area and Number count by region """
-        qs_regions = get_sorted_regions()
-
-        if dbca_initial_control:
-            # get the fires managed by DBCA
-            outstanding_fires = list(Bushfire.objects.filter(report_status__in=[Bushfire.STATUS_INITIAL_AUTHORISED], initial_control=Agency.DBCA,reporting_year__lte=self.reporting_year).values_list('fire_number', flat=True))
-        else:
-            outstanding_fires = list(Bushfire.objects.filter(report_status__in=[Bushfire.STATUS_INITIAL_AUTHORISED],reporting_year__lte=self.reporting_year).values_list('fire_number', flat=True))
+        self.region_data = self.create()
+        self.rpt_map, self.item_map = ministerial_rpt_map(self.region_data)
+
+    def get_268_data(self):
+        """ 
+        Retrieves the 268b fires from PBS in one pass and Aggregates the Area and Number count by region,
+        for all outstanding fires and for the fires managed by DBCA
+        Return (rpt_map for all fires, rpt_map for fires managed by DBCA)
+        """
+        region_ids = set([r.id for r in get_sorted_regions()])
 
-        pbs_fires_dict = get_pbs_bushfires(outstanding_fires) or []
+        outstanding_fires = dict(Bushfire.objects.filter(report_status__in=[Bushfire.STATUS_INITIAL_AUTHORISED],reporting_year__lte=self.reporting_year).values_list('fire_number', 'initial_control_id'))
 
-        if not dbca_initial_control:
-            self.pbs_fires_dict = pbs_fires_dict
-            #logger.info("self.pbs_fires_dict: " + str(self.pbs_fires_dict))
-            self.found_fires = [i['fire_id'] for i in self.pbs_fires_dict]
-            self.missing_fires = list(set(outstanding_fires).difference(self.found_fires)) # fire_numbers not returned from PB
+        self.pbs_fires_dict = get_pbs_bushfires(outstanding_fires.keys()) or []
+        #logger.info("self.pbs_fires_dict: " + str(self.pbs_fires_dict))
+        self.found_fires = [i['fire_id'] for i in self.pbs_fires_dict]
+        self.missing_fires = list(set(outstanding_fires.keys()).difference(self.found_fires)) # fire_numbers not returned from PB
 
+        dbca_id = Agency.DBCA.id
         rpt_map = {}
-        for i in pbs_fires_dict:                                                                       
+        rpt_map_pw = {}
+        for i in self.pbs_fires_dict:                                                                       
             region_id = i['region']
 
-            exists = [i for r in qs_regions if r.id==region_id]
-            if exists:
-                if rpt_map.has_key(region_id):
-                    rpt_map[region_id]['area'] = rpt_map[region_id]['area'] + float(i['area'])
-                    rpt_map[region_id]['number'] = rpt_map[region_id]['number'] + 1
+            if region_id in region_ids:
+                maps = [rpt_map,rpt_map_pw] if outstanding_fires.get(i['fire_id']) == dbca_id else [rpt_map]
+                for m in maps:
+                    if m.has_key(region_id):
+                        m[region_id]['area'] = m[region_id]['area'] + float(i['area'])
+                        m[region_id]['number'] = m[region_id]['number'] + 1
                             
-                else:
-                    rpt_map[region_id] = {
-                        'area' : float(i['area']),
-                        'number' : 1
-                    }
+                    else:
+                        m[region_id] = {
+                            'area' : float(i['area']),
+                            'number' : 1
+                        }
 
             else:
                 raise Exception("PBS Region id({}) Not Found in BFRS".format(region_id))
 
-        return rpt_map
+        return rpt_map, rpt_map_pw
 
     def create(self):
-        # Group By Region
-
-        data_268 = self.get_268_data()
-        data_268_pw = self.get_268_data('DBCA')
-
-        rpt_map = []
-        item_map = {}
-        net_forest_pw_tenure      = 0
-        net_forest_area_pw_tenure = 0
-        net_forest_total_all_tenure = 0
-        net_forest_total_area     = 0
-
-        for region in get_sorted_regions(True):
-            if data_268_pw.has_key(region.id):
-                pw_tenure      = data_268_pw[region.id]['number']
-                area_pw_tenure = data_268_pw[region.id]['area']
-            else:
-                pw_tenure      = 0
-                area_pw_tenure = 0.0
-
-            if data_268.has_key(region.id):
-                total_all_tenure = data_268[region.id]['number']
-                total_area       = data_268[region.id]['area']
-            else:
-                total_all_tenure = 0
-                total_area       = 0.0
-
-            rpt_map.append(
-                {region.name: dict(pw_tenure=pw_tenure, area_pw_tenure=area_pw_tenure, total_all_tenure=total_all_tenure, total_area=total_area)}
-            )
-                
-            net_forest_pw_tenure      += pw_tenure 
-            net_forest_area_pw_tenure += area_pw_tenure
-            net_forest_total_all_tenure += total_all_tenure
-            net_forest_total_area     += total_area
-
-        rpt_map.append(
-            {'Sub Total (Forest)': dict(pw_tenure=net_forest_pw_tenure, area_pw_tenure=net_forest_area_pw_tenure, total_all_tenure=net_forest_total_all_tenure, total_area=net_forest_total_area)}
-        )
-
-        item_map['forest_pw_tenure'] = net_forest_pw_tenure
-        item_map['forest_area_pw_tenure'] = net_forest_area_pw_tenure
-        item_map['forest_total_all_tenure'] = net_forest_total_all_tenure
-        item_map['forest_total_area'] = net_forest_total_area
-
-        # add a white space/line between forest and non-forest region tabulated info
-        rpt_map.append(
-            {'': ''}
-        )
-
-        net_nonforest_pw_tenure      = 0
-        net_nonforest_area_pw_tenure = 0
-        net_nonforest_total_all_tenure = 0
-        net_nonforest_total_area     = 0
-
-        for region in get_sorted_regions(False):
-            if data_268_pw.has_key(region.id):
-                pw_tenure      = data_268_pw[region.id]['number']
-                area_pw_tenure = data_268_pw[region.id]['area']
-            else:
-                pw_tenure      = 0
-                area_pw_tenure = 0.0
-
-            if data_268.has_key(region.id):
-                total_all_tenure = data_268[region.id]['number']
-                total_area       = data_268[region.id]['area']
-            else:
-                total_all_tenure = 0
-                total_area       = 0.0
-
-            rpt_map.append(
-                {region.name: dict(pw_tenure=pw_tenure, area_pw_tenure=area_pw_tenure, total_all_tenure=total_all_tenure, total_area=total_area)}
+        """
+        Return the 268b data grouped by region id
+        """
+        data_268, data_268_pw = self.get_268_data()
+
+        region_data = {}
+        for region_id in set(data_268.keys()) | set(data_268_pw.keys()):
+            region_data[region_id] = dict(
+                pw_tenure=data_268_pw[region_id]['number'] if region_id in data_268_pw else 0,
+                area_pw_tenure=data_268_pw[region_id]['area'] if region_id in data_268_pw else 0.0,
+                total_all_tenure=data_268[region_id]['number'] if region_id in data_268 else 0,
+                total_area=data_268[region_id]['area'] if region_id in data_268 else 0.0
             )
-                
-            net_nonforest_pw_tenure      += pw_tenure 
-            net_nonforest_area_pw_tenure += area_pw_tenure
-            net_nonforest_total_all_tenure += total_all_tenure
-            net_nonforest_total_area     += total_area
-
-        rpt_map.append(
-            {'Sub Total (Non Forest)': dict(pw_tenure=net_nonforest_pw_tenure, area_pw_tenure=net_nonforest_area_pw_tenure, total_all_tenure=net_nonforest_total_all_tenure, total_area=net_nonforest_total_area)}
-        )
-
-        item_map['nonforest_total_all_tenure'] = net_nonforest_total_all_tenure
-        item_map['nonforest_total_area'] = net_nonforest_total_area
-                
-        rpt_map.append(
-            {'GRAND TOTAL': dict(
-                pw_tenure=net_forest_pw_tenure + net_nonforest_pw_tenure, 
-                area_pw_tenure=net_forest_area_pw_tenure + net_nonforest_area_pw_tenure, 
-                total_all_tenure=net_forest_total_all_tenure + net_nonforest_total_all_tenure, 
-                total_area=net_forest_total_area + net_nonforest_total_area
-            )}
-        )
-                
-        return rpt_map, item_map
+        return region_data
 
     def get_excel_sheet(self, rpt_date, book=Workbook()):
 
@@ -732,32 +637,32 @@ class MinisterialReportAuth():
     def __init__(self, reporting_year=None, overlap_ids=[]):
         self.reporting_year = current_finyear() if (reporting_year is None or reporting_year >= current_finyear()) else reporting_year
         self.overlap_ids = overlap_ids
-        self.rpt_map, self.item_map, self.excluded_bf_info = self.create()
+        self.region_data, self.excluded_bf_info = self.create()
+        self.rpt_map, self.item_map = ministerial_rpt_map(self.region_data)
 
     def create(self):
-        rpt_map = []
-        item_map = {}
-        net_forest_pw_tenure      = 0
-        net_forest_area_pw_tenure = 0
-        net_forest_total_all_area = 0
-        net_forest_total_area     = 0
+        """
+        Return (the authorised fire data grouped by region id, excluded bushfires info)
+        """
         excluded_bfs_general_info = {}
         excluded_bfs_region_info = {}
         excluded_bfs_tenure_info = {}
 
+        # count and area are grouped by region and by whether dbca has interest in the tenure,
+        # the total of a region is the sum of both groups
         count_sql = """
-        SELECT r.region_id,count(*)
+        SELECT r.region_id,r.dbca_interest,count(*)
         FROM 
-            ((SELECT a.region_id,a.id
+            ((SELECT a.region_id,a.id,t.dbca_interest
             FROM reporting_bushfire a JOIN bfrs_tenure t ON a.tenure_id = t.id
-            WHERE a.report_status IN {report_statuses} AND a.reporting_year={reporting_year} AND a.fire_not_found=false {{agency_condition}}
+            WHERE a.report_status IN {report_statuses} AND a.reporting_year={reporting_year} AND a.fire_not_found=false
             )
             UNION
-            (SELECT b.region_id,b.id
+            (SELECT b.region_id,b.id,t.dbca_interest
             FROM reporting_bushfire b JOIN reporting_bushfire c ON b.valid_bushfire_id = c.id AND c.report_status IN {report_statuses} AND c.reporting_year={reporting_year} AND c.fire_not_found=false JOIN bfrs_tenure t ON b.tenure_id = t.id 
-            WHERE b.report_status = {status_merged}  {{agency_condition}}
+            WHERE b.report_status = {status_merged}
             )) as r
-        group by r.region_id
+        group by r.region_id,r.dbca_interest
         """.format(
             report_statuses="({})".format(",".join([str(i) for i in [Bushfire.STATUS_FINAL_AUTHORISED,Bushfire.STATUS_REVIEWED]])),
             reporting_year = self.reporting_year,
@@ -765,108 +670,41 @@ class MinisterialReportAuth():
         )
 
         area_sql = """
-        SELECT bf.region_id, SUM(ab.area) AS total_all_regions_area, SUM(bf.area) AS total_area
+        SELECT bf.region_id, t.dbca_interest, SUM(ab.area) AS total_all_regions_area
         FROM reporting_bushfire bf JOIN reporting_areaburnt ab ON bf.id = ab.bushfire_id JOIN bfrs_tenure t ON ab.tenure_id = t.id
-        WHERE bf.report_status IN {report_statuses} AND bf.reporting_year={reporting_year} AND bf.fire_not_found=false AND t.report_group='ALL REGIONS'  {{agency_condition}} 
-        GROUP BY bf.region_id
+        WHERE bf.report_status IN {report_statuses} AND bf.reporting_year={reporting_year} AND bf.fire_not_found=false AND t.report_group='ALL REGIONS'
+        GROUP BY bf.region_id, t.dbca_interest
         """.format(
             report_statuses="({})".format(",".join([str(i) for i in [Bushfire.STATUS_FINAL_AUTHORISED, Bushfire.STATUS_REVIEWED]])),
             reporting_year = self.reporting_year
         )
 
-        dbca_count_data = {}
-        total_count_data = {}
-
-        dbca_area_data = {}
-        total_area_data = {}
+        #keyed by (region id, dbca_interest)
+        count_data = {}
+        area_data = {}
 
         with connection.cursor() as cursor:
-            sql = count_sql.format(agency_condition = "AND t.dbca_interest IS TRUE")
-            cursor.execute(sql)
-            for result in cursor.fetchall():
-                dbca_count_data[result[0]] = result[1] or 0
-
-            sql = count_sql.format(agency_condition = "")
-            cursor.execute(sql)
-            for result in cursor.fetchall():
-                total_count_data[result[0]] = result[1] or 0
-
-            sql = area_sql.format(agency_condition = "AND t.dbca_interest IS TRUE")
-            cursor.execute(sql)
+            cursor.execute(count_sql)
             for result in cursor.fetchall():
-                dbca_area_data[result[0]] = result[1] or 0
+                count_data[(result[0],result[1])] = result[2] or 0
 
-            sql = area_sql.format(agency_condition = "")
-            logger.info("sql: " + sql)
-            cursor.execute(sql)
+            logger.info("sql: " + area_sql)
+            cursor.execute(area_sql)
             for result in cursor.fetchall():
-                total_area_data[result[0]] = result[1] or 0
-        logger.info("total_area_data: " + str(total_area_data))
-        for region in get_sorted_regions(True):
-            pw_tenure      = dbca_count_data.get(region.id, 0)
-            area_pw_tenure = round(dbca_area_data.get(region.id, 0), 2) 
-            total_all_area = total_count_data.get(region.id, 0)
-            total_area     = round(total_area_data.get(region.id, 0), 2)
-
-            rpt_map.append(
-                {region.name: dict(pw_tenure=pw_tenure, area_pw_tenure=area_pw_tenure, total_all_tenure=total_all_area, total_area=total_area)}
+                area_data[(result[0],result[1])] = result[2] or 0
+        logger.info("area_data: " + str(area_data))
+
+        region_data = {}
+        for region_id in set([k[0] for k in count_data.keys()]) | set([k[0] for k in area_data.keys()]):
+            pw_tenure = count_data.get((region_id,True), 0)
+            pw_area = area_data.get((region_id,True), 0)
+            region_data[region_id] = dict(
+                pw_tenure=pw_tenure,
+                area_pw_tenure=round(pw_area, 2),
+                total_all_tenure=pw_tenure + count_data.get((region_id,False), 0),
+                total_area=round(pw_area + area_data.get((region_id,False), 0), 2)
             )
-                
-            net_forest_pw_tenure      += pw_tenure 
-            net_forest_area_pw_tenure += area_pw_tenure
-            net_forest_total_all_area += total_all_area
-            net_forest_total_area     += total_area
-
-        rpt_map.append(
-            {'Sub Total (Forest)': dict(pw_tenure=net_forest_pw_tenure, area_pw_tenure=net_forest_area_pw_tenure, total_all_tenure=net_forest_total_all_area, total_area=net_forest_total_area)}
-        )
-
-        item_map['forest_pw_tenure'] = net_forest_pw_tenure
-        item_map['forest_area_pw_tenure'] = net_forest_area_pw_tenure
-        item_map['forest_total_all_tenure'] = net_forest_total_all_area
-        item_map['forest_total_area'] = net_forest_total_area
-
-        # add a white space/line between forest and non-forest region tabulated info
-        rpt_map.append(
-            {'': ''}
-        )
-
-        net_nonforest_pw_tenure      = 0
-        net_nonforest_area_pw_tenure = 0
-        net_nonforest_total_all_area = 0
-        net_nonforest_total_area     = 0
 
-        for region in get_sorted_regions(False):
-            pw_tenure      = dbca_count_data.get(region.id,0)
-            area_pw_tenure = round(dbca_area_data.get(region.id,0), 2) 
-            total_all_area = total_count_data.get(region.id,0)
-            total_area     = round(total_area_data.get(region.id,0), 2)
-
-            rpt_map.append(
-                {region.name: dict(pw_tenure=pw_tenure, area_pw_tenure=area_pw_tenure, total_all_tenure=total_all_area, total_area=total_area)}
-            )
-                
-            net_nonforest_pw_tenure      += pw_tenure 
-            net_nonforest_area_pw_tenure += area_pw_tenure
-            net_nonforest_total_all_area += total_all_area
-            net_nonforest_total_area     += total_area
-
-        rpt_map.append(
-            {'Sub Total (Non Forest)': dict(pw_tenure=net_nonforest_pw_tenure, area_pw_tenure=net_nonforest_area_pw_tenure, total_all_tenure=net_nonforest_total_all_area, total_area=net_nonforest_total_area)}
-        )
-
-        item_map['nonforest_total_all_tenure'] = net_nonforest_total_all_area
-        item_map['nonforest_total_area'] = net_nonforest_total_area
-                
-        rpt_map.append(
-            {'GRAND TOTAL': dict(
-                pw_tenure=net_forest_pw_tenure + net_nonforest_pw_tenure, 
-                area_pw_tenure=net_forest_area_pw_tenure + net_nonforest_area_pw_tenure, 
-                total_all_tenure=net_forest_total_all_area + net_nonforest_total_all_area, 
-                total_area=net_forest_total_area + net_nonforest_total_area
-            )}
-        )
-        
         # Excluded bushfires
         excluded_bf_info = {
             "general":            excluded_bfs_general_info,
@@ -874,7 +712,7 @@ class MinisterialReportAuth():
             "tenure_info":      excluded_bfs_tenure_info
             }
                 
-        return rpt_map, item_map, excluded_bf_info
+        return region_data, excluded_bf_info
 
     def export_final_csv(self, request, queryset):
         writer = unicodecsv.writer(response, quoting=unicodecsv.QUOTE_ALL)
@@ -1043,6 +881,9 @@ class MinisterialReportAuth():
                 response.write(f.read())
             logger.debug("Finally: returning PDF response.")
             return response
+        except (LatexPoolFull, LatexTimeout) as ex:
+            #the pdf generator is busy or too slow, the user can try again later
+            return HttpResponse(str(ex), status=503, content_type='text/plain')
         finally:
             if folder:
                 shutil.rmtree(folder)
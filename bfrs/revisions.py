@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import reversion
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+import logging
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class DeferredRevision(object):
+    """
+    Collect the registered objects saved in a request or an operation,
+    and save them into one revision after the transaction is committed.
+    An object saved several times is only serialised once, with its committed data:
+    the objects are reloaded when the revision is saved, so the changes rolled back by a savepoint are not recorded.
+    """
+    def __init__(self, user=None, request=None):
+        self.user = user
+        self.request = request
+        self.objects = OrderedDict()
+        self.comments = []
+
+    def add(self, obj):
+        self.objects[(obj.__class__, obj.pk)] = obj
+
+    def remove(self, obj):
+        self.objects.pop((obj.__class__, obj.pk), None)
+
+    def set_comment(self, comment):
+        if comment and comment not in self.comments:
+            self.comments.append(comment)
+
+    def get_user(self):
+        if self.user:
+            return self.user
+        if self.request and hasattr(self.request, "user") and self.request.user.is_authenticated():
+            return self.request.user
+        return None
+
+    def committed_objects(self):
+        """
+        Reload the collected objects with one query per model.
+        The objects whose creation was rolled back are dropped
+        """
+        pks = OrderedDict()
+        for model, pk in self.objects.keys():
+            pks.setdefault(model, []).append(pk)
+        objs = []
+        for model, model_pks in pks.items():
+            rows = model._base_manager.in_bulk(model_pks)
+            objs.extend(rows[pk] for pk in model_pks if pk in rows)
+        return objs
+
+    def save(self):
+        if not self.objects:
+            return
+        objs = self.committed_objects()
+        if not objs:
+            return
+        with reversion.create_revision():
+            for obj in objs:
+                reversion.add_to_revision(obj)
+            user = self.get_user()
+            if user:
+                reversion.set_user(user)
+            reversion.set_comment("; ".join(self.comments))
+        logger.debug("Saved {} objects into one revision".format(len(objs)))
+
+
+def get_revision():
+    """
+    Return the active deferred revision, or None
+    """
+    return getattr(_local, "revision", None)
+
+
+@contextmanager
+def deferred_revision(user=None, request=None):
+    """
+    Collect the registered objects saved in the block and save them into one revision after the transaction is committed.
+    If a deferred revision is already active, the objects are added to it.
+    """
+    revision = get_revision()
+    if revision:
+        yield revision
+        return
+
+    revision = DeferredRevision(user=user, request=request)
+    _local.revision = revision
+    try:
+        yield revision
+    finally:
+        _local.revision = None
+    # run straight away if not in a transaction, discarded if the transaction is rolled back
+    transaction.on_commit(revision.save)
+
+
+def add_to_revision(obj):
+    revision = get_revision()
+    if revision:
+        revision.add(obj)
+    else:
+        with reversion.create_revision():
+            reversion.add_to_revision(obj)
+
+
+def _post_save(sender, instance, **kwargs):
+    revision = get_revision()
+    if revision and reversion.is_registered(sender):
+        revision.add(instance)
+
+
+def _post_delete(sender, instance, **kwargs):
+    revision = get_revision()
+    if revision:
+        revision.remove(instance)
+
+post_save.connect(_post_save, dispatch_uid="bfrs_deferred_revision_save")
+post_delete.connect(_post_delete, dispatch_uid="bfrs_deferred_revision_delete")
+
+
+class DeferredRevisionMiddleware(object):
+    """
+    Replace reversion's RevisionMiddleware.
+    Like RevisionMiddleware, run the requests which could change data in a transaction, and roll it back if the response is an error,
+    but gather all the saves in the request into one revision, which is written after the transaction is committed.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def request_creates_revision(self, request):
+        return request.method not in ("OPTIONS", "GET", "HEAD")
+
+    def __call__(self, request):
+        if not self.request_creates_revision(request):
+            return self.get_response(request)
+
+        with transaction.atomic(), deferred_revision(request=request):
+            response = self.get_response(request)
+            if response.status_code >= 400:
+                #the exceptions of the view are already turned into error responses
+                transaction.set_rollback(True)
+            return response
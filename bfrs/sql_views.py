@@ -1,18 +1,76 @@
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
 from bfrs.models import Bushfire,CaptureMethod
 from django.db import connection
 
-def create_bushfirelist_view():
+import logging
+logger = logging.getLogger(__name__)
+
+VIEW_NAMES = ('bfrs_bushfirelist_v','bfrs_bushfire_v','bfrs_bushfire_final_fireboundary_v','bfrs_bushfire_fireboundary_v')
+#the postgres advisory lock held while the materialized views are refreshed
+REFRESH_LOCK_ID = 20170701
+
+def drop_view(cursor, name):
+    """
+    Drop the view or the materialized view
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('v','m')", [name])
+    row = cursor.fetchone()
+    if row:
+        cursor.execute("DROP {}VIEW {}".format("MATERIALIZED " if row[0] == 'm' else "", name))
+
+def create_view(name, select_sql, materialized=False, geometry_columns=()):
+    """
+    Create the view, or the materialized view with a unique index on id, which is required by REFRESH MATERIALIZED VIEW CONCURRENTLY,
+    and the GiST indexes of the geometry columns
+    """
+    select_sql = select_sql.strip().rstrip(';')
+    with connection.cursor() as cursor:
+        drop_view(cursor, name)
+        if materialized:
+            cursor.execute("CREATE MATERIALIZED VIEW {0} AS\n    {1}".format(name, select_sql))
+            cursor.execute("CREATE UNIQUE INDEX {0}_id_idx ON {0} (id)".format(name))
+            for column in geometry_columns:
+                cursor.execute("CREATE INDEX {0}_{1}_idx ON {0} USING GIST ({1})".format(name, column))
+        else:
+            cursor.execute("CREATE VIEW {0} AS\n    {1}".format(name, select_sql))
+
+def refresh_views(concurrently=True, wait=True):
+    """
+    Refresh the materialized views; the views which are not materialized are ignored.
+    The refreshes of all processes are serialised with a postgres advisory lock;
+    if wait is False and another process is refreshing the views, return None straight away.
+    Return the names of the refreshed views
+    """
+    with connection.cursor() as cursor:
+        if wait:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [REFRESH_LOCK_ID])
+        else:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [REFRESH_LOCK_ID])
+            if not cursor.fetchone()[0]:
+                return None
+        try:
+            cursor.execute("SELECT matviewname FROM pg_matviews WHERE matviewname IN %s", [VIEW_NAMES])
+            names = [row[0] for row in cursor.fetchall()]
+            for name in names:
+                cursor.execute("REFRESH MATERIALIZED VIEW {}{}".format("CONCURRENTLY " if concurrently else "", name))
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [REFRESH_LOCK_ID])
+    return names
+
+def create_bushfirelist_view(materialized=False):
     """
     cursor.execute('''drop view bfrs_bushfirelist_v''')
     """
-    from django.db import connection
-    cursor = connection.cursor()
-    cursor.execute('''
-    DROP VIEW IF EXISTS bfrs_bushfirelist_v;
-    CREATE OR REPLACE VIEW bfrs_bushfirelist_v AS
+    create_view('bfrs_bushfirelist_v', '''
     SELECT b.id,
     b.origin_point,
-    CASE WHEN b.report_status >= 2 THEN ST_AsGeoJSON(st_envelope(b.fire_boundary))
+    CASE WHEN b.report_status >= 2 THEN ST_AsGeoJSON(b.fire_boundary_envelope)
          ELSE ST_AsGeoJSON(b.fire_boundary)
     END as fire_boundary,
     b.fb_validation_req,
@@ -56,8 +114,8 @@ def create_bushfirelist_view():
     b.dispatch_pw_date,
     b.dispatch_aerial_date,
     b.fire_detected_date,
-    CASE WHEN fire_detected_date IS NULL THEN created
-         ELSE fire_detected_date
+    CASE WHEN b.fire_detected_date IS NULL THEN b.created
+         ELSE b.fire_detected_date
     END as fire_detected_or_created,
     b.fire_contained_date,
     b.fire_controlled_date,
@@ -90,12 +148,8 @@ def create_bushfirelist_view():
          WHEN b.archive THEN 1
          ELSE 0
     END as archive,
-    CASE WHEN b.valid_bushfire_id is null THEN NULL
-         ELSE (SELECT report_status FROM bfrs_bushfire WHERE id = b.valid_bushfire_id)
-    END as linked_bushfire_status,
-    CASE WHEN b.valid_bushfire_id is null THEN NULL
-         ELSE (SELECT fire_number FROM bfrs_bushfire WHERE id = b.valid_bushfire_id)
-    END as linked_bushfire_number,
+    lb.report_status as linked_bushfire_status,
+    lb.fire_number as linked_bushfire_number,
     b.authorised_by_id,
     b.cause_id,
     b.creator_id,
@@ -110,18 +164,15 @@ def create_bushfirelist_view():
     b.region_id,
     b.tenure_id
     FROM bfrs_bushfire b
+    LEFT JOIN bfrs_bushfire lb ON lb.id = b.valid_bushfire_id
     WHERE b.archive = false AND (b.report_status < {0} OR b.report_status = {1});
-    '''.format(Bushfire.STATUS_INVALIDATED,Bushfire.STATUS_MERGED))
+    '''.format(Bushfire.STATUS_INVALIDATED,Bushfire.STATUS_MERGED), materialized=materialized, geometry_columns=('origin_point',))
 
-def create_bushfire_view():
+def create_bushfire_view(materialized=False):
     """
     cursor.execute('''drop view bfrs_bushfire_v''')
     """
-    from django.db import connection
-    cursor = connection.cursor()
-    cursor.execute('''
-    DROP VIEW IF EXISTS bfrs_bushfire_v;
-    CREATE OR REPLACE VIEW bfrs_bushfire_v AS
+    create_view('bfrs_bushfire_v', '''
     SELECT b.id,
     b.origin_point,
     b.fb_validation_req,
@@ -133,12 +184,12 @@ def create_bushfire_view():
     b.reporting_year,
     b.prob_fire_level,
     b.max_fire_level,
-    CASE WHEN media_alert_req IS NULL THEN ''
-         WHEN media_alert_req THEN 'Yes'
+    CASE WHEN b.media_alert_req IS NULL THEN ''
+         WHEN b.media_alert_req THEN 'Yes'
          ELSE 'No'
     END as media_alert_req,
-    CASE WHEN park_trail_impacted IS NULL THEN ''
-         WHEN park_trail_impacted THEN 'Yes'
+    CASE WHEN b.park_trail_impacted IS NULL THEN ''
+         WHEN b.park_trail_impacted THEN 'Yes'
          ELSE 'No'
     END as park_trail_impacted,
     CASE WHEN b.cause_state IS NULL THEN ''
@@ -154,8 +205,8 @@ def create_bushfire_view():
          WHEN b.fire_position_override THEN 'Yes'
          ELSE 'No'
     END as fire_position_override,
-    CASE WHEN fire_not_found IS NULL THEN ''
-         WHEN fire_not_found THEN 'Yes'
+    CASE WHEN b.fire_not_found IS NULL THEN ''
+         WHEN b.fire_not_found THEN 'Yes'
          ELSE 'No'
     END as fire_not_found,
     b.other_info,
@@ -170,31 +221,25 @@ def create_bushfire_view():
          WHEN b.dispatch_aerial THEN 'Yes'
          ELSE 'No'
     END as dispatch_aerial,
-    CASE WHEN b.valid_bushfire_id is null THEN NULL
-         ELSE (SELECT 
-            CASE WHEN lb.report_status = 1 THEN 'Initial Fire Report'
-                 WHEN lb.report_status = 2 THEN 'Notifications Submitted'
-                 WHEN lb.report_status = 3 THEN 'Report Authorised'
-                 WHEN lb.report_status = 4 THEN 'Reviewed'
-                 WHEN lb.report_status = 5 THEN 'Invalidated'
-                 WHEN lb.report_status = 6 THEN 'Outstanding Fires'
-                 WHEN lb.report_status = 100 THEN 'Merged Fires'
-                 WHEN lb.report_status = 101 THEN 'Duplicate Fires'
-                 ELSE lb.report_status::text
-            END as report_status
-         FROM bfrs_bushfire lb WHERE lb.id = b.valid_bushfire_id)
+    CASE WHEN lb.report_status = 1 THEN 'Initial Fire Report'
+         WHEN lb.report_status = 2 THEN 'Notifications Submitted'
+         WHEN lb.report_status = 3 THEN 'Report Authorised'
+         WHEN lb.report_status = 4 THEN 'Reviewed'
+         WHEN lb.report_status = 5 THEN 'Invalidated'
+         WHEN lb.report_status = 6 THEN 'Outstanding Fires'
+         WHEN lb.report_status = 100 THEN 'Merged Fires'
+         WHEN lb.report_status = 101 THEN 'Duplicate Fires'
+         ELSE lb.report_status::text
     END as linked_bushfire_status,
-    CASE WHEN b.valid_bushfire_id is null THEN NULL
-         ELSE (SELECT fire_number FROM bfrs_bushfire WHERE id = b.valid_bushfire_id)
-    END as linked_bushfire_number,
+    lb.fire_number as linked_bushfire_number,
     to_char(b.dispatch_pw_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as dispatch_pw_date,
     to_char(b.dispatch_aerial_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as dispatch_aerial_date,
     to_char(b.fire_detected_date at time zone 'Australia/Perth','DD/MM/YYYY') as fire_detected_date,
     to_char(b.fire_contained_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_contained_date,
     to_char(b.fire_controlled_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_controlled_date,
     to_char(b.fire_safe_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_safe_date,
-    CASE WHEN fire_detected_date IS NULL THEN created
-         ELSE fire_detected_date
+    CASE WHEN b.fire_detected_date IS NULL THEN b.created
+         ELSE b.fire_detected_date
     END as fire_detected_or_created,
     b.other_first_attack,
     b.other_initial_control,
@@ -214,8 +259,8 @@ def create_bushfire_view():
          WHEN b.area_limit THEN 'Yes'
          ELSE 'No'
     END as area_limit,
-    CASE WHEN initial_area_unknown IS NULL THEN ''
-         WHEN initial_area_unknown THEN 'Yes'
+    CASE WHEN b.initial_area_unknown IS NULL THEN ''
+         WHEN b.initial_area_unknown THEN 'Yes'
          ELSE 'No'
     END as initial_area_unknown,
     to_char(b.authorised_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as authorised_date,
@@ -233,34 +278,48 @@ def create_bushfire_view():
          WHEN b.archive THEN 'Yes'
          ELSE 'No'
     END as archive,
-    (SELECT username AS authorised_by FROM auth_user WHERE id = b.authorised_by_id),
-    (SELECT name AS cause FROM bfrs_cause WHERE id = b.cause_id),
-    (SELECT username AS creator FROM auth_user WHERE id = b.creator_id),
-    (SELECT name AS district FROM bfrs_district WHERE id = b.district_id),
-    (SELECT username AS duty_officer FROM auth_user WHERE id = b.duty_officer_id),
-    (SELECT username AS field_officer FROM auth_user WHERE id = b.field_officer_id),
-    (SELECT name AS final_control FROM bfrs_agency WHERE id = b.final_control_id),
-    (SELECT name AS first_attack FROM bfrs_agency WHERE id = b.first_attack_id),
-    (SELECT username AS init_authorised_by FROM auth_user WHERE id = b.init_authorised_by_id),
-    (SELECT name AS initial_control FROM bfrs_agency WHERE id = b.initial_control_id),
-    (SELECT username AS modifier FROM auth_user WHERE id = b.modifier_id),
-    (SELECT name AS region FROM bfrs_region WHERE id = b.region_id),
-    (SELECT name AS tenure FROM bfrs_tenure WHERE id = b.tenure_id)
+    u_authorised_by.username AS authorised_by,
+    c_cause.name AS cause,
+    u_creator.username AS creator,
+    d_district.name AS district,
+    u_duty_officer.username AS duty_officer,
+    u_field_officer.username AS field_officer,
+    a_final_control.name AS final_control,
+    a_first_attack.name AS first_attack,
+    u_init_authorised_by.username AS init_authorised_by,
+    a_initial_control.name AS initial_control,
+    u_modifier.username AS modifier,
+    r_region.name AS region,
+    t_tenure.name AS tenure
     FROM bfrs_bushfire b
+    LEFT JOIN bfrs_bushfire lb ON lb.id = b.valid_bushfire_id
+    LEFT JOIN auth_user u_authorised_by ON u_authorised_by.id = b.authorised_by_id
+    LEFT JOIN bfrs_cause c_cause ON c_cause.id = b.cause_id
+    LEFT JOIN auth_user u_creator ON u_creator.id = b.creator_id
+    LEFT JOIN bfrs_district d_district ON d_district.id = b.district_id
+    LEFT JOIN auth_user u_duty_officer ON u_duty_officer.id = b.duty_officer_id
+    LEFT JOIN auth_user u_field_officer ON u_field_officer.id = b.field_officer_id
+    LEFT JOIN bfrs_agency a_final_control ON a_final_control.id = b.final_control_id
+    LEFT JOIN bfrs_agency a_first_attack ON a_first_attack.id = b.first_attack_id
+    LEFT JOIN auth_user u_init_authorised_by ON u_init_authorised_by.id = b.init_authorised_by_id
+    LEFT JOIN bfrs_agency a_initial_control ON a_initial_control.id = b.initial_control_id
+    LEFT JOIN auth_user u_modifier ON u_modifier.id = b.modifier_id
+    LEFT JOIN bfrs_region r_region ON r_region.id = b.region_id
+    LEFT JOIN bfrs_tenure t_tenure ON t_tenure.id = b.tenure_id
     WHERE b.archive = false AND (b.report_status < {0} OR b.report_status = {1});
-    '''.format(Bushfire.STATUS_INVALIDATED,Bushfire.STATUS_MERGED))
+    '''.format(Bushfire.STATUS_INVALIDATED,Bushfire.STATUS_MERGED), materialized=materialized, geometry_columns=('origin_point',))
 
-def create_final_fireboundary_view():
+def create_final_fireboundary_view(materialized=False):
     """
     cursor.execute('''drop view bfrs_bushfire_final_fireboundary_v''')
     """
-    from django.db import connection
-    cursor = connection.cursor()
-    cursor.execute('''
-    DROP VIEW IF EXISTS bfrs_bushfire_final_fireboundary_v;
-    CREATE OR REPLACE VIEW bfrs_bushfire_final_fireboundary_v AS
+    #the map layers use the stored simplified levels at the small scales; fire_boundary stays full resolution for the area calculations and the exports
+    create_view('bfrs_bushfire_final_fireboundary_v', '''
     SELECT b.id,
     b.fire_boundary,
+    b.fire_boundary_10m,
+    b.fire_boundary_100m,
+    b.fire_boundary_1km,
     b.fb_validation_req,
     to_char(b.created at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as created,
     to_char(b.modified at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as modified,
@@ -270,12 +329,12 @@ def create_final_fireboundary_view():
     b.reporting_year,
     b.prob_fire_level,
     b.max_fire_level,
-    CASE WHEN media_alert_req IS NULL THEN ''
-         WHEN media_alert_req THEN 'Yes'
+    CASE WHEN b.media_alert_req IS NULL THEN ''
+         WHEN b.media_alert_req THEN 'Yes'
          ELSE 'No'
     END as media_alert_req,
-    CASE WHEN park_trail_impacted IS NULL THEN ''
-         WHEN park_trail_impacted THEN 'Yes'
+    CASE WHEN b.park_trail_impacted IS NULL THEN ''
+         WHEN b.park_trail_impacted THEN 'Yes'
          ELSE 'No'
     END as park_trail_impacted,
     CASE WHEN b.cause_state IS NULL THEN ''
@@ -291,8 +350,8 @@ def create_final_fireboundary_view():
          WHEN b.fire_position_override THEN 'Yes'
          ELSE 'No'
     END as fire_position_override,
-    CASE WHEN fire_not_found IS NULL THEN ''
-         WHEN fire_not_found THEN 'Yes'
+    CASE WHEN b.fire_not_found IS NULL THEN ''
+         WHEN b.fire_not_found THEN 'Yes'
          ELSE 'No'
     END as fire_not_found,
     b.other_info,
@@ -313,8 +372,8 @@ def create_final_fireboundary_view():
     to_char(b.fire_contained_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_contained_date,
     to_char(b.fire_controlled_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_controlled_date,
     to_char(b.fire_safe_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_safe_date,
-    CASE WHEN fire_detected_date IS NULL THEN created
-         ELSE fire_detected_date
+    CASE WHEN b.fire_detected_date IS NULL THEN b.created
+         ELSE b.fire_detected_date
     END as fire_detected_or_created,
     b.other_first_attack,
     b.other_initial_control,
@@ -334,8 +393,8 @@ def create_final_fireboundary_view():
          WHEN b.area_limit THEN 'Yes'
          ELSE 'No'
     END as area_limit,
-    CASE WHEN initial_area_unknown IS NULL THEN ''
-         WHEN initial_area_unknown THEN 'Yes'
+    CASE WHEN b.initial_area_unknown IS NULL THEN ''
+         WHEN b.initial_area_unknown THEN 'Yes'
          ELSE 'No'
     END as initial_area_unknown,
     to_char(b.authorised_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as authorised_date,
@@ -360,35 +419,49 @@ def create_final_fireboundary_view():
          WHEN m.code = '{2}' THEN b.other_capturemethod
          ELSE m.desc
     END as capt_desc,
-    (SELECT username AS authorised_by FROM auth_user WHERE id = b.authorised_by_id),
-    (SELECT name AS cause FROM bfrs_cause WHERE id = b.cause_id),
-    (SELECT username AS creator FROM auth_user WHERE id = b.creator_id),
-    (SELECT name AS district FROM bfrs_district WHERE id = b.district_id),
-    (SELECT username AS duty_officer FROM auth_user WHERE id = b.duty_officer_id),
-    (SELECT username AS field_officer FROM auth_user WHERE id = b.field_officer_id),
-    (SELECT name AS final_control FROM bfrs_agency WHERE id = b.final_control_id),
-    (SELECT name AS first_attack FROM bfrs_agency WHERE id = b.first_attack_id),
-    (SELECT username AS init_authorised_by FROM auth_user WHERE id = b.init_authorised_by_id),
-    (SELECT name AS initial_control FROM bfrs_agency WHERE id = b.initial_control_id),
-    (SELECT username AS modifier FROM auth_user WHERE id = b.modifier_id),
-    (SELECT name AS region FROM bfrs_region WHERE id = b.region_id),
-    (SELECT name AS tenure FROM bfrs_tenure WHERE id = b.tenure_id),
-    (SELECT username AS fireboundary_uploaded_by FROM auth_user WHERE id = b.fireboundary_uploaded_by_id)
+    u_authorised_by.username AS authorised_by,
+    c_cause.name AS cause,
+    u_creator.username AS creator,
+    d_district.name AS district,
+    u_duty_officer.username AS duty_officer,
+    u_field_officer.username AS field_officer,
+    a_final_control.name AS final_control,
+    a_first_attack.name AS first_attack,
+    u_init_authorised_by.username AS init_authorised_by,
+    a_initial_control.name AS initial_control,
+    u_modifier.username AS modifier,
+    r_region.name AS region,
+    t_tenure.name AS tenure,
+    u_fireboundary_uploaded_by.username AS fireboundary_uploaded_by
     FROM bfrs_bushfire b LEFT JOIN bfrs_capturemethod m on b.capturemethod_id = m.id
+    LEFT JOIN auth_user u_authorised_by ON u_authorised_by.id = b.authorised_by_id
+    LEFT JOIN bfrs_cause c_cause ON c_cause.id = b.cause_id
+    LEFT JOIN auth_user u_creator ON u_creator.id = b.creator_id
+    LEFT JOIN bfrs_district d_district ON d_district.id = b.district_id
+    LEFT JOIN auth_user u_duty_officer ON u_duty_officer.id = b.duty_officer_id
+    LEFT JOIN auth_user u_field_officer ON u_field_officer.id = b.field_officer_id
+    LEFT JOIN bfrs_agency a_final_control ON a_final_control.id = b.final_control_id
+    LEFT JOIN bfrs_agency a_first_attack ON a_first_attack.id = b.first_attack_id
+    LEFT JOIN auth_user u_init_authorised_by ON u_init_authorised_by.id = b.init_authorised_by_id
+    LEFT JOIN bfrs_agency a_initial_control ON a_initial_control.id = b.initial_control_id
+    LEFT JOIN auth_user u_modifier ON u_modifier.id = b.modifier_id
+    LEFT JOIN bfrs_region r_region ON r_region.id = b.region_id
+    LEFT JOIN bfrs_tenure t_tenure ON t_tenure.id = b.tenure_id
+    LEFT JOIN auth_user u_fireboundary_uploaded_by ON u_fireboundary_uploaded_by.id = b.fireboundary_uploaded_by_id
     WHERE b.archive = false AND b.report_status >= {0} AND b.report_status < {1};
-    '''.format(Bushfire.STATUS_INITIAL_AUTHORISED, Bushfire.STATUS_INVALIDATED,CaptureMethod.OTHER_CODE))
+    '''.format(Bushfire.STATUS_INITIAL_AUTHORISED, Bushfire.STATUS_INVALIDATED,CaptureMethod.OTHER_CODE), materialized=materialized, geometry_columns=('fire_boundary','fire_boundary_10m','fire_boundary_100m','fire_boundary_1km'))
 
-def create_fireboundary_view():
+def create_fireboundary_view(materialized=False):
     """
     cursor.execute('''drop view bfrs_bushfire_fireboundary_v''')
     """
-    from django.db import connection
-    cursor = connection.cursor()
-    cursor.execute('''
-    DROP VIEW IF EXISTS bfrs_bushfire_fireboundary_v;
-    CREATE OR REPLACE VIEW bfrs_bushfire_fireboundary_v AS
+    #the map layers use the stored simplified levels at the small scales; fire_boundary stays full resolution for the area calculations and the exports
+    create_view('bfrs_bushfire_fireboundary_v', '''
     SELECT b.id,
     b.fire_boundary,
+    b.fire_boundary_10m,
+    b.fire_boundary_100m,
+    b.fire_boundary_1km,
     b.fb_validation_req,
     to_char(b.created at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as created,
     to_char(b.modified at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as modified,
@@ -398,12 +471,12 @@ def create_fireboundary_view():
     b.reporting_year,
     b.prob_fire_level,
     b.max_fire_level,
-    CASE WHEN media_alert_req IS NULL THEN ''
-         WHEN media_alert_req THEN 'Yes'
+    CASE WHEN b.media_alert_req IS NULL THEN ''
+         WHEN b.media_alert_req THEN 'Yes'
          ELSE 'No'
     END as media_alert_req,
-    CASE WHEN park_trail_impacted IS NULL THEN ''
-         WHEN park_trail_impacted THEN 'Yes'
+    CASE WHEN b.park_trail_impacted IS NULL THEN ''
+         WHEN b.park_trail_impacted THEN 'Yes'
          ELSE 'No'
     END as park_trail_impacted,
     CASE WHEN b.cause_state IS NULL THEN ''
@@ -419,8 +492,8 @@ def create_fireboundary_view():
          WHEN b.fire_position_override THEN 'Yes'
          ELSE 'No'
     END as fire_position_override,
-    CASE WHEN fire_not_found IS NULL THEN ''
-         WHEN fire_not_found THEN 'Yes'
+    CASE WHEN b.fire_not_found IS NULL THEN ''
+         WHEN b.fire_not_found THEN 'Yes'
          ELSE 'No'
     END as fire_not_found,
     b.other_info,
@@ -441,8 +514,8 @@ def create_fireboundary_view():
     to_char(b.fire_contained_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_contained_date,
     to_char(b.fire_controlled_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_controlled_date,
     to_char(b.fire_safe_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI') as fire_safe_date,
-    CASE WHEN fire_detected_date IS NULL THEN created
-         ELSE fire_detected_date
+    CASE WHEN b.fire_detected_date IS NULL THEN b.created
+         ELSE b.fire_detected_date
     END as fire_detected_or_created,
     b.other_first_attack,
     b.other_initial_control,
@@ -462,8 +535,8 @@ def create_fireboundary_view():
          WHEN b.area_limit THEN 'Yes'
          ELSE 'No'
     END as area_limit,
-    CASE WHEN initial_area_unknown IS NULL THEN ''
-         WHEN initial_area_unknown THEN 'Yes'
+    CASE WHEN b.initial_area_unknown IS NULL THEN ''
+         WHEN b.initial_area_unknown THEN 'Yes'
          ELSE 'No'
     END as initial_area_unknown,
     to_char(b.authorised_date at time zone 'Australia/Perth','DD/MM/YYYY HH24:MI:SS') as authorised_date,
@@ -488,59 +561,69 @@ def create_fireboundary_view():
          WHEN m.code = '{1}' THEN b.other_capturemethod
          ELSE m.desc
     END as capt_desc,
-    (SELECT username AS authorised_by FROM auth_user WHERE id = b.authorised_by_id),
-    (SELECT name AS cause FROM bfrs_cause WHERE id = b.cause_id),
-    (SELECT username AS creator FROM auth_user WHERE id = b.creator_id),
-    (SELECT name AS district FROM bfrs_district WHERE id = b.district_id),
-    (SELECT username AS duty_officer FROM auth_user WHERE id = b.duty_officer_id),
-    (SELECT username AS field_officer FROM auth_user WHERE id = b.field_officer_id),
-    (SELECT name AS final_control FROM bfrs_agency WHERE id = b.final_control_id),
-    (SELECT name AS first_attack FROM bfrs_agency WHERE id = b.first_attack_id),
-    (SELECT username AS init_authorised_by FROM auth_user WHERE id = b.init_authorised_by_id),
-    (SELECT name AS initial_control FROM bfrs_agency WHERE id = b.initial_control_id),
-    (SELECT username AS modifier FROM auth_user WHERE id = b.modifier_id),
-    (SELECT name AS region FROM bfrs_region WHERE id = b.region_id),
-    (SELECT name AS tenure FROM bfrs_tenure WHERE id = b.tenure_id),
-    (SELECT username AS fireboundary_uploaded_by FROM auth_user WHERE id = b.fireboundary_uploaded_by_id)
+    u_authorised_by.username AS authorised_by,
+    c_cause.name AS cause,
+    u_creator.username AS creator,
+    d_district.name AS district,
+    u_duty_officer.username AS duty_officer,
+    u_field_officer.username AS field_officer,
+    a_final_control.name AS final_control,
+    a_first_attack.name AS first_attack,
+    u_init_authorised_by.username AS init_authorised_by,
+    a_initial_control.name AS initial_control,
+    u_modifier.username AS modifier,
+    r_region.name AS region,
+    t_tenure.name AS tenure,
+    u_fireboundary_uploaded_by.username AS fireboundary_uploaded_by
     FROM bfrs_bushfire b LEFT JOIN bfrs_capturemethod m on b.capturemethod_id = m.id
+    LEFT JOIN auth_user u_authorised_by ON u_authorised_by.id = b.authorised_by_id
+    LEFT JOIN bfrs_cause c_cause ON c_cause.id = b.cause_id
+    LEFT JOIN auth_user u_creator ON u_creator.id = b.creator_id
+    LEFT JOIN bfrs_district d_district ON d_district.id = b.district_id
+    LEFT JOIN auth_user u_duty_officer ON u_duty_officer.id = b.duty_officer_id
+    LEFT JOIN auth_user u_field_officer ON u_field_officer.id = b.field_officer_id
+    LEFT JOIN bfrs_agency a_final_control ON a_final_control.id = b.final_control_id
+    LEFT JOIN bfrs_agency a_first_attack ON a_first_attack.id = b.first_attack_id
+    LEFT JOIN auth_user u_init_authorised_by ON u_init_authorised_by.id = b.init_authorised_by_id
+    LEFT JOIN bfrs_agency a_initial_control ON a_initial_control.id = b.initial_control_id
+    LEFT JOIN auth_user u_modifier ON u_modifier.id = b.modifier_id
+    LEFT JOIN bfrs_region r_region ON r_region.id = b.region_id
+    LEFT JOIN bfrs_tenure t_tenure ON t_tenure.id = b.tenure_id
+    LEFT JOIN auth_user u_fireboundary_uploaded_by ON u_fireboundary_uploaded_by.id = b.fireboundary_uploaded_by_id
     WHERE b.archive = false AND b.report_status < {0};
-    '''.format(Bushfire.STATUS_INVALIDATED,CaptureMethod.OTHER_CODE))
+    '''.format(Bushfire.STATUS_INVALIDATED,CaptureMethod.OTHER_CODE), materialized=materialized, geometry_columns=('fire_boundary','fire_boundary_10m','fire_boundary_100m','fire_boundary_1km'))
 
-def create_all_views():
-    create_bushfirelist_view()
-    create_bushfire_view()
-    create_final_fireboundary_view()
-    create_fireboundary_view()
+def create_all_views(materialized=False):
+    create_bushfirelist_view(materialized=materialized)
+    create_bushfire_view(materialized=materialized)
+    create_final_fireboundary_view(materialized=materialized)
+    create_fireboundary_view(materialized=materialized)
 
 def drop_bushfirelist_view():
     try:
-        cursor=connection.cursor()
-        cursor.execute('''drop view if exists bfrs_bushfirelist_v''')
-        return cursor.fetchall()
+        with connection.cursor() as cursor:
+            drop_view(cursor, 'bfrs_bushfirelist_v')
     except:
         pass
 
 def drop_bushfire_view():
     try:
-        cursor=connection.cursor()
-        cursor.execute('''drop view if exists bfrs_bushfire_v''')
-        return cursor.fetchall()
+        with connection.cursor() as cursor:
+            drop_view(cursor, 'bfrs_bushfire_v')
     except:
         pass
 
 def drop_final_fireboundary_view():
     try:
-        cursor=connection.cursor()
-        cursor.execute('''drop view if exists bfrs_bushfire_final_fireboundary_v''')
-        return cursor.fetchall()
+        with connection.cursor() as cursor:
+            drop_view(cursor, 'bfrs_bushfire_final_fireboundary_v')
     except:
         pass
 
 def drop_fireboundary_view():
     try:
-        cursor=connection.cursor()
-        cursor.execute('''drop view if exists bfrs_bushfire_fireboundary_v''')
-        return cursor.fetchall()
+        with connection.cursor() as cursor:
+            drop_view(cursor, 'bfrs_bushfire_fireboundary_v')
     except:
         pass
 
@@ -551,4 +634,51 @@ def drop_all_views():
     drop_fireboundary_view()
 
 
+class ViewRefresher(object):
+    """
+    Refresh the materialized views in a background thread a while after the bushfires are changed,
+    so the changes made during the delay are refreshed together.
+    Only one process refreshes the views at a time; if another process is refreshing them, the refresh is scheduled again,
+    so the changes committed during that refresh are not missed.
+    A refresh scheduled by a web worker is lost if the worker is stopped, so the refresh_views command should also be run on a schedule.
+    """
+    def __init__(self, delay, enabled):
+        self.delay = delay
+        self.enabled = enabled
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def schedule(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._timer:
+                #already scheduled
+                return
+            self._timer = threading.Timer(self.delay, self.run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def run(self):
+        with self._lock:
+            self._timer = None
+        try:
+            names = refresh_views(wait=False)
+            if names is None:
+                logger.debug("The materialized views are being refreshed by another process, refresh them later")
+                self.schedule()
+            else:
+                logger.debug("Refreshed the materialized views {}".format(names))
+        except:
+            logger.error(traceback.format_exc())
+        finally:
+            connection.close()
+
+
+view_refresher = ViewRefresher(settings.SQL_VIEWS_REFRESH_DELAY, settings.SQL_VIEWS_MATERIALIZED)
+
+def _bushfire_changed(sender, **kwargs):
+    transaction.on_commit(view_refresher.schedule)
 
+post_save.connect(_bushfire_changed, sender=Bushfire, dispatch_uid="sql_views_bushfire_saved")
+post_delete.connect(_bushfire_changed, sender=Bushfire, dispatch_uid="sql_views_bushfire_deleted")
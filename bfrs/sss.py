@@ -0,0 +1,105 @@
+import json
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.core import serializers
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SSSClient(object):
+    """
+    Client for the SSS spatial api.
+    Many features are sent in one request, the requests of a long list of features are run by concurrent workers,
+    and all the requests share one pooled session
+    """
+    spatial_path = "spatial"
+
+    def __init__(self, url, user, password, verify, timeout, batch_size, workers):
+        self.url = url if url.endswith('/') else url + '/'
+        self.auth = requests.auth.HTTPBasicAuth(user, password)
+        self.verify = verify
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.auth = self.auth
+                    session.verify = self.verify
+                    #one connection for each worker
+                    session.mount("http://", HTTPAdapter(pool_maxsize=self.workers))
+                    session.mount("https://", HTTPAdapter(pool_maxsize=self.workers))
+                    self._session = session
+        return self._session
+
+    @property
+    def spatial_url(self):
+        return self.url + self.spatial_path
+
+    def _post(self, payload):
+        """
+        Send one spatial request.
+        Return the list of feature results, or the exception if the request failed
+        """
+        count, data = payload
+        try:
+            resp = self.session.post(self.spatial_url, data=data, timeout=self.timeout)
+            resp.raise_for_status()
+            features = resp.json()["features"]
+            if len(features) != count:
+                raise Exception("SSS returned {} results for {} features".format(len(features), count))
+            return features
+        except Exception as ex:
+            logger.error("SSS spatial request failed. {}".format(str(ex)))
+            return ex
+
+    def spatial(self, objs, geometry_field, options):
+        """
+        Run the spatial options against the geometry field of the bushfires or snapshots
+        Return the list of feature results, or the exception of the failed request, in the same order as objs
+        """
+        objs = list(objs)
+        if not objs:
+            return []
+        batches = [objs[i:i + self.batch_size] for i in range(0, len(objs), self.batch_size)]
+        #serialize in the calling thread; the workers only send the requests
+        options = json.dumps(options)
+        payloads = [
+            (len(batch), {"features": serializers.serialize('geojson', batch, geometry_field=geometry_field, fields=('id', 'fire_number')), "options": options})
+            for batch in batches
+        ]
+        #create the session before starting the workers
+        self.session
+        if self.workers > 1 and len(payloads) > 1:
+            pool = ThreadPool(min(self.workers, len(payloads)))
+            try:
+                responses = pool.map(self._post, payloads)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            responses = map(self._post, payloads)
+
+        results = []
+        for batch, response in zip(batches, responses):
+            if isinstance(response, Exception):
+                results.extend([response] * len(batch))
+            else:
+                results.extend(response)
+        return results
+
+
+sss_client = SSSClient(settings.SSS_URL, settings.USER_SSO, settings.PASS_SSO, settings.SSS_CERTIFICATE_VERIFY,
+    settings.SSS_TIMEOUT, settings.SSS_SPATIAL_BATCH_SIZE, settings.SSS_SPATIAL_WORKERS)
@@ -4,7 +4,6 @@ from dateutil import tz
 
 from django.contrib.auth.models import User
 from django import template
-from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from django.utils.safestring import mark_safe
 
@@ -31,10 +30,7 @@ def get_jsonproperty(bushfire,property_name,default_value=None):
     return property value
     """
     if bushfire:
-        try:
-            return bushfire.properties.get(name=property_name).json_value
-        except ObjectDoesNotExist:
-            return default_value
+        return bushfire.get_property(property_name,default_value)
     else:
         return default_value
 
@@ -0,0 +1,133 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.core.exceptions import ObjectDoesNotExist
+
+from bfrs.models import Tenure, TenureMapping
+
+import logging
+logger = logging.getLogger(__name__)
+
+ws_re = re.compile("\s{2,}")
+
+
+class TenureIndex(object):
+    """
+    Resolve the tenure categories returned by SSS to the tenures used in bfrs.
+    All the tenure mappings are loaded into a dict keyed by the normalized category the first time it is used,
+    and the dict is dropped when a Tenure or TenureMapping is saved or deleted in this process.
+    The other processes don't see those changes, so the dict is also reloaded 'timeout' seconds after it was loaded.
+    """
+    default_group = 'ALL REGIONS'
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._mappings = None
+        self._expires = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(category):
+        return ws_re.sub(" ",category.lower().strip())
+
+    @property
+    def mappings(self):
+        mappings = self._mappings
+        if mappings is None or time.time() >= self._expires:
+            with self._lock:
+                if self._mappings is None or time.time() >= self._expires:
+                    self._mappings = dict([(m.name,m.tenure) for m in TenureMapping.objects.select_related("tenure")])
+                    self._expires = time.time() + self.timeout
+                mappings = self._mappings
+        return mappings
+
+    def clear(self, *args, **kwargs):
+        self._mappings = None
+
+    def get(self, category, createIfMissing=True):
+        """
+        Return the tenure of the category
+        """
+        return self.get_many([category],createIfMissing=createIfMissing)[category]
+
+    def get_many(self, categories, createIfMissing=True):
+        """
+        Return a dict of category to tenure.
+        The known categories are resolved without any query.
+        For the unknown categories, the tenures with the same name are found with one query and the missing tenures are created if createIfMissing is True,
+        then the mappings of all unknown categories are created with one insert.
+        """
+        mappings = self.mappings
+        result = {}
+        missing = {}
+        for category in categories:
+            normalized_category = self.normalize(category)
+            tenure = mappings.get(normalized_category)
+            if tenure:
+                result[category] = tenure
+            else:
+                missing.setdefault(normalized_category,[]).append(category)
+
+        if not missing:
+            return result
+
+        #TenureMapping are added later, and at the very first, TenureMapping is empty, and all tenure has a default tenure mapping "name equals category"
+        #if found, add the default mapping to TenureMapping
+        query = Q()
+        for category_list in missing.values():
+            for category in category_list:
+                query |= Q(name__iexact=category)
+        tenures = dict([(self.normalize(t.name),t) for t in Tenure.objects.filter(query)])
+
+        new_mappings = []
+        for normalized_category,category_list in missing.iteritems():
+            tenure = tenures.get(normalized_category)
+            if not tenure:
+                if not createIfMissing:
+                    raise ObjectDoesNotExist("Tenure({}) Not Found".format(category_list[0]))
+                #can't find tenure through mapping and default mapping. create it as new tenure
+                tenure = self.create_tenure(category_list[0])
+            new_mappings.append(TenureMapping(tenure=tenure,name=normalized_category))
+            for category in category_list:
+                result[category] = tenure
+
+        try:
+            with transaction.atomic():
+                TenureMapping.objects.bulk_create(new_mappings)
+        except IntegrityError:
+            #the mappings were created by another process in the meantime
+            self.clear()
+        else:
+            for mapping in new_mappings:
+                mappings[mapping.name] = mapping.tenure
+
+        return result
+
+    def create_tenure(self, category):
+        last_group_tenure = Tenure.objects.filter(report_group=self.default_group).order_by("-report_order").first()
+        if last_group_tenure:
+            report_group_order = last_group_tenure.report_group_order
+            report_order = last_group_tenure.report_order + 10
+        else:
+            report_order = 10
+            last_group = Tenure.objects.all().order_by("-report_group_order").first()
+            if last_group:
+                report_group_order = last_group.report_group_order + 1
+            else:
+                report_group_order = 1
+        tenure = Tenure(name=category,report_name=category,report_group=self.default_group, report_group_order=report_group_order,report_order= report_order)
+        tenure.save()
+        logger.info('The Tenure({}) is automatically created'.format(category))
+        return tenure
+
+
+tenure_index = TenureIndex(settings.TENURE_INDEX_TIMEOUT)
+
+for model in (Tenure, TenureMapping):
+    post_save.connect(tenure_index.clear, sender=model, dispatch_uid="tenure_index_{}_saved".format(model.__name__))
+    post_delete.connect(tenure_index.clear, sender=model, dispatch_uid="tenure_index_{}_deleted".format(model.__name__))
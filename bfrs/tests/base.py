@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point, Polygon, MultiPolygon
+from django.test import TestCase
+
+from bfrs.models import Bushfire, District
+
+
+def square(x, y, size, srid=4326):
+    """
+    Return a square MultiPolygon with the bottom left corner at (x, y)
+    """
+    return MultiPolygon(Polygon(((x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y))), srid=srid)
+
+
+class BushfireTestCase(TestCase):
+    fixtures = ['districts']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='bfrs_tester')
+        cls.district = District.objects.get(code='GLD')
+
+    def create_bushfire(self, fire_number, **kwargs):
+        """
+        Create a bushfire without sending post_save, so the tiles, sql views and lookup caches are not touched
+        """
+        data = {
+            'region': self.district.region,
+            'district': self.district,
+            'name': 'Test fire',
+            'year': 2017,
+            'reporting_year': 2017,
+            'fire_number': fire_number,
+            'origin_point': Point(121.5, -30.5, srid=4326),
+            'creator': self.user,
+            'modifier': self.user,
+        }
+        data.update(kwargs)
+        return Bushfire.objects.bulk_create([Bushfire(**data)])[0]
@@ -0,0 +1,84 @@
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.db import connection
+
+from bfrs.burnt_area import ALBERS_SRID, LocalAreaClient, create_albers_projection
+from bfrs.migration_utils import _area_values, burnt_area_options
+from bfrs.tests.base import BushfireTestCase, square
+
+
+def rectangle(x, y, width, height, srid=4326):
+    return MultiPolygon(Polygon(((x, y), (x + width, y), (x + width, y + height), (x, y + height), (x, y))), srid=srid)
+
+
+class LocalAreaTests(BushfireTestCase):
+    """
+    Calculate the burnt areas against the layers created in the test transaction
+    """
+    def setUp(self):
+        self.area_client = LocalAreaClient('bfrs_test_layers', 'wkb_geometry')
+        with connection.cursor() as cursor:
+            create_albers_projection(cursor)
+            cursor.execute("CREATE SCHEMA bfrs_test_layers")
+            for name in ('tenure', 'forest'):
+                cursor.execute("CREATE TABLE bfrs_test_layers.{} (id serial PRIMARY KEY, category varchar(64), wkb_geometry geometry(MultiPolygon,4326))".format(name))
+        self.fire = self.create_bushfire('BF 2017 GLD 001', fire_boundary=square(121.5, -30.5, 0.1))
+
+    def add_feature(self, layer, category, geom):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO bfrs_test_layers.{} (category, wkb_geometry) VALUES (%s, ST_GeomFromEWKB(%s))".format(layer), [category, geom.ewkb])
+
+    def albers_area(self, geom):
+        """
+        The area of the geometry in hectares
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT ST_Area(ST_Transform(ST_GeomFromEWKB(%s), %s))", [geom.ewkb, ALBERS_SRID])
+            return cursor.fetchone()[0] / 10000.0
+
+    def layers(self, *names):
+        return [{"id": name, "layerid": "cddp:{}".format(name), "properties": {"category": "category"}} for name in names]
+
+    def get_area(self, *names):
+        result = self.area_client.spatial([self.fire], 'fire_boundary', burnt_area_options(self.layers(*names)))[0]
+        self.assertNotIsInstance(result, Exception)
+        self.assertEqual(result["area"]["status"], {})
+        return _area_values(result)
+
+    def test_total_area(self):
+        result = self.area_client.spatial([self.fire], 'fire_boundary', burnt_area_options(None))[0]
+        self.assertAlmostEqual(result["area"]["data"]["total_area"], self.albers_area(self.fire.fire_boundary), places=3)
+        self.assertNotIn("layers", result["area"]["data"])
+
+    def test_overlapping_features_are_counted_once(self):
+        self.add_feature('tenure', 'A', square(121.5, -30.5, 0.05))
+        self.add_feature('tenure', 'A', square(121.5, -30.5, 0.05))
+        self.add_feature('tenure', 'A', square(121.525, -30.5, 0.05))
+        self.add_feature('tenure', 'B', square(121.55, -30.45, 0.05))
+        areas = self.get_area('tenure')
+        self.assertAlmostEqual(areas[("tenure", "A")], self.albers_area(rectangle(121.5, -30.5, 0.075, 0.05)), delta=5)
+        self.assertAlmostEqual(areas[("tenure", "B")], self.albers_area(square(121.55, -30.45, 0.05)), delta=5)
+        self.assertAlmostEqual(areas["total_area"], areas["other_area"] + areas[("tenure", "A")] + areas[("tenure", "B")], places=3)
+
+    def test_area_is_clipped_by_the_fire(self):
+        self.add_feature('tenure', 'A', square(121.55, -30.45, 0.1))
+        areas = self.get_area('tenure')
+        self.assertAlmostEqual(areas[("tenure", "A")], self.albers_area(square(121.55, -30.45, 0.05)), delta=5)
+
+    def test_area_counted_once_across_layers(self):
+        self.add_feature('tenure', 'A', rectangle(121.5, -30.5, 0.05, 0.1))
+        self.add_feature('forest', 'F', square(121.4, -30.6, 0.3))
+        areas = self.get_area('tenure', 'forest')
+        self.assertAlmostEqual(areas[("tenure", "A")], self.albers_area(rectangle(121.5, -30.5, 0.05, 0.1)), delta=5)
+        self.assertAlmostEqual(areas[("forest", "F")], self.albers_area(rectangle(121.55, -30.5, 0.05, 0.1)), delta=5)
+        self.assertAlmostEqual(areas["other_area"], 0, delta=5)
+
+    def test_same_result_structure_as_sss(self):
+        self.add_feature('tenure', 'A', square(121.5, -30.5, 0.05))
+        local = self.get_area('tenure', 'forest')
+        #the getArea result returned by SSS for the same fire and layers
+        sss = _area_values({"area": {"status": {}, "data": {
+            "total_area": local["total_area"],
+            "other_area": local["other_area"],
+            "layers": {"tenure": {"areas": [{"category": "A", "area": local[("tenure", "A")]}]}, "forest": {"areas": []}},
+        }}})
+        self.assertEqual(local, sss)
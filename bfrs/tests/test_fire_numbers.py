@@ -0,0 +1,33 @@
+from bfrs.models import Bushfire, District, FireNumberSequence
+from bfrs.tests.base import BushfireTestCase
+
+
+class FireNumberTests(BushfireTestCase):
+
+    def test_allocate_increments_per_district_and_year(self):
+        other_district = District.objects.exclude(id=self.district.id).first()
+        self.assertEqual([FireNumberSequence.allocate(self.district, 2017) for i in range(3)], [1, 2, 3])
+        self.assertEqual(FireNumberSequence.allocate(other_district, 2017), 1)
+        self.assertEqual(FireNumberSequence.allocate(self.district.id, 2018), 1)
+        self.assertEqual(FireNumberSequence.allocate(self.district.id, 2017), 4)
+        self.assertEqual(FireNumberSequence.objects.get(district=self.district, year=2017).last_number, 4)
+
+    def test_clean_doesnt_consume_fire_numbers(self):
+        bf = Bushfire(region=self.district.region, district=self.district, year=2017)
+        bf.clean()
+        self.assertEqual(bf.fire_number, '')
+        self.assertFalse(FireNumberSequence.objects.exists())
+
+    def test_assign_the_next_fire_number(self):
+        numbers = []
+        for i in range(2):
+            bf = Bushfire(region=self.district.region, district=self.district, year=2017)
+            bf.assign_fire_number()
+            numbers.append(bf.fire_number)
+        self.assertEqual(numbers, ['BF 2017 GLD 001', 'BF 2017 GLD 002'])
+
+    def test_assign_keeps_the_fire_number(self):
+        bf = self.create_bushfire('BF 2017 GLD 010')
+        bf.assign_fire_number()
+        self.assertEqual(bf.fire_number, 'BF 2017 GLD 010')
+        self.assertFalse(FireNumberSequence.objects.exists())
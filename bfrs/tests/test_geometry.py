@@ -0,0 +1,66 @@
+import base64
+import json
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.test import SimpleTestCase, TestCase
+
+from bfrs.geometry import GeometryError, parse_geometry, parse_multipolygon
+from bfrs.tests.base import square
+
+
+class ParseGeometryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.geom = square(121.5, -30.5, 0.1)
+
+    def assertParsed(self, value):
+        geom = parse_geometry(value)
+        self.assertEqual(geom.srid, 4326)
+        self.assertTrue(geom.equals(self.geom))
+
+    def test_geojson(self):
+        geojson = json.loads(self.geom.geojson)
+        self.assertParsed(geojson)
+        self.assertParsed(self.geom.geojson)
+        self.assertParsed({"type": "Feature", "properties": {}, "geometry": geojson})
+
+    def test_coordinates(self):
+        self.assertParsed(json.loads(self.geom.geojson)["coordinates"])
+
+    def test_wkb(self):
+        self.assertParsed(self.geom.hexewkb)
+        self.assertParsed(base64.b64encode(bytes(self.geom.ewkb)))
+
+    def test_wkt(self):
+        self.assertParsed(self.geom.wkt)
+        self.assertParsed(self.geom.ewkt)
+
+    def test_transform(self):
+        geom = parse_geometry(self.geom.transform(3857, clone=True).ewkt)
+        self.assertEqual(geom.srid, 4326)
+        self.assertTrue(geom.equals_exact(self.geom, 0.000001))
+
+    def test_invalid(self):
+        for value in ("not a geometry", "{\"type\": \"Polygon\"}", 12):
+            self.assertRaises(GeometryError, parse_geometry, value)
+
+
+class ParseMultiPolygonTests(TestCase):
+
+    def test_polygon(self):
+        geom = parse_multipolygon(square(121.5, -30.5, 0.1)[0].geojson)
+        self.assertIsInstance(geom, MultiPolygon)
+        self.assertTrue(geom.equals(square(121.5, -30.5, 0.1)))
+
+    def test_repair(self):
+        #a self-intersecting bowtie is repaired into two triangles
+        bowtie = Polygon(((0, 0), (1, 1), (1, 0), (0, 1), (0, 0)), srid=4326)
+        self.assertFalse(bowtie.valid)
+        geom = parse_multipolygon(bowtie.wkt)
+        self.assertIsInstance(geom, MultiPolygon)
+        self.assertTrue(geom.valid)
+        self.assertEqual(len(geom), 2)
+        self.assertAlmostEqual(geom.area, 0.5)
+
+    def test_not_polygonal(self):
+        self.assertRaises(GeometryError, parse_multipolygon, "POINT(121.5 -30.5)")
@@ -0,0 +1,262 @@
+import email
+from email.mime.text import MIMEText
+
+from django.core import mail
+from django.test import override_settings
+
+from bfrs import harvest
+from bfrs.models import Bushfire, HarvestCheckpoint
+from bfrs.tests.base import BushfireTestCase
+
+
+def dfes_email(fire_number, incident_num, subject='DFES Incident Notification'):
+    """
+    Return a DFES incident email; the line breaks of the DFES html emails are encoded as &#13;
+    """
+    msg = MIMEText('<html><body><p>Incident: {}&#13;<br>Fire Number: {}&#13;<br>Please REPLY above this line</p></body></html>'.format(incident_num, fire_number), 'html')
+    msg['Subject'] = subject
+    msg['From'] = 'dfes@example.com'
+    msg['To'] = 'bfrs@example.com'
+    return msg.as_string()
+
+
+def other_email(subject):
+    msg = MIMEText('Hello', 'plain')
+    msg['Subject'] = subject
+    return msg.as_string()
+
+
+class FakeIMAP(object):
+    """
+    Serve the emails {uid: email} like an IMAP folder; the flagged and moved emails are excluded from the UNFLAGGED searches after flush
+    """
+    email_folder = 'INBOX'
+
+    def __init__(self, emails):
+        self.emails = emails
+        self.uidvalidity = 1
+        self.failing_parts = None
+        self.missing = set()
+        self.fetched = []
+        self.flags, self.success_flags, self.moves = [], [], []
+        self.flagged, self.success_flagged, self.moved = [], [], []
+
+    def get_uidvalidity(self):
+        return self.uidvalidity
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            uids = [uid for uid in sorted(self.emails) if uid not in self.flagged + self.success_flagged + self.moved]
+            if 'UID' in args:
+                start = int(args[2].split(':')[0])
+                #'n:*' always includes the last email
+                uids = [uid for uid in uids if uid >= start] or uids[-1:]
+            return 'OK', [' '.join(str(uid) for uid in uids)]
+        elif command == 'FETCH':
+            uids = [int(uid) for uid in args[0].split(',')]
+            self.fetched.append(uids)
+            if self.failing_parts and self.failing_parts in args[1]:
+                return 'NO', ['Fetch failed']
+            responses = []
+            for uid in uids:
+                if uid in self.missing:
+                    continue
+                data = self.emails[uid]
+                if 'HEADER.FIELDS' in args[1]:
+                    data = data.split('\n\n')[0] + '\n\n'
+                responses.append(('{} (UID {} BODY[] {{{}}}'.format(uid, uid, len(data)), data))
+                responses.append(')')
+            return 'OK', responses
+        raise Exception('Unsupported command {}'.format(command))
+
+    def flag(self, msgid):
+        self.flags.append(msgid)
+
+    def success_flag(self, msgid):
+        self.success_flags.append(msgid)
+
+    def move(self, msgid, env):
+        self.moves.append(msgid)
+
+    def flush(self, uid=False):
+        self.flagged.extend(self.flags)
+        self.success_flagged.extend(self.success_flags)
+        self.moved.extend(self.moves)
+        self.flags, self.success_flags, self.moves = [], [], []
+
+
+@override_settings(SUPPORT_EMAIL=['support@example.com'])
+class HarvestTestCase(BushfireTestCase):
+
+    def setUp(self):
+        self.dimap = harvest.dimap
+        self.batch_size = harvest.BATCH_SIZE
+
+    def tearDown(self):
+        harvest.dimap = self.dimap
+        harvest.BATCH_SIZE = self.batch_size
+
+    def set_emails(self, emails):
+        harvest.dimap = FakeIMAP(emails)
+        return harvest.dimap
+
+    def checkpoint(self):
+        return HarvestCheckpoint.objects.get(folder='INBOX').last_uid
+
+
+class IncrementalHarvestTests(HarvestTestCase):
+
+    def test_checkpoint_advances(self):
+        self.create_bushfire('BF 2017 GLD 001')
+        imap = self.set_emails({
+            1: dfes_email('BF 2017 GLD 001', '123456'),
+            2: other_email('Lunch on Friday'),
+            3: dfes_email('BF 2017 GLD 001', '234567'),
+        })
+        self.assertEqual(harvest.harvest_incremental(), 2)
+        self.assertEqual(self.checkpoint(), 3)
+        self.assertEqual(imap.success_flagged, [1, 3])
+        #the emails which aren't DFES incident emails are flagged and reported
+        self.assertEqual(imap.flagged, [2])
+        self.assertEqual(len(mail.outbox), 1)
+        #the bodies are fetched for the shortlisted emails only
+        self.assertEqual(imap.fetched, [[1, 2, 3], [1, 3]])
+        self.assertEqual(Bushfire.objects.get(fire_number='BF 2017 GLD 001').dfes_incident_no, '234567')
+
+        imap.emails[4] = dfes_email('BF 2017 GLD 001', '345678')
+        imap.fetched = []
+        self.assertEqual(harvest.harvest_incremental(), 1)
+        self.assertEqual(self.checkpoint(), 4)
+        self.assertEqual(imap.fetched, [[4], [4]])
+        self.assertEqual(Bushfire.objects.get(fire_number='BF 2017 GLD 001').dfes_incident_no, '345678')
+
+    def test_no_new_emails(self):
+        imap = self.set_emails({1: dfes_email('BF 2017 GLD 001', '123456')})
+        HarvestCheckpoint.objects.create(folder='INBOX', uidvalidity=1, last_uid=1)
+        self.assertEqual(harvest.harvest_incremental(), 0)
+        self.assertEqual(self.checkpoint(), 1)
+        self.assertEqual(imap.fetched, [])
+
+    def test_uidvalidity_changed(self):
+        self.create_bushfire('BF 2017 GLD 001')
+        imap = self.set_emails({1: dfes_email('BF 2017 GLD 001', '123456')})
+        HarvestCheckpoint.objects.create(folder='INBOX', uidvalidity=0, last_uid=5)
+        self.assertEqual(harvest.harvest_incremental(), 1)
+        self.assertEqual(self.checkpoint(), 1)
+        self.assertEqual(imap.success_flagged, [1])
+
+    def test_failed_header_fetch_keeps_checkpoint(self):
+        imap = self.set_emails({1: dfes_email('BF 2017 GLD 001', '123456')})
+        imap.failing_parts = 'HEADER.FIELDS'
+        self.assertEqual(harvest.harvest_incremental(), 0)
+        self.assertEqual(self.checkpoint(), 0)
+        self.assertEqual(imap.flagged + imap.success_flagged, [])
+
+    def test_failed_body_fetch_keeps_checkpoint(self):
+        imap = self.set_emails({1: other_email('Lunch on Friday'), 2: dfes_email('BF 2017 GLD 001', '123456')})
+        imap.failing_parts = 'BODY.PEEK[]'
+        self.assertEqual(harvest.harvest_incremental(), 0)
+        self.assertEqual(self.checkpoint(), 0)
+        self.assertEqual(imap.flagged + imap.success_flagged, [])
+
+    def test_missing_email_is_examined_again(self):
+        self.create_bushfire('BF 2017 GLD 001')
+        imap = self.set_emails({
+            1: dfes_email('BF 2017 GLD 001', '123456'),
+            2: dfes_email('BF 2017 GLD 001', '234567'),
+            3: dfes_email('BF 2017 GLD 001', '345678'),
+        })
+        imap.missing = set([2])
+        self.assertEqual(harvest.harvest_incremental(), 1)
+        self.assertEqual(self.checkpoint(), 1)
+        self.assertEqual(imap.success_flagged, [1])
+
+        imap.missing = set()
+        self.assertEqual(harvest.harvest_incremental(), 2)
+        self.assertEqual(self.checkpoint(), 3)
+        self.assertEqual(imap.success_flagged, [1, 2, 3])
+
+    def test_batch_size(self):
+        harvest.BATCH_SIZE = 1
+        self.create_bushfire('BF 2017 GLD 001')
+        imap = self.set_emails({
+            1: dfes_email('BF 2017 GLD 001', '123456'),
+            2: other_email('Lunch on Friday'),
+            3: dfes_email('BF 2017 GLD 001', '234567'),
+        })
+        self.assertEqual(harvest.harvest_incremental(), 1)
+        #the emails up to the next shortlisted email are examined
+        self.assertEqual(self.checkpoint(), 2)
+        self.assertEqual(imap.success_flagged, [1])
+        self.assertEqual(imap.flagged, [2])
+
+        self.assertEqual(harvest.harvest_incremental(), 1)
+        self.assertEqual(self.checkpoint(), 3)
+        self.assertEqual(imap.success_flagged, [1, 3])
+
+
+class ParseEmailTests(HarvestTestCase):
+
+    def parse(self, raw):
+        return harvest.parse_bushfire_email((1, email.message_from_string(raw)))
+
+    def test_parse(self):
+        result = self.parse(dfes_email('BF 2017 GLD 001', '123456'))
+        self.assertIsNone(result['error'])
+        self.assertIsNone(result['env'])
+        self.assertEqual(result['incident_num'], '123456')
+        self.assertEqual(result['fire_num'], 'BF 2017 GLD 001')
+        self.assertEqual(result['subject'], 'DFES Incident Notification')
+        self.assertEqual(result['meta']['from'], 'dfes@example.com')
+
+    def test_parse_error(self):
+        result = self.parse(other_email('DFES Incident Notification'))
+        self.assertEqual(result['error'], 'parse')
+        self.assertEqual(result['subject'], 'DFES Incident Notification')
+
+    def test_non_prod_email(self):
+        result = self.parse(dfes_email('BF 2017 GLD 001', '123456', subject='UAT DFES Incident Notification'))
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['env'], 'uat')
+
+    def test_parse_many(self):
+        messages = [(uid, email.message_from_string(dfes_email('BF 2017 GLD {0:03d}'.format(uid), '123456'))) for uid in range(1, 4)]
+        results = harvest.parse_bushfire_emails(messages)
+        self.assertEqual([(r['msgid'], r['fire_num']) for r in results], [(1, 'BF 2017 GLD 001'), (2, 'BF 2017 GLD 002'), (3, 'BF 2017 GLD 003')])
+
+
+class ApplyEmailTests(HarvestTestCase):
+
+    def results(self, emails):
+        return harvest.parse_bushfire_emails([(uid, email.message_from_string(raw)) for uid, raw in emails])
+
+    def test_apply(self):
+        self.create_bushfire('BF 2017 GLD 001')
+        self.create_bushfire('BF 2017 GLD 002')
+        imap = self.set_emails({})
+        harvest.apply_bushfire_emails(self.results([
+            (1, dfes_email('BF 2017 GLD 001', '123456')),
+            (2, dfes_email('BF 2017 GLD 002', '234567')),
+            (3, dfes_email('BF 2017 GLD 999', '345678')),
+            (4, dfes_email('BF 2017 GLD 001', '456789', subject='UAT DFES Incident Notification')),
+        ]))
+        self.assertEqual(imap.success_flags, [1, 2])
+        self.assertEqual(imap.flags, [3])
+        self.assertEqual(imap.moves, [4])
+        self.assertEqual(dict(Bushfire.objects.values_list('fire_number', 'dfes_incident_no')), {'BF 2017 GLD 001': '123456', 'BF 2017 GLD 002': '234567'})
+
+    def test_failed_bushfire_only_flags_its_emails(self):
+        self.create_bushfire('BF 2017 GLD 001')
+        self.create_bushfire('BF 2017 GLD 002')
+        imap = self.set_emails({})
+        #the incident number is longer than the dfes_incident_no column
+        harvest.apply_bushfire_emails(self.results([
+            (1, dfes_email('BF 2017 GLD 001', '123456')),
+            (2, dfes_email('BF 2017 GLD 002', '1' * 40)),
+            (3, dfes_email('BF 2017 GLD 002', '2' * 40)),
+        ]))
+        self.assertEqual(imap.success_flags, [1])
+        self.assertEqual(imap.flags, [2, 3])
+        self.assertEqual(dict(Bushfire.objects.values_list('fire_number', 'dfes_incident_no')), {'BF 2017 GLD 001': '123456', 'BF 2017 GLD 002': None})
+        self.assertEqual(Bushfire.objects.get(fire_number='BF 2017 GLD 001').snapshots.count(), 1)
+        self.assertEqual(Bushfire.objects.get(fire_number='BF 2017 GLD 002').snapshots.count(), 0)
@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+
+from bfrs.lookups import LookupCache
+from bfrs.models import Bushfire, Tenure
+
+
+class LookupCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.settings_override = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "lookups": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": self.folder},
+        })
+        self.settings_override.enable()
+        self.lookup_cache = LookupCache("lookups", 60)
+        for model in (Bushfire, Tenure):
+            self.lookup_cache.register(model)
+        self.loads = 0
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.folder)
+
+    def load(self):
+        self.loads += 1
+        return ["BF 2017 GLD 001"]
+
+    def test_cached_until_a_joined_model_is_changed(self):
+        for i in range(2):
+            data, etag = self.lookup_cache.get([Bushfire, Tenure], ("fire_number",), self.load)
+        self.assertEqual(data, ["BF 2017 GLD 001"])
+        self.assertEqual(self.loads, 1)
+
+        self.lookup_cache.clear(Tenure)
+        self.assertEqual(self.lookup_cache.get([Bushfire, Tenure], ("fire_number",), self.load), (data, etag))
+        self.assertEqual(self.loads, 2)
+
+        self.lookup_cache.clear(Bushfire)
+        self.lookup_cache.get([Bushfire, Tenure], ("fire_number",), self.load)
+        self.assertEqual(self.loads, 3)
+
+    def test_unregistered_model_is_not_cached(self):
+        for i in range(2):
+            self.lookup_cache.get([Bushfire, User], ("field_values", "bushfire", "modifier__username"), self.load)
+        self.assertEqual(self.loads, 2)
+
+    def test_local_cache_is_not_used(self):
+        lookup_cache = LookupCache("default", 60)
+        lookup_cache.register(Bushfire)
+        for i in range(2):
+            lookup_cache.get([Bushfire], ("year",), self.load)
+        self.assertEqual(self.loads, 2)
@@ -0,0 +1,55 @@
+from django.utils import timezone
+
+from bfrs.models import Bushfire, BushfireSnapshot
+from bfrs.utils import serialize_bushfires
+from bfrs.tests.base import BushfireTestCase, square
+
+
+class SnapshotTests(BushfireTestCase):
+
+    def snapshot_twice(self):
+        """
+        Snapshot a bushfire, rename it and snapshot it again.
+        Return the bushfire and the two snapshots
+        """
+        bf = self.create_bushfire('BF 2017 GLD 001', name='Old name', fire_boundary=square(121.5, -30.5, 0.1))
+        first = serialize_bushfires('initial', 'Submit', [bf])[0]
+        bf.name = 'New name'
+        second = serialize_bushfires('initial', 'Update', [bf])[0]
+        return bf, first, second
+
+    def reconstructed(self, bf):
+        return BushfireSnapshot.reconstruct(BushfireSnapshot.objects.filter(bushfire=bf).order_by('created', 'id'))
+
+    def test_snapshots(self):
+        bf, first, second = self.snapshot_twice()
+        snapshots = self.reconstructed(bf)
+        self.assertEqual([s.id for s in snapshots], [first.id, second.id])
+        self.assertEqual(snapshots[1].name, 'New name')
+        self.assertTrue(snapshots[1].fire_boundary.equals(bf.fire_boundary))
+        self.assertEqual(tuple(snapshots[1].diff['Fire Name']), ('New name', 'Old name'))
+        self.assertEqual(snapshots[0].diff, {})
+
+    def test_changed_boundary(self):
+        bf, first, second = self.snapshot_twice()
+        bf.fire_boundary = square(121.6, -30.5, 0.1)
+        serialize_bushfires('initial', 'Update', [bf])
+
+        snapshots = self.reconstructed(bf)
+        self.assertTrue(snapshots[1].fire_boundary.equals(square(121.5, -30.5, 0.1)))
+        self.assertTrue(snapshots[2].fire_boundary.equals(square(121.6, -30.5, 0.1)))
+        self.assertEqual(snapshots[2].diff['fire boundary'], ('Changed', ''))
+        self.assertEqual(snapshots[1].diff.keys(), ['Fire Name'])
+
+    def test_initial_snapshot(self):
+        bf, first, second = self.snapshot_twice()
+        Bushfire.objects.filter(id=bf.id).update(
+            report_status=Bushfire.STATUS_INITIAL_AUTHORISED, init_authorised_by=self.user, init_authorised_date=timezone.now()
+        )
+        bf = Bushfire.objects.get(id=bf.id)
+        snapshot = bf.initial_snapshot
+        self.assertEqual(snapshot.id, second.id)
+        self.assertTrue(snapshot.fire_boundary.equals(bf.fire_boundary))
+        with self.assertNumQueries(0):
+            self.assertIs(bf.initial_snapshot, snapshot)
+        self.assertIsNone(bf.final_snapshot)
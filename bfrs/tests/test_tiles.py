@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from bfrs.tiles import BushfireTiles
+
+
+class FakeBushfireTiles(BushfireTiles):
+    """
+    Render a fixed tile, and run the hook in the middle of the rendering
+    """
+    hook = None
+
+    def render(self, z, x, y, year, statuses):
+        if self.hook:
+            self.hook()
+        return b"tile"
+
+
+class BushfireTilesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tiles = FakeBushfireTiles(self.folder, 16)
+        #the tile (10, 843, 606) covers the extent
+        self.extent = (116.5, -31.5, 116.6, -31.4)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_tile_is_cached(self):
+        self.assertEqual(self.tiles.get_tile(10, 843, 606), b"tile")
+        self.assertTrue(os.path.exists(self.tiles.tile_file(10, 843, 606, None, None)))
+
+    def test_invalidate_deletes_the_tile(self):
+        self.tiles.get_tile(10, 843, 606)
+        self.tiles.invalidate([self.extent], [2017], [1])
+        self.assertFalse(os.path.exists(self.tiles.tile_file(10, 843, 606, None, None)))
+
+    def test_tile_invalidated_during_rendering_is_not_cached(self):
+        self.tiles.hook = lambda: self.tiles.invalidate([self.extent], [2017], [1])
+        self.assertEqual(self.tiles.get_tile(10, 843, 606), b"tile")
+        self.assertFalse(os.path.exists(self.tiles.tile_file(10, 843, 606, None, None)))
+        self.assertEqual([f for f in os.listdir(os.path.dirname(self.tiles.tile_file(10, 843, 606, None, None))) if f.endswith(".tmp")], [])
+
+        #the next request caches the tile again
+        self.tiles.hook = None
+        self.tiles.get_tile(10, 843, 606)
+        self.assertTrue(os.path.exists(self.tiles.tile_file(10, 843, 606, None, None)))
@@ -0,0 +1,290 @@
+import fcntl
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+from bfrs.models import Bushfire
+
+import logging
+logger = logging.getLogger(__name__)
+
+#half of the width of the web mercator world, in metres
+MERCATOR_HALF_WIDTH = 20037508.342789244
+MAX_LATITUDE = 85.0511287798
+
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 3857) AS geom,
+           ST_Transform(ST_MakeEnvelope(%(bminx)s, %(bminy)s, %(bmaxx)s, %(bmaxy)s, 3857), 4326) AS geom_4326
+)
+SELECT
+    COALESCE((
+        SELECT ST_AsMVT(t, 'origin_points', %(extent)s, 'geom') FROM (
+            SELECT b.id, b.fire_number, b.name, b.report_status, b.reporting_year,
+                   ST_AsMVTGeom(ST_Transform(b.origin_point, 3857), bounds.geom, %(extent)s, %(buffer)s, true) AS geom
+            FROM {table} b, bounds
+            WHERE b.origin_point && bounds.geom_4326 {filters}
+        ) t
+    ), ''::bytea)
+    ||
+    COALESCE((
+        SELECT ST_AsMVT(t, 'fire_boundaries', %(extent)s, 'geom') FROM (
+            SELECT b.id, b.fire_number, b.name, b.report_status, b.reporting_year,
+                   ST_AsMVTGeom(ST_SimplifyPreserveTopology(ST_Transform(b.{fire_boundary}, 3857), %(tolerance)s), bounds.geom, %(extent)s, %(buffer)s, true) AS geom
+            FROM {table} b, bounds
+            WHERE b.{fire_boundary} && bounds.geom_4326 {filters}
+        ) t
+        WHERE t.geom IS NOT NULL
+    ), ''::bytea)
+"""
+
+
+def tile_bounds(z, x, y):
+    """
+    Return the web mercator bounds (minx, miny, maxx, maxy) of the tile
+    """
+    size = 2 * MERCATOR_HALF_WIDTH / (2 ** z)
+    minx = -MERCATOR_HALF_WIDTH + x * size
+    maxy = MERCATOR_HALF_WIDTH - y * size
+    return (minx, maxy - size, minx + size, maxy)
+
+
+def tile_range(z, extent):
+    """
+    Return the range (minx, miny, maxx, maxy) of the tiles covering the lon/lat extent at the zoom level
+    """
+    n = 2 ** z
+    def _tile(lon, lat):
+        lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+        return (max(0, min(n - 1, x)), max(0, min(n - 1, y)))
+    minx, maxy = _tile(extent[0], extent[1])
+    maxx, miny = _tile(extent[2], extent[3])
+    return (minx, miny, maxx, maxy)
+
+
+class BushfireTiles(object):
+    """
+    Generate the mapbox vector tiles of the bushfire origin points and fire boundaries with ST_AsMVT.
+    A tile has two layers: 'origin_points' and 'fire_boundaries'.
+    The tiles up to cache_max_zoom are cached in the folder, as {folder}/{year}/{status}/{z}/{x}/{y}.mvt,
+    and the cached tiles covering a bushfire are deleted when one of its tile fields is changed;
+    the folder should be outside of the code tree.
+    Each invalidation increases the generation stored in {folder}/generation, and a rendered tile is only cached
+    if the generation is not changed during the rendering, so a tile rendered from the data before an invalidation is never cached.
+    """
+    extent = 4096
+    buffer = 64
+    max_zoom = 22
+    #the fields which change the tiles
+    tile_fields = ("origin_point", "fire_boundary", "report_status", "reporting_year", "fire_number", "name")
+
+    def __init__(self, folder, cache_max_zoom):
+        self.folder = folder
+        self.cache_max_zoom = cache_max_zoom
+
+    def filter_key(self, year, statuses):
+        return (str(year) if year else "all", "_".join(str(s) for s in statuses) if statuses else "valid")
+
+    def tile_file(self, z, x, y, year, statuses):
+        return os.path.join(self.folder, *(self.filter_key(year, statuses) + (str(z), str(x), "{}.mvt".format(y))))
+
+    @contextmanager
+    def _generation_file(self, operation):
+        """
+        Lock the generation file with the flock operation and yield the open file
+        """
+        if not os.path.exists(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError:
+                #created by another process
+                pass
+        with open(os.path.join(self.folder, "generation"), "a+") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_generation(self, f):
+        f.seek(0)
+        data = f.read().strip()
+        return int(data) if data else 0
+
+    def generation(self):
+        with self._generation_file(fcntl.LOCK_SH) as f:
+            return self._read_generation(f)
+
+    def get_tile(self, z, x, y, year=None, statuses=None):
+        """
+        year: the reporting year, or None for all years
+        statuses: the list of report statuses, or None for all bushfires except the invalidated, merged and duplicated bushfires
+        Return the tile data
+        """
+        statuses = sorted(set(statuses)) if statuses else None
+        cache_file = self.tile_file(z, x, y, year, statuses) if self.folder and z <= self.cache_max_zoom else None
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                return f.read()
+
+        generation = self.generation() if cache_file else None
+        data = self.render(z, x, y, year, statuses)
+
+        if cache_file:
+            cache_dir = os.path.dirname(cache_file)
+            if not os.path.exists(cache_dir):
+                try:
+                    os.makedirs(cache_dir)
+                except OSError:
+                    #created by another process
+                    pass
+            #write into a temporary file and rename it, so a partial tile is never read
+            fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with self._generation_file(fcntl.LOCK_SH) as f:
+                if self._read_generation(f) == generation:
+                    os.rename(tmp_file, cache_file)
+                else:
+                    #the tile was invalidated during the rendering, and could be stale
+                    os.remove(tmp_file)
+        return data
+
+    def render(self, z, x, y, year, statuses):
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        margin = (maxx - minx) * self.buffer / self.extent
+        params = {
+            "minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy,
+            "bminx": minx - margin, "bminy": miny - margin, "bmaxx": maxx + margin, "bmaxy": maxy + margin,
+            "extent": self.extent, "buffer": self.buffer,
+            #half of a pixel
+            "tolerance": (maxx - minx) / self.extent / 2,
+        }
+        filters = []
+        if year:
+            filters.append("b.reporting_year = %(year)s")
+            params["year"] = year
+        if statuses:
+            filters.append("b.report_status IN %(statuses)s")
+            params["statuses"] = tuple(statuses)
+        else:
+            filters.append("b.report_status < %(invalidated)s")
+            params["invalidated"] = Bushfire.STATUS_INVALIDATED
+
+        sql = TILE_SQL.format(
+            table=connection.ops.quote_name(Bushfire._meta.db_table),
+            #the stored fire boundary simplified for the zoom level, tolerance converted to degrees
+            fire_boundary=connection.ops.quote_name(Bushfire.fire_boundary_field(params["tolerance"] / 111320.0)),
+            filters="".join(" AND {}".format(f) for f in filters)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            data = cursor.fetchone()[0]
+        return bytes(data) if data else b""
+
+    def filter_dirs(self, years, statuses):
+        """
+        Return the cache folders of the filters which could include a bushfire in one of the reporting years and report statuses
+        """
+        filter_dirs = []
+        for year_dir in ["all"] + [str(y) for y in set(years) if y]:
+            year_path = os.path.join(self.folder, year_dir)
+            if not os.path.isdir(year_path):
+                continue
+            for status_dir in os.listdir(year_path):
+                if status_dir == "valid" or any(str(s) in status_dir.split("_") for s in statuses):
+                    filter_dirs.append(os.path.join(year_path, status_dir))
+        return filter_dirs
+
+    def invalidate(self, extents, years, statuses):
+        """
+        Delete the cached tiles covering the lon/lat extents (minx, miny, maxx, maxy),
+        in the cache folders of the filters which could include a bushfire in one of the reporting years and report statuses.
+        The tiles are computed from the extents, so the cost doesn't depend on the number of cached tiles.
+        """
+        if not self.folder or not extents:
+            return
+
+        #increase the generation before deleting the tiles, so the tiles being rendered are not cached
+        with self._generation_file(fcntl.LOCK_EX) as f:
+            generation = self._read_generation(f) + 1
+            f.seek(0)
+            f.truncate()
+            f.write(str(generation))
+            f.flush()
+
+        count = 0
+        for filter_dir in self.filter_dirs(years, statuses):
+            for z in range(self.cache_max_zoom + 1):
+                z_path = os.path.join(filter_dir, str(z))
+                if not os.path.isdir(z_path):
+                    continue
+                tiles = set()
+                for extent in extents:
+                    minx, miny, maxx, maxy = tile_range(z, extent)
+                    #include the neighbour tiles, whose buffer could overlap the extent
+                    for x in range(max(0, minx - 1), min(2 ** z - 1, maxx + 1) + 1):
+                        for y in range(max(0, miny - 1), min(2 ** z - 1, maxy + 1) + 1):
+                            tiles.add((x, y))
+                x_paths = {}
+                for x, y in tiles:
+                    if x not in x_paths:
+                        x_paths[x] = os.path.join(z_path, str(x))
+                        if not os.path.isdir(x_paths[x]):
+                            x_paths[x] = None
+                    if not x_paths[x]:
+                        continue
+                    try:
+                        os.remove(os.path.join(x_paths[x], "{}.mvt".format(y)))
+                        count += 1
+                    except OSError:
+                        #not cached, or removed by another process
+                        pass
+        logger.debug("{} cached tiles are deleted".format(count))
+
+    def invalidate_bushfires(self, bushfires):
+        extents = []
+        for bushfire in bushfires:
+            for geom in (bushfire.fire_boundary, bushfire.origin_point):
+                if geom:
+                    extents.append(geom.extent)
+        #the bushfires could be changed by a bulk update, include their loaded status and year
+        years = [bf.reporting_year for bf in bushfires] + [bf._initial.get("reporting_year") for bf in bushfires]
+        statuses = [bf.report_status for bf in bushfires] + [bf._initial.get("report_status") for bf in bushfires]
+        self.invalidate(extents, years, [s for s in statuses if s is not None])
+
+    def _saved(self, sender, instance, created=False, **kwargs):
+        extents = []
+        years = [instance.reporting_year]
+        statuses = [instance.report_status]
+        for field in ("origin_point", "fire_boundary"):
+            geom = getattr(instance, field)
+            if geom:
+                extents.append(geom.extent)
+        if not created:
+            initial = instance._initial
+            if initial and all(initial.get(f) == getattr(instance, f) for f in self.tile_fields):
+                #the tiles are not changed
+                return
+            for field in ("origin_point", "fire_boundary"):
+                if initial.get(field):
+                    extents.append(initial[field].extent)
+            years.append(initial.get("reporting_year"))
+            statuses.append(initial.get("report_status"))
+        transaction.on_commit(lambda: self.invalidate(extents, years, [s for s in statuses if s is not None]))
+
+    def _deleted(self, sender, instance, **kwargs):
+        transaction.on_commit(lambda: self.invalidate_bushfires([instance]))
+
+
+bushfire_tiles = BushfireTiles(settings.TILE_CACHE_DIR, settings.TILE_CACHE_MAX_ZOOM)
+
+post_save.connect(bushfire_tiles._saved, sender=Bushfire, dispatch_uid="bushfire_tiles_saved")
+post_delete.connect(bushfire_tiles._deleted, sender=Bushfire, dispatch_uid="bushfire_tiles_deleted")
@@ -12,6 +12,7 @@ urlpatterns = [
 
     url(r'^history/(?P<pk>\d+)/$', views.BushfireHistoryCompareView.as_view(), name='bushfire_history'),
     url(r'report/$', views.ReportView.as_view(), name='bushfire_report'),
+    url(r'^latex/stats/$', views.latex_pool_stats, name='latex_pool_stats'),
     url(r'^bushfire/(?P<bushfireid>\d+)/document/$', views.BushfireDocumentListView.as_view(), name='bushfire_document_list'),
     url(r'^bushfire/(?P<bushfireid>\d+)/document/upload/$', views.BushfireDocumentUploadView.as_view(), name='bushfire_document_upload'),
     url(r'^document/(?P<pk>\d+)/download/$', views.DocumentDownloadView.as_view(), name='document_download'),
@@ -1,26 +1,23 @@
 import LatLon
 import tempfile
-import subprocess
 import shutil
-import re
 import traceback
 
 from django.http import HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.template.loader import render_to_string
 from bfrs.models import (Bushfire, BushfireSnapshot, District, Region,BushfireProperty,
-    AreaBurnt, Damage, Injury, Tenure,TenureMapping,
+    AreaBurnt, Damage, Injury, Tenure,
     SNAPSHOT_INITIAL, SNAPSHOT_FINAL,
     DamageSnapshot, InjurySnapshot, AreaBurntSnapshot,BushfirePropertySnapshot,
-    check_mandatory_fields,
-    DocumentTag
+    check_mandatory_fields,mandatory_fields_plan,load_properties,PROPERTIES_PREFETCH,
+    Document,DocumentTag
     )
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, transaction, connection
 from django.http import HttpResponse
 from django.core.mail import send_mail
 from cStringIO import StringIO
 from django.core.mail import EmailMessage
-from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from django.contrib.auth.models import User, Group, Permission
 from django.utils import timezone,safestring
@@ -32,16 +29,23 @@ from django.utils.encoding import smart_str
 from datetime import datetime
 from django.core import serializers
 from xlwt import Workbook
-from itertools import count
+from itertools import count, chain
 from django.forms.models import inlineformset_factory
 from collections import defaultdict, OrderedDict
 from copy import deepcopy
 from django.core.urlresolvers import reverse
-from django.db.models import Q
+from django.db.models import Q, Case, When, IntegerField, QuerySet
 import requests
 from requests.auth import HTTPBasicAuth
 from dateutil import tz
 from dfes import P1CAD
+from latexpool import latex_pool, LatexPoolFull, LatexTimeout
+from pbs import pbs_client
+from tenures import tenure_index
+from bfrs.revisions import deferred_revision
+from bfrs.lookups import lookup_cache
+from bfrs.tiles import bushfire_tiles
+from bfrs.sql_views import view_refresher
 import os
 
 import logging
@@ -96,32 +100,80 @@ def model_to_dict(instance, include=[], exclude=[]):
     return {f.attname: getattr(instance, f.attname) for f in fields if f.name not in exclude}
 
 def serialize_bushfire(auth_type, action, obj):
+    return serialize_bushfires(auth_type, action, [obj])[0]
+
+def _group_by(qs, key):
+    result = defaultdict(list)
+    for i in qs:
+        result[getattr(i, key)].append(i)
+    return result
+
+def serialize_bushfires(auth_type, action, objs):
+    """
+    Create a snapshot for each bushfire in objs, together with the snapshots of its properties, damages, injuries and burnt areas.
+    All the snapshot objects are built in memory and inserted with bulk_create, 
+    so the number of queries doesn't depend on the number of bushfires or child rows.
+    Return the list of created snapshots in the same order as objs
+    """
+    objs = list(objs)
+    if not objs:
+        return []
     action = action if action else 'Update'
     snapshot_type = SNAPSHOT_INITIAL if auth_type == 'initial' else SNAPSHOT_FINAL
-    d = model_to_dict(obj, exclude=['id', 'created', 'modified'])
-    s = BushfireSnapshot.objects.create(snapshot_type=snapshot_type, action=action, bushfire_id=obj.id, **d)
+    bushfire_ids = [obj.id for obj in objs]
+    modifier_ids = dict([(obj.id, obj.modifier_id) for obj in objs])
+
+    properties = _group_by(BushfireProperty.objects.filter(bushfire_id__in=bushfire_ids), 'bushfire_id')
+    damages = _group_by(Damage.objects.filter(bushfire_id__in=bushfire_ids), 'bushfire_id')
+    injuries = _group_by(Injury.objects.filter(bushfire_id__in=bushfire_ids), 'bushfire_id')
+    tenures_burnt = _group_by(AreaBurnt.objects.filter(bushfire_id__in=bushfire_ids), 'bushfire_id')
+
+    snapshots = []
+    for obj in objs:
+        data = model_to_dict(obj, exclude=['id', 'created', 'modified', 'latest_initial_snapshot', 'latest_final_snapshot'] + Bushfire.FIRE_BOUNDARY_DERIVED_FIELDS)
+        snapshots.append(BushfireSnapshot(snapshot_type=snapshot_type, action=action, bushfire_id=obj.id, **data))
+
+    # the snapshot ids are returned by the bulk insert
+    snapshots = BushfireSnapshot.objects.bulk_create(snapshots)
+    # point the bushfires to their new snapshots
+    latest_field = 'latest_initial_snapshot' if snapshot_type == SNAPSHOT_INITIAL else 'latest_final_snapshot'
+    Bushfire.objects.filter(id__in=bushfire_ids).update(**{latest_field: Case(*[When(id=obj.id, then=s.id) for obj, s in zip(objs, snapshots)], output_field=IntegerField())})
+    for obj, s in zip(objs, snapshots):
+        setattr(obj, latest_field, s)
+
+    snapshot_ids = dict([(obj.id, s.id) for obj, s in zip(objs, snapshots)])
 
     # create the formset snapshots and attach the bushfire_snapshot
-    for i in obj.properties.all():
-        BushfirePropertySnapshot.objects.create(
-            snapshot_id=s.id, snapshot_type=snapshot_type, name=i.name, value=i.value
+    BushfirePropertySnapshot.objects.bulk_create([
+        BushfirePropertySnapshot(snapshot_id=snapshot_ids[bushfire_id], snapshot_type=snapshot_type, name=i.name, value=i.value)
+        for bushfire_id in snapshot_ids for i in properties[bushfire_id]
+    ])
+
+    DamageSnapshot.objects.bulk_create([
+        DamageSnapshot(
+            snapshot_id=snapshot_ids[bushfire_id], snapshot_type=snapshot_type, damage_type_id=i.damage_type_id, number=i.number, descr=i.descr, 
+            creator_id=modifier_ids[bushfire_id], modifier_id=modifier_ids[bushfire_id]
         )
+        for bushfire_id in snapshot_ids for i in damages[bushfire_id]
+    ])
 
-    for i in obj.damages.all():
-        damage_obj = DamageSnapshot.objects.create(
-            #snapshot_id=s.id, snapshot_type=snapshot_type, damage_type=i.damage_type, number=i.number, creator=obj.modifier, modifier=obj.modifier
-            snapshot_id=s.id, snapshot_type=snapshot_type, damage_type=i.damage_type, number=i.number, descr=i.descr, creator=obj.modifier, modifier=obj.modifier
+    InjurySnapshot.objects.bulk_create([
+        InjurySnapshot(
+            snapshot_id=snapshot_ids[bushfire_id], snapshot_type=snapshot_type, injury_type_id=i.injury_type_id, number=i.number, 
+            creator_id=modifier_ids[bushfire_id], modifier_id=modifier_ids[bushfire_id]
         )
+        for bushfire_id in snapshot_ids for i in injuries[bushfire_id]
+    ])
 
-    for i in obj.injuries.all():
-        injury_obj = InjurySnapshot.objects.create(
-            snapshot_id=s.id, snapshot_type=snapshot_type, injury_type=i.injury_type, number=i.number, creator=obj.modifier, modifier=obj.modifier
+    AreaBurntSnapshot.objects.bulk_create([
+        AreaBurntSnapshot(
+            snapshot_id=snapshot_ids[bushfire_id], snapshot_type=snapshot_type, tenure_id=i.tenure_id, area=i.area, 
+            creator_id=modifier_ids[bushfire_id], modifier_id=modifier_ids[bushfire_id]
         )
+        for bushfire_id in snapshot_ids for i in tenures_burnt[bushfire_id]
+    ])
 
-    for i in obj.tenures_burnt.all():
-        tenure_burnt_obj = AreaBurntSnapshot.objects.create(
-            snapshot_id=s.id, snapshot_type=snapshot_type, tenure_id=i.tenure_id, area=i.area, creator=obj.modifier, modifier=obj.modifier
-        )
+    return snapshots
 
 def archive_snapshot(auth_type, action, obj):
         """ 
@@ -155,13 +207,16 @@ def invalidate_bushfire(obj, user,cur_obj=None):
         #district isn't changed, no need to invalidate it
         return (obj,False)
 
-    with transaction.atomic():
+    with transaction.atomic(), deferred_revision(user=user) as revision:
         #invalidate the current object
         cur_obj.report_status = Bushfire.STATUS_INVALIDATED
         cur_obj.invalid_details = obj.invalid_details or "Moved from '{}' to '{}'".format(cur_obj.district.name,obj.district.name)
         cur_obj.modifier = user
+        cur_obj.modified = timezone.now()
         cur_obj.sss_id = None
-        cur_obj.save(update_fields=["report_status","invalid_details","modifier","modified","sss_id"])
+        Bushfire.objects.filter(id=cur_obj.id).update(
+            report_status=cur_obj.report_status,invalid_details=cur_obj.invalid_details,modifier=user,modified=cur_obj.modified,sss_id=None
+        )
 
         # create a new object as a copy of existing
         obj.pk = None
@@ -174,7 +229,7 @@ def invalidate_bushfire(obj, user,cur_obj=None):
             linked_bushfire = reusable_invalidated_objs[0]
             obj.fire_number = linked_bushfire.fire_number
             linked_bushfire.fire_number = 'DE{}'.format(linked_bushfire.fire_number[2:])
-            linked_bushfire.save(update_fields=["fire_number"]) # to avoid integrity constraint
+            Bushfire.objects.filter(id=linked_bushfire.id).update(fire_number=linked_bushfire.fire_number) # to avoid integrity constraint
         else:
             # create new fire_number
             obj.fire_number = ' '.join(['BF', str(obj.year), obj.district.code, '{0:03d}'.format(obj.next_id(obj.district))])
@@ -187,51 +242,84 @@ def invalidate_bushfire(obj, user,cur_obj=None):
     
         #move documents to new created bushfire
         if linked_bushfire:
-            for doc in linked_bushfire.uploaded_documents.all():
-                obj.uploaded_documents.add(doc)
-
-            for doc in linked_bushfire.documents.all():
-                obj.documents.add(doc)
+            Document.objects.filter(upload_bushfire=linked_bushfire).update(upload_bushfire=obj)
+            Document.objects.filter(bushfire=linked_bushfire).update(bushfire=obj)
 
             #delete the previous bushfires because a new one is already created
             linked_bushfire.delete()
 
-        # link the new bushfire to the old invalidated bushfire
-        created = datetime.now(tz=pytz.utc)
-
-        # move all links from the above invalidated bushfire to the new bushfire
-        for linked in cur_obj.bushfire_invalidated.all():
-            obj.bushfire_invalidated.add(linked)
+        #the invalidated bushfire and the reused bushfire are updated without sending post_save
+        changed_bushfires = [cur_obj, linked_bushfire] if linked_bushfire else [cur_obj]
+        transaction.on_commit(lambda: bushfire_tiles.invalidate_bushfires(changed_bushfires))
 
-        def copy_fk_records(obj_id, fk_set, create_new=True):
-            # create duplicate injury records and associate them with the new object
-            for record in fk_set.all():
-                if create_new:
-                    record.id = None
-                record.bushfire_id = obj_id 
-                record.save()
+        # move all links from the above invalidated bushfire to the new bushfire, and link the old invalidated bushfire to the new (valid) bushfire - fwd link
+        Bushfire.objects.filter(Q(valid_bushfire=cur_obj) | Q(id=cur_obj.id)).update(valid_bushfire=obj)
+        cur_obj.valid_bushfire = obj
 
-        copy_fk_records(obj.id, cur_obj.properties)
-        copy_fk_records(obj.id, cur_obj.damages)
-        copy_fk_records(obj.id, cur_obj.injuries)
-        copy_fk_records(obj.id, cur_obj.tenures_burnt)
+        # copy the child records to the new bushfire
+        for model in (BushfireProperty, Damage, Injury, AreaBurnt):
+            copy_bushfire_records(model, cur_obj.id, obj.id)
 
         # update Bushfire Snapshots to the new bushfire_id and then create a new snapshot
-        copy_fk_records(obj.id, cur_obj.snapshots, create_new=False)
-
-        # link the old invalidate bushfire to the new (valid) bushfire - fwd link
-        cur_obj.valid_bushfire = obj
-        cur_obj.save(update_fields=["valid_bushfire"])
+        cur_obj.snapshots.update(bushfire=obj)
+        Bushfire.objects.filter(id=cur_obj.id).update(latest_initial_snapshot=None,latest_final_snapshot=None)
 
         #move the documents to new bushfire
-        for doc in cur_obj.documents.all():
-            obj.documents.add(doc)
+        Document.objects.filter(bushfire=cur_obj).update(bushfire=obj)
 
         if obj.report_status >= Bushfire.STATUS_FINAL_AUTHORISED:
             serialize_bushfire('Final', 'Update District ({} --> {})'.format(cur_obj.district.code, obj.district.code), obj)
 
+        revision.add(cur_obj)
+        revision.add(obj)
+        revision.set_comment("Moved bushfire '{}' to '{}'".format(cur_obj.fire_number,obj.fire_number))
+
     return (obj,True)
 
+def copy_bushfire_records(model, from_id, to_id):
+    """
+    Copy the child records of the bushfire(from_id) to the bushfire(to_id) with one INSERT ... SELECT statement
+    """
+    qn = connection.ops.quote_name
+    columns = ",".join(qn(f.column) for f in model._meta.concrete_fields if f.name not in ("id","bushfire"))
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO {0} (bushfire_id,{1}) SELECT %s,{1} FROM {0} WHERE bushfire_id = %s".format(qn(model._meta.db_table),columns),[to_id,from_id])
+
+def link_bushfires(request, primary_bushfire, bushfires, status, invalid_details, action_desc):
+    """
+    Link the bushfires to the primary bushfire with the status (merged or duplicated) in a few set based statements,
+    relink the bushfires already linked to them with the same status, and move their documents to the primary bushfire.
+    The final authorised bushfires are snapshotted in bulk, and all the changed bushfires are saved in one revision.
+    Should be called in a transaction
+    """
+    bushfires = list(bushfires)
+    bushfire_ids = [bf.id for bf in bushfires]
+    relinked_bushfires = list(Bushfire.objects.filter(valid_bushfire_id__in=bushfire_ids, report_status=status))
+
+    Bushfire.objects.filter(id__in=bushfire_ids).update(invalid_details=invalid_details, valid_bushfire=primary_bushfire, report_status=status)
+    if relinked_bushfires:
+        Bushfire.objects.filter(id__in=[bf.id for bf in relinked_bushfires]).update(invalid_details=invalid_details, valid_bushfire=primary_bushfire)
+    Document.objects.filter(bushfire_id__in=bushfire_ids).update(bushfire=primary_bushfire)
+    #the bushfires are updated without sending post_save
+    transaction.on_commit(lambda: lookup_cache.clear(Bushfire))
+    transaction.on_commit(lambda: bushfire_tiles.invalidate_bushfires(bushfires))
+    transaction.on_commit(view_refresher.schedule)
+
+    #keep the bushfire objects in line with the database
+    final_bushfires = [bf for bf in bushfires if bf.report_status >= Bushfire.STATUS_FINAL_AUTHORISED]
+    for bf in bushfires:
+        bf.report_status = status
+    for bf in chain(bushfires, relinked_bushfires):
+        bf.invalid_details = invalid_details
+        bf.valid_bushfire = primary_bushfire
+
+    serialize_bushfires("final", action_desc, final_bushfires)
+
+    with deferred_revision(user=request.user) as revision:
+        for bf in chain(bushfires, relinked_bushfires):
+            revision.add(bf)
+        revision.set_comment(invalid_details)
+
 def get_missing_mandatory_fields(obj,action):
     """ 
     Return the missing mandatory fields for report to perfrom the 'action'
@@ -246,44 +334,34 @@ def get_missing_mandatory_fields(obj,action):
         return (check_mandatory_fields(obj, Bushfire.SUBMIT_MANDATORY_FIELDS, Bushfire.SUBMIT_MANDATORY_DEP_FIELDS, Bushfire.SUBMIT_MANDATORY_FORMSETS) + check_mandatory_fields(obj, fields, dep_fields, Bushfire.AUTH_MANDATORY_FORMSETS)) or None
     return None
 
+def get_missing_mandatory_fields_many(bushfires,action):
+    """ 
+    Batch version of get_missing_mandatory_fields for a list or queryset of bushfires.
+    The rules are compiled once, the damages and injuries of a queryset are prefetched and the properties are loaded with one query.
+    Return a dict of bushfire id to the missing mandatory fields, or None if no missing mandatory fields
+    """
+    submit_plan = mandatory_fields_plan(Bushfire.SUBMIT_MANDATORY_FIELDS, Bushfire.SUBMIT_MANDATORY_DEP_FIELDS, Bushfire.SUBMIT_MANDATORY_FORMSETS)
+    if action == 'submit':
+        return dict([(bf_id,missing or None) for bf_id,missing in submit_plan.check_many(bushfires).iteritems()])
+
+    elif action in ['save_final','save_reviewed','authorise']:
+        if isinstance(bushfires,QuerySet):
+            bushfires = bushfires.prefetch_related(PROPERTIES_PREFETCH,*Bushfire.AUTH_MANDATORY_FORMSETS)
+        bushfires = load_properties(bushfires)
+        auth_plan = mandatory_fields_plan(Bushfire.AUTH_MANDATORY_FIELDS, Bushfire.AUTH_MANDATORY_DEP_FIELDS, Bushfire.AUTH_MANDATORY_FORMSETS)
+        auth_plan_fire_not_found = mandatory_fields_plan(Bushfire.AUTH_MANDATORY_FIELDS_FIRE_NOT_FOUND, Bushfire.AUTH_MANDATORY_DEP_FIELDS_FIRE_NOT_FOUND, Bushfire.AUTH_MANDATORY_FORMSETS)
+        return dict([
+            (bf.id,(submit_plan.check(bf) + (auth_plan_fire_not_found if bf.fire_not_found else auth_plan).check(bf)) or None)
+            for bf in bushfires
+        ])
+    return dict([(bf.id,None) for bf in bushfires])
+
 
-ws_re = re.compile("\s{2,}")
 def get_tenure(category,createIfMissing=True):
     """
     Return the tenure category used in bfrs
     """
-    normalized_category = ws_re.sub(" ",category.lower().strip())
-    try:
-        #try find the tenure through mapping
-        return TenureMapping.objects.get(name=normalized_category).tenure
-    except ObjectDoesNotExist as ex:
-        try:
-            #TenureMapping are added later, and at the very first, TenureMapping is empty, and all tenure has a default tenure mapping "name equals category"
-            #if found, add the default mapping to TenureMapping
-            tenure = Tenure.objects.get(name__iexact = category)
-            TenureMapping(tenure=tenure,name=normalized_category).save()
-            return tenure
-        except ObjectDoesNotExist as ex1:
-            if not createIfMissing:
-                raise ObjectDoesNotExist("Tenure({}) Not Found".format(category))
-            #can't find tenure through mapping and default mapping. create it as new tenure
-            default_group = 'ALL REGIONS'
-            last_group_tenure = Tenure.objects.filter(report_group=default_group).order_by("-report_order").first()
-            if last_group_tenure:
-                report_group_order = last_group_tenure.report_group_order
-                report_order = last_group_tenure.report_order + 10
-            else:
-                report_order = 10
-                last_group = Tenure.objects.all().order_by("-report_group_order").first()
-                if last_group:
-                    report_group_order = last_group.report_group_order + 1
-                else:
-                    report_group_order = 1
-            tenure = Tenure(name=category,report_name=category,report_group=default_group, report_group_order=report_group_order,report_order= report_order)
-            tenure.save()
-            TenureMapping(tenure=tenure,name=normalized_category).save()
-            logger.info('The Tenure({}) is automatically created'.format(category))
-            return tenure
+    return tenure_index.get(category,createIfMissing=createIfMissing)
 
 def update_areas_burnt(bushfire, burning_area):
     """
@@ -292,10 +370,11 @@ def update_areas_burnt(bushfire, burning_area):
     This method just simply delete the existing datas and add the current datas
     """
     # aggregate the area's in like tenure types
+    areas = [d for layer in burning_area.get("layers",{}).values() for d in layer['areas']]
+    tenures = tenure_index.get_many(set(d["category"] for d in areas))
     aggregated_sums = defaultdict(float)
-    for layer in burning_area.get("layers",{}).keys():
-        for d in burning_area["layers"][layer]['areas']:
-            aggregated_sums[get_tenure(d["category"])] += d["area"]
+    for d in areas:
+        aggregated_sums[tenures[d["category"]]] += d["area"]
 
     other_area = 0
     new_area_burnt_object = []
@@ -619,7 +698,7 @@ def update_status(request, bushfire, action,action_name="",update_fields=None,ac
                 errors.append(('fire_bombing', 'Faild to send Fire Bombing Request email for the bushfire({0}).{1}'.format(bushfire.fire_number,resp[1])))
 
         #send a notification email to fpc for all fires from regions except kimberley and pilbara, or bushfire has plantations data
-        if bushfire.region not in (Region.kimberley,Region.pilbara) or BushfireProperty.objects.filter(bushfire=bushfire,name="plantations").count() > 0:
+        if bushfire.region not in (Region.kimberley,Region.pilbara) or "plantations" in bushfire.json_properties:
             resp = send_email({
                 "bushfire":bushfire, 
                 "user_email":user_email,
@@ -881,25 +960,9 @@ def update_status(request, bushfire, action,action_name="",update_fields=None,ac
                 primary_bushfire.save(update_fields=["final_fire_boundary","area","other_area"])
                 
             #update merged bushfires to merged status and link to the primary bushfire
-            for bf in merged_bushfires:
-                bf.invalid_details = "Merged to bushfire '{}'".format(primary_bushfire.fire_number)
-                bf.valid_bushfire = primary_bushfire
-                if bf.report_status >= Bushfire.STATUS_FINAL_AUTHORISED:
-                    bf.report_status = Bushfire.STATUS_MERGED
-                    serialize_bushfire("final", "Merge", bf)
-                else:
-                    bf.report_status = Bushfire.STATUS_MERGED
-                bf.save(update_fields=["invalid_details","valid_bushfire","report_status"])
-
-                #if some bushfires were merged into this bushfire, then relink those merged bushfire to new primary bushfire
-                for mbf in bf.bushfire_invalidated.filter(report_status = Bushfire.STATUS_MERGED):
-                    mbf.invalid_details = "Merged to bushfire '{}'".format(primary_bushfire.fire_number)
-                    mbf.valid_bushfire = primary_bushfire
-                    mbf.save(update_fields=["invalid_details","valid_bushfire"])
-
-                #move the documents from merged bushfire to primary bushfire
-                for doc in bf.documents.all():
-                    primary_bushfire.documents.add(doc)
+            #if some bushfires were merged into the merged bushfires, then relink those merged bushfire to new primary bushfire
+            #move the documents from merged bushfires to primary bushfire
+            link_bushfires(request,primary_bushfire,merged_bushfires,Bushfire.STATUS_MERGED,"Merged to bushfire '{}'".format(primary_bushfire.fire_number),"Merge")
 
         message = (True,"Merge the bushfires({1}) into the primary bushfire({0}) successfully".format(primary_bushfire.fire_number,[bf.fire_number for bf in merged_bushfires]))
         #send emails
@@ -941,25 +1004,9 @@ def update_status(request, bushfire, action,action_name="",update_fields=None,ac
 
         with transaction.atomic():
             #update duplicated bushfires to duplicated status and link to the primary bushfire
-            for bf in duplicated_bushfires:
-                bf.invalid_details = "Duplicated with bushfire '{}'".format(primary_bushfire.fire_number)
-                bf.valid_bushfire = primary_bushfire
-                if bf.report_status >= Bushfire.STATUS_FINAL_AUTHORISED:
-                    bf.report_status = Bushfire.STATUS_DUPLICATED
-                    serialize_bushfire("final", "Invalidate_duplicated_reports", bf)
-                else:
-                    bf.report_status = Bushfire.STATUS_DUPLICATED
-                bf.save(update_fields=["invalid_details","valid_bushfire","report_status"])
-                #if some bushfires were duplicated with this bushfire, then relink those duplicated bushfire to new primary bushfire
-                for dbf in bf.bushfire_invalidated.filter(report_status = Bushfire.STATUS_DUPLICATED):
-                    dbf.invalid_details = "Duplicated with bushfire '{}'".format(primary_bushfire.fire_number)
-                    dbf.valid_bushfire = primary_bushfire
-                    dbf.save(update_fields=["invalid_details","valid_bushfire"])
-
-
-                #move the documents from duplicated bushfire to primary bushfire
-                for doc in bf.documents.all():
-                    primary_bushfire.documents.add(doc)
+            #if some bushfires were duplicated with the duplicated bushfires, then relink those duplicated bushfire to new primary bushfire
+            #move the documents from duplicated bushfires to primary bushfire
+            link_bushfires(request,primary_bushfire,duplicated_bushfires,Bushfire.STATUS_DUPLICATED,"Duplicated with bushfire '{}'".format(primary_bushfire.fire_number),"Invalidate_duplicated_reports")
 
         message = (True,"Keep the bushfire({0}) as the primary bushfire and invalidate the other duplicated bushfires({1}) successfully".format(primary_bushfire.fire_number,[bf.fire_number for bf in duplicated_bushfires]))
         #send emails
@@ -997,6 +1044,10 @@ def send_fire_bombing_req_email(context):
         folder,pdf_file = generate_pdf("latex/fire_bombing_request_form.tex",context={"bushfire":bushfire,"graphic_folder":settings.LATEX_GRAPHIC_FOLDER})
         context["attachments"] = [(pdf_file,"fire_bombing_request.pdf","application/pdf")]
         return send_email(context)
+    except (LatexPoolFull, LatexTimeout) as ex:
+        #the pdf generator is busy or too slow; the bushfire is saved, so the request can be sent again later
+        logger.warning("Failed to generate the fire bombing request form for the bushfire({}). {}".format(bushfire.fire_number,str(ex)))
+        return (False, "{} Please send the fire bombing request again later.".format(str(ex)))
     except Exception as ex:
         return (False, str(ex))
     finally:
@@ -1444,21 +1495,16 @@ def get_pbs_bushfires(fire_ids=None):
     try:
         logger.info("fire_ids: " + str(fire_ids))
         if fire_ids:
-            if isinstance(fire_ids, list):
-                params = {"fire_id__in": ','.join(fire_ids)}
-            else:
-                params = {"fire_id__in": fire_ids}
+            if not isinstance(fire_ids, list):
+                fire_ids = [fire_id.strip() for fire_id in fire_ids.split(',')]
         elif isinstance(fire_ids, list) and len(fire_ids) == 0:
             """ case where there are no outstanding fires in BFRS """
             return 
         else:
-            params = None
-        pbs_url = settings.PBS_URL if settings.PBS_URL.endswith('/') else settings.PBS_URL + os.sep
-        url = pbs_url + 'api/v1/prescribedburn/?format=json'
-        logger.info("r.url: " + requests.get(url=url, params=params, auth=requests.auth.HTTPBasicAuth(settings.USER_SSO, settings.PASS_SSO)).url)
-        return requests.get(url=url, params=params, auth=requests.auth.HTTPBasicAuth(settings.USER_SSO, settings.PASS_SSO)).json()
+            fire_ids = None
+        return pbs_client.get_bushfires(fire_ids)
     except Exception as e:
-        logger.error('REST API error connecting to PBS 268b bushfires:  {}\n{}\n'.format(url, e))
+        logger.error('REST API error connecting to PBS 268b bushfires:  {}\n{}\n'.format(pbs_client.prescribedburn_url, e))
         return []
    
 
@@ -1726,10 +1772,11 @@ def generate_pdf(tex_template_file,context,request=None,check_output=True):
     with open(tex_filename,"wb") as tex_file:
         tex_file.write(tex_doc)
     cmd = ['latexmk', '-cd', '-f', '-silent','-auxdir={}'.format(foldername),'-outdir={}'.format(foldername), '-pdf', tex_filename]
-    if check_output:
-        subprocess.check_output(cmd)
-    else:
-        subprocess.call(cmd)
+    try:
+        latex_pool.run(cmd,check_output=check_output)
+    except:
+        shutil.rmtree(foldername)
+        raise
 
     return (foldername,pdf_filename)
 
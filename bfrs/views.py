@@ -3,7 +3,7 @@ import collections
 import os
 import sys
 
-from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseNotAllowed,FileResponse
+from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseNotAllowed,FileResponse,HttpResponseBadRequest
 from django.template.response import TemplateResponse
 from django.core.urlresolvers import reverse
 from django.views import generic
@@ -12,6 +12,7 @@ from django.views.generic.list import ListView
 from django.forms.formsets import formset_factory
 from django.forms.widgets import CheckboxInput
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.gis.geos import Point, GEOSGeometry, Polygon, MultiPolygon, GEOSException
@@ -31,8 +32,7 @@ from bfrs.models import (Profile, Bushfire, BushfireSnapshot,BushfireProperty,
         Region, District,
         Tenure, AreaBurnt,
         Document,DocumentCategory,DocumentTag,
-        SNAPSHOT_INITIAL, SNAPSHOT_FINAL,
-        current_finyear
+        current_finyear,PROPERTIES_PREFETCH
     )
 from bfrs.forms import (ProfileForm, BushfireFilterForm,MergedBushfireForm,SubmittedBushfireForm,InitialBushfireForm,BushfireSnapshotViewForm,BushfireCreateForm,
         BushfireViewForm,InitialBushfireFSSGForm,AuthorisedBushfireFSSGForm,ReviewedBushfireFSSGForm,SubmittedBushfireFSSGForm,
@@ -44,9 +44,11 @@ from bfrs.utils import (breadcrumbs_li,
         export_final_csv, export_excel, 
         update_status, serialize_bushfire,
         is_external_user, can_maintain_data, refresh_gokart,
-        get_missing_mandatory_fields,get_bushfire_url,
+        get_missing_mandatory_fields,get_missing_mandatory_fields_many,get_bushfire_url,
     )
 from bfrs.reports import BushfireReport, MinisterialReport, export_outstanding_fires, calculate_report_tables
+from bfrs.latexpool import latex_pool
+from bfrs.tiles import bushfire_tiles
 from django.db import IntegrityError, transaction
 from django.forms import ValidationError
 from datetime import datetime
@@ -65,6 +67,35 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+@login_required
+def bushfire_tile(request, z, x, y):
+    """
+    Return the mapbox vector tile of the bushfire origin points and fire boundaries.
+    GET parameters:
+        year: the reporting year, optional
+        status: comma separated report statuses, optional
+    """
+    z, x, y = int(z), int(x), int(y)
+    if z > bushfire_tiles.max_zoom or x >= 2 ** z or y >= 2 ** z:
+        raise Http404("Tile({}/{}/{}) Not Found".format(z, x, y))
+    try:
+        year = int(request.GET["year"]) if request.GET.get("year") else None
+        statuses = [int(s) for s in request.GET["status"].split(",") if s.strip()] if request.GET.get("status") else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid year or status")
+
+    return HttpResponse(bushfire_tiles.get_tile(z, x, y, year, statuses), content_type="application/vnd.mapbox-vector-tile")
+
+
+@login_required
+def latex_pool_stats(request):
+    """
+    Return the metrics of the pdf worker pool of this web worker
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    return JsonResponse(latex_pool.stats())
+
 def process_update_status_result(request,result):
     if not result:
         return
@@ -201,6 +232,10 @@ class BushfireView(ExceptionMixin,NextUrlMixin,LoginRequiredMixin, filter_views.
         profile, created = Profile.objects.get_or_create(user=self.request.user)
         return { 'region': profile.region, 'district': profile.district }
 
+    def get_queryset(self):
+        #prefetch the properties and the formsets checked for the missing mandatory fields, also used by the exports
+        return Bushfire.objects.all().prefetch_related(PROPERTIES_PREFETCH,*Bushfire.AUTH_MANDATORY_FORMSETS)
+
     def get(self, request, *args, **kwargs):
         template_confirm = 'bfrs/confirm.html'
         template_snapshot_history = 'bfrs/snapshot_history.html'
@@ -209,7 +244,7 @@ class BushfireView(ExceptionMixin,NextUrlMixin,LoginRequiredMixin, filter_views.
             qs = self.get_filterset(self.filterset_class).qs
             return export_final_csv(self.request, qs)
         elif action == 'export_to_excel':
-            qs = self.get_filterset(self.filterset_class).qs
+            qs = self.get_filterset(self.filterset_class).qs.prefetch_related('tenures_burnt__tenure','damages__damage_type','injuries__injury_type')
             return export_excel(self.request, qs)
         elif action == 'export_excel_outstanding_fires':
             # Only Reports that are Submitted, but not yet Authorised
@@ -235,6 +270,7 @@ class BushfireView(ExceptionMixin,NextUrlMixin,LoginRequiredMixin, filter_views.
             bushfire = Bushfire.objects.get(id=self.request.GET.get('bushfire_id'))
             context = {
                 'object': bushfire,
+                'snapshots': bushfire.snapshot_history,
             }
             return TemplateResponse(request, template_snapshot_history, context=context)
         elif action is not None:
@@ -376,6 +412,13 @@ class BushfireView(ExceptionMixin,NextUrlMixin,LoginRequiredMixin, filter_views.
         context['actions'] = self.actions
         if hasattr(self,"action"):
             context['action'] = self.action
+
+        #the missing mandatory fields of the listed reports which are waiting to be submitted or authorised
+        for action,status in (("submit",Bushfire.STATUS_INITIAL),("authorise",Bushfire.STATUS_INITIAL_AUTHORISED)):
+            bushfires = [bf for bf in context["object_list"] if bf.report_status == status]
+            missing_fields = get_missing_mandatory_fields_many(bushfires,action)
+            for bf in bushfires:
+                bf.missing_mandatory_fields = missing_fields.get(bf.id)
         #if context["paginator"].num_pages == 1: 
         #    context['is_paginated'] = False
     
@@ -396,13 +439,14 @@ class BushfireInitialSnapshotView(ExceptionMixin,FormRequestMixin,NextUrlMixin,L
     def get_context_data(self, **kwargs):
         context = super(BushfireInitialSnapshotView, self).get_context_data(**kwargs)
         self.object = self.get_object()
+        snapshot = self.object.initial_snapshot
 
         context.update({
             'initial': True,
-            'form': BushfireSnapshotViewForm(instance=self.object.initial_snapshot),
-            'damages': self.object.initial_snapshot.damage_snapshot.exclude(snapshot_type=SNAPSHOT_FINAL) if hasattr(self.object.initial_snapshot, 'damage_snapshot') else None,
-            'injuries': self.object.initial_snapshot.injury_snapshot.exclude(snapshot_type=SNAPSHOT_FINAL) if hasattr(self.object.initial_snapshot, 'injury_snapshot') else None,
-            'tenures_burnt': self.object.initial_snapshot.tenures_burnt_snapshot.exclude(snapshot_type=SNAPSHOT_FINAL).order_by('id') if hasattr(self.object.initial_snapshot, 'tenures_burnt_snapshot') else None,
+            'form': BushfireSnapshotViewForm(instance=snapshot),
+            'damages': snapshot.damages if snapshot else None,
+            'injuries': snapshot.injuries if snapshot else None,
+            'tenures_burnt': snapshot.tenures_burnt.order_by('id') if snapshot else None,
             'link_actions' : [(reverse("bushfire:bushfire_document_list",kwargs={"bushfireid":self.object.id}),'Documents','btn-info'),(self.get_success_url(),'Return','btn-danger')],
         })
         return context
@@ -417,16 +461,17 @@ class BushfireFinalSnapshotView(ExceptionMixin,FormRequestMixin,NextUrlMixin,Log
     def get_context_data(self, **kwargs):
         context = super(BushfireFinalSnapshotView, self).get_context_data(**kwargs)
         self.object = self.get_object()
+        snapshot = self.object.final_snapshot
 
         link_actions = [(reverse("bushfire:bushfire_document_list",kwargs={"bushfireid":self.object.id}),'Documents','btn-info'),(self.get_success_url(),'Return','btn-danger')]
         if can_maintain_data(self.request.user):
             link_actions.insert(0,(reverse('bushfire:bushfire_final',kwargs={"pk":self.object.id}) ,'Edit Authorised','btn-success'))
         context.update({
             'final': True,
-            'form': BushfireSnapshotViewForm(instance=self.object.final_snapshot),
-            'damages': self.object.final_snapshot.damage_snapshot.exclude(snapshot_type=SNAPSHOT_INITIAL) if hasattr(self.object.final_snapshot, 'damage_snapshot') else None,
-            'injuries': self.object.final_snapshot.injury_snapshot.exclude(snapshot_type=SNAPSHOT_INITIAL) if hasattr(self.object.final_snapshot, 'injury_snapshot') else None,
-            'tenures_burnt': self.object.final_snapshot.tenures_burnt_snapshot.exclude(snapshot_type=SNAPSHOT_INITIAL).order_by('id') if hasattr(self.object.final_snapshot, 'tenures_burnt_snapshot') else None,
+            'form': BushfireSnapshotViewForm(instance=snapshot),
+            'damages': snapshot.damages if snapshot else None,
+            'injuries': snapshot.injuries if snapshot else None,
+            'tenures_burnt': snapshot.tenures_burnt.order_by('id') if snapshot else None,
             'can_maintain_data': can_maintain_data(self.request.user),
             'link_actions':link_actions,
         })
@@ -678,6 +723,14 @@ class BushfireHistoryCompareView(HistoryCompareDetailView):
     model = Bushfire
     template_name = 'bfrs/history.html'
 
+    def get_context_data(self, **kwargs):
+        context = super(BushfireHistoryCompareView, self).get_context_data(**kwargs)
+        context.update({
+            'bushfire': self.object,
+            'snapshots': self.object.snapshot_history,
+        })
+        return context
+
 
 class ReportView(ExceptionMixin,FormView):
     """
@@ -705,7 +758,13 @@ class ReportView(ExceptionMixin,FormView):
         valid = super(ReportView, self).form_valid(form)
         if valid.status_code == 302:
             #messages.success(self.request, 'Running Ministerial Report ...')
-            return MinisterialReport().pdflatex(self.request, form.cleaned_data)
+            response = MinisterialReport().pdflatex(self.request, form.cleaned_data)
+            if response.status_code == 503:
+                #the pdf generator is busy or too slow; keep the form, so the user can try again
+                messages.error(self.request, response.content)
+                response = self.form_invalid(form)
+                response.status_code = 503
+            return response
         return super(ReportView, self).form_valid(form)
 
 
@@ -2,6 +2,7 @@ from dbca_utils.utils import env
 import dj_database_url
 import os
 import sys
+import tempfile
 
 
 # Project paths
@@ -48,7 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'reversion.middleware.RevisionMiddleware',
+    'bfrs.revisions.DeferredRevisionMiddleware',
     'dbca_utils.middleware.SSOLoginMiddleware',
 ]
 TEMPLATES = [
@@ -75,6 +76,13 @@ TEMPLATES = [
     },
 ]
 LATEX_GRAPHIC_FOLDER = os.path.join(BASE_DIR, "templates", "latex", "images")
+# PDF worker pool shared by all the web worker processes: max concurrent tex processes, max queued jobs, seconds a job may wait in the queue, seconds a compile may run,
+# and the folder of the pool's lock files and stats, which must be local to the host
+LATEX_WORKERS = env('LATEX_WORKERS', 2)
+LATEX_QUEUE_SIZE = env('LATEX_QUEUE_SIZE', 10)
+LATEX_QUEUE_TIMEOUT = env('LATEX_QUEUE_TIMEOUT', 30)
+LATEX_COMPILE_TIMEOUT = env('LATEX_COMPILE_TIMEOUT', 120)
+LATEX_POOL_DIR = env('LATEX_POOL_DIR', os.path.join(tempfile.gettempdir(), 'bfrs_latex_pool'))
 P1CAD_ENDPOINT = env('P1CAD_ENDPOINT', None)
 P1CAD_USER = env('P1CAD_USER', None)
 P1CAD_PASSWORD = env('P1CAD_PASSWORD', None)
@@ -84,12 +92,40 @@ KMI_URL = env('KMI_URL', 'https://kmi.dbca.wa.gov.au/geoserver')
 AREA_THRESHOLD = env('AREA_THRESHOLD', 2)
 SSS_URL = env('SSS_URL', 'https://sss.dpaw.wa.gov.au')
 SSS_CERTIFICATE_VERIFY = env('SSS_CERTIFICATE_VERIFY', True)
+# The spatial data refresh sends SSS_SPATIAL_BATCH_SIZE features in each request, with SSS_SPATIAL_WORKERS concurrent requests
+SSS_TIMEOUT = env('SSS_TIMEOUT', 300)
+SSS_SPATIAL_BATCH_SIZE = env('SSS_SPATIAL_BATCH_SIZE', 20)
+SSS_SPATIAL_WORKERS = env('SSS_SPATIAL_WORKERS', 4)
+# Calculate the burnt areas with SSS ('sss') or against the tenure layers loaded into the local database ('local'),
+# read from the tables BURNT_AREA_LAYER_SCHEMA.<layer name> with the geometry column BURNT_AREA_LAYER_GEOMETRY
+BURNT_AREA_BACKEND = env('BURNT_AREA_BACKEND', 'sss')
+BURNT_AREA_LAYER_SCHEMA = env('BURNT_AREA_LAYER_SCHEMA', 'cddp')
+BURNT_AREA_LAYER_GEOMETRY = env('BURNT_AREA_LAYER_GEOMETRY', 'wkb_geometry')
 PBS_URL = env('PBS_URL', 'https://pbs.dpaw.wa.gov.au/')
+PBS_TIMEOUT = env('PBS_TIMEOUT', 30)
+PBS_RETRIES = env('PBS_RETRIES', 3)
+PBS_CACHE_TIMEOUT = env('PBS_CACHE_TIMEOUT', 60)
+PBS_MAX_URL_LENGTH = env('PBS_MAX_URL_LENGTH', 4000)
+# Seconds the tenure mappings are kept in memory; a change made by another process is picked up when they expire
+TENURE_INDEX_TIMEOUT = env('TENURE_INDEX_TIMEOUT', 300)
+# The cache in CACHES used by the api lookups (field values, fire numbers). It must be shared by all processes (memcached, redis, database)
+# to drop the lookups when bushfires are changed; the lookups are not cached if it is not set or is a local memory cache
+API_LOOKUP_CACHE = env('API_LOOKUP_CACHE', None)
+API_LOOKUP_CACHE_TIMEOUT = env('API_LOOKUP_CACHE_TIMEOUT', 3600)
+# The folder to cache the bushfire vector tiles, outside of the code tree, and the highest zoom level cached; tiles are not cached if TILE_CACHE_DIR is empty
+TILE_CACHE_DIR = env('TILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bfrs_tile_cache'))
+TILE_CACHE_MAX_ZOOM = env('TILE_CACHE_MAX_ZOOM', 16)
+# Create the sql views as materialized views, which are refreshed SQL_VIEWS_REFRESH_DELAY seconds after bushfires are changed;
+# run "manage.py refresh_views" from cron as well, to pick up a refresh lost when a web worker is recycled
+SQL_VIEWS_MATERIALIZED = env('SQL_VIEWS_MATERIALIZED', False)
+SQL_VIEWS_REFRESH_DELAY = env('SQL_VIEWS_REFRESH_DELAY', 60)
 URL_SSO = env('URL_SSO', 'https://oim.dpaw.wa.gov.au/api/users/')
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 20  # 20 MB
 CRISPY_TEMPLATE_PACK = 'bootstrap3'
 HISTORICAL_CAUSE_CSV_FILE = env('HISTORICAL_CAUSE_CSV_FILE', '')
 ADD_REVERSION_ADMIN = True
+# Leave the fire boundary and sss data out of the bushfire revisions; the revisions still refer to the latest snapshots
+REVERSION_EXCLUDE_BULKY_FIELDS = env('REVERSION_EXCLUDE_BULKY_FIELDS', False)
 LOGIN_URL = '/login/'
 LOGOUT_URL = '/logout/'
 LOGIN_REDIRECT_URL = '/'
@@ -135,6 +171,15 @@ HARVEST_EMAIL_HOST = env('HARVEST_EMAIL_HOST', None)
 HARVEST_EMAIL_USER = env('HARVEST_EMAIL_USER', None)
 HARVEST_EMAIL_PASSWORD = env('HARVEST_EMAIL_PASSWORD', None)
 HARVEST_EMAIL_FOLDER = env('HARVEST_EMAIL_FOLDER', 'INBOX')
+# The harvester daemon (./manage.py dfes_harvest --daemon) re-issues IDLE every HARVEST_IDLE_TIMEOUT seconds,
+# and waits up to HARVEST_RECONNECT_MAX_DELAY seconds before reconnecting to the mail server
+HARVEST_IDLE_TIMEOUT = env('HARVEST_IDLE_TIMEOUT', 600)
+HARVEST_RECONNECT_MAX_DELAY = env('HARVEST_RECONNECT_MAX_DELAY', 300)
+# Only examine the emails received after the last harvest, and fetch the bodies of the emails whose subject matches HARVEST_SHORTLIST_SUBJECT
+HARVEST_INCREMENTAL = env('HARVEST_INCREMENTAL', False)
+HARVEST_SHORTLIST_SUBJECT = env('HARVEST_SHORTLIST_SUBJECT', r'BF\s*\d{4}|incident|fire\s*number|dfes')
+# The max number of processes to parse a large batch of harvested emails
+HARVEST_PARSE_PROCESSES = env('HARVEST_PARSE_PROCESSES', 4)
 
 # Outstanding Fires Report
 GOLDFIELDS_EMAIL = env('GOLDFIELDS_EMAIL',[])
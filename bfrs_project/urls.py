@@ -44,6 +44,7 @@ urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
     url(r'^about/', TemplateView.as_view(template_name='about.html'), name='about'),
     url(r'^api/', include(v1_api.urls)),
+    url(r'^tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$', views.bushfire_tile, name='bushfire_tile'),
     url(r'^profile/$', views.ProfileView.as_view(), name='profile'),
     url(r'^sss/$', sss_selection_view, name="sss_home"),
     url(r'^chaining/', include('smart_selects.urls')),
@@ -31,6 +31,11 @@ BEGIN
             DELETE FROM bfrs_damagesnapshot WHERE snapshot_id = snapshotid;
             DELETE FROM bfrs_injurysnapshot WHERE snapshot_id = snapshotid;
         END LOOP;
+        --point the bushfire to its latest remaining snapshots before deleting the snapshots it refers to
+        UPDATE bfrs_bushfire SET
+            latest_initial_snapshot_id = (SELECT id FROM bfrs_bushfiresnapshot WHERE bushfire_id = bushfireid and snapshot_type = 1 and snapshot_type < snapshottype ORDER BY created DESC LIMIT 1),
+            latest_final_snapshot_id = (SELECT id FROM bfrs_bushfiresnapshot WHERE bushfire_id = bushfireid and snapshot_type = 2 and snapshot_type < snapshottype ORDER BY created DESC LIMIT 1)
+        WHERE id = bushfireid;
         DELETE FROM bfrs_bushfiresnapshot WHERE bushfire_id = bushfireid and snapshot_type >= snapshottype;
         IF status = 1 THEN
             UPDATE bfrs_bushfire SET report_status = status,init_authorised_date=null,init_authorised_by_id=null,authorised_date=null,authorised_by_id=null,reviewed_date=null,reviewed_by_id=null WHERE id = bushfireid;